@@ -26,6 +26,7 @@ from .base import BaseController
 
 from ..models.graphBuilder import GraphBuilder
 from ..models.graphLayer import GraphLayer
+from ..models.graphUpdater import IncrementalGraphUpdater
 from .. import helperFunctions as helper
 
 
@@ -152,6 +153,11 @@ class GraphController(BaseController):
         builder.setOption("randomConnectionNumber", self.view.getRandomEdgesNumber())
         builder.setOption("createFeatureInfos", self.view.getCreateInfos())
         builder.setOption("degreeThreshold", self.view.getDegreeThreshold())
+        builder.setOption("useBuildCache", True)
+        # keep one core for QGIS itself
+        builder.setOption("costWorkerCount", max(1, (os.cpu_count() or 1) - 1))
+        builder.setOption("rasterCachePath", os.path.join(QgsApplication.qgisSettingsDirPath(), "spanners",
+                                                          "rasterCache.sqlite"))
 
         if self.view.getConnectionType()[1] == "LineLayerBased":
             lineLayer = self.view.getLineLayerForConnection()
@@ -276,6 +282,12 @@ class GraphController(BaseController):
                 for shortestPathViewLayer in shortestPathViewLayers:
                     QgsProject.instance().addMapLayer(shortestPathViewLayer)
 
+                # keep the graph up to date with edits of the layer it was created from
+                if graph.vLayer is not None and graph.distanceStrategy != "Advanced" and\
+                   (graph.featureToVertexHash or graph.featureToEdgesHash):
+                    graphUpdater = IncrementalGraphUpdater(graph, graph.vLayer, graphLayer)
+                    graphUpdater.graphUpdated.connect(graphLayer.triggerRepaint)
+
                 # save graph to destination
                 savePath = self.view.getSavePath()
                 success, errorMsg = helper.saveGraph(graph, graphLayer, graphName,
@@ -501,14 +501,17 @@ class KDNode(Node):
         if nodeDist < dist:
             results.append(self.data)
 
-        # get the splitting plane
-        split_plane = self.data[self.axis]
+        # get the splitting plane and the squared distance to it
+        # (dist is a squared distance as well)
+        plane_dist = point[self.axis] - self.data[self.axis]
+        plane_dist2 = plane_dist * plane_dist
 
-        # Search the side of the splitting plane that the point is in
-        if point[self.axis] <= split_plane + dist:
+        # Search the side of the splitting plane that the point is in and
+        # the other side if it is within the distance
+        if plane_dist <= 0 or plane_dist2 <= dist:
             if self.left is not None:
                 self.left._search_nn_dist(point, dist, results, get_dist)
-        if point[self.axis] >= split_plane - dist:
+        if plane_dist >= 0 or plane_dist2 <= dist:
             if self.right is not None:
                 self.right._search_nn_dist(point, dist, results, get_dist)
 
@@ -591,8 +594,8 @@ def create(point_list=None, dimensions=None, axis=0, sel_axis=None):
     if not point_list and not dimensions:
         raise ValueError('either point_list or dimensions must be provided')
 
-    elif point_list:
-        # changed!!!! set a fix value for this to use id
+    elif point_list and not dimensions:
+        # changed!!!! default to 2 dimensions, additional entries of a point (e.g. an id) are ignored
         dimensions = 2
 
     # by default cycle through the axis
@@ -618,7 +621,8 @@ def check_dimensionality(point_list, dimensions=None):
         # print(p)
         # print(len(p))
         # print(dimensions)
-        if len(p) != dimensions:
+        # changed!!!! points may carry additional entries (e.g. an id) after the coordinates
+        if len(p) < dimensions:
             raise ValueError('All Points in the point_list must have the same dimensionality')
 
     return dimensions
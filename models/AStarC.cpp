@@ -19,7 +19,13 @@
  */
 
 #include <pybind11/pybind11.h>
+#include <algorithm>
+#include <array>
+#include <cstdint>
+#include <map>
+#include <memory>
 #include <queue>
+#include <stdexcept>
 #include <tuple>
 #include <vector>
 #include <utility>
@@ -62,39 +68,45 @@ struct Point{
 
 class AStar {
 	public:
-		AStar(const std::vector<std::vector<int>> matrix, int heuristicIndex, int minValue, int meanValue, bool createShortestPathMatrix) : matrix(matrix), heuristicIndex(heuristicIndex), minValue(minValue), meanValue(meanValue),createShortestPathMatrix(createShortestPathMatrix) {
+		AStar(const std::vector<std::vector<int>> matrix, int heuristicIndex, int minValue, int meanValue, bool createShortestPathMatrix) : AStar(std::make_shared<const std::vector<std::vector<int>>>(matrix), heuristicIndex, minValue, meanValue, createShortestPathMatrix) {
+		}
+		
+		AStar(std::shared_ptr<const std::vector<std::vector<int>>> matrix, int heuristicIndex, int minValue, int meanValue, bool createShortestPathMatrix) : matrix(matrix), heuristicIndex(heuristicIndex), minValue(minValue), meanValue(meanValue),createShortestPathMatrix(createShortestPathMatrix) {
+			// search workspace, allocated once per raster and reused by all searches
+			rows = int(matrix->size());
+			cols = rows > 0 ? int((*matrix)[0].size()) : 0;
+			pixelWeights.resize(size_t(rows) * cols);
+			predecessors.resize(size_t(rows) * cols);
+			stamps.assign(size_t(rows) * cols, 0);
 			if(createShortestPathMatrix){
-				shortestPathMatrix1.resize(matrix.size());
-				shortestPathMatrix2.resize(matrix.size());
-				shortestPathMatrix3.resize(matrix.size());
-				for(int i=0; i<int(matrix.size()); i++){
-					shortestPathMatrix1[i].resize(matrix[0].size());
-					shortestPathMatrix2[i].resize(matrix[0].size());
-					shortestPathMatrix3[i].resize(matrix[0].size());
-				}
+				shortestPathView.assign(size_t(rows) * cols * 3, 0);
 			}				
 			srand(time(NULL));		
 		}
 		
 		std::vector<int> shortestPath(int x1, int y1, int x2, int y2){	
-			diagonals = 0;	
-			std::vector<std::vector<int>> pixelWeights(matrix.size(), std::vector<int>(matrix[0].size()));	
-			std::vector<std::vector<std::tuple<int,int>>> predMatrix (matrix.size(), std::vector<std::tuple<int,int>>(matrix[0].size()));
+			diagonals = 0;
+			startSearch();
 			
 			int randomRed = rand() % 255 + 1;
 			int randomGreen = rand() % 255 + 1;
 			int randomBlue = rand() % 255 + 1;
+
+			setWeight(x1, y1, 0);
+			
+			Point startPoint = Point(x1,y1,0);
+			Point endPoint = Point(x2,y2,0);
 			
-			for(int i=0; i<int(matrix.size());i++){
-				for(int j=0; j<int(matrix[0].size());j++){
-					pixelWeights[i][j] = INT_MAX;
-				}			
+			if(bidirectional){
+				return bidirectionalPath(startPoint, endPoint, randomRed, randomGreen, randomBlue);
+			}
+			if(landmarkDistances){
+				targetLandmarkDistances.clear();
+				for(const std::vector<int> &distances : *landmarkDistances){
+					targetLandmarkDistances.push_back(distances[index(x2, y2)]);
+				}
 			}
-
-			pixelWeights[x1][y1] = 0;
 			
-			Point startPoint = Point(x1,y1,pixelWeights[x1][y1]);
-			Point endPoint = Point(x2,y2,pixelWeights[x2][y2]);
 			std::priority_queue<Point> pq;
 			pq.push(startPoint);
 			
@@ -103,35 +115,10 @@ class AStar {
 				pq.pop();
 				
 				if(current == endPoint){
-					std::vector<int> shortestPathWeights;
-					std::tuple<int,int> u = std::make_tuple(endPoint.x,endPoint.y);
-					Point currPathPoint = Point(std::get<0>(u),std::get<1>(u),0);
-					while(currPathPoint != startPoint){
-						if(createShortestPathMatrix){
-							shortestPathMatrix1[currPathPoint.x][currPathPoint.y] = (shortestPathMatrix1[currPathPoint.x][currPathPoint.y] + randomRed) / 2;
-							shortestPathMatrix2[currPathPoint.x][currPathPoint.y] = (shortestPathMatrix2[currPathPoint.x][currPathPoint.y] + randomGreen) / 2;
-							shortestPathMatrix3[currPathPoint.x][currPathPoint.y] = (shortestPathMatrix3[currPathPoint.x][currPathPoint.y] + randomBlue) / 2;
-						}
-						shortestPathWeights.push_back(matrix[std::get<0>(u)][std::get<1>(u)]);
-						int prevX = std::get<0>(u);
-						int prevY = std::get<1>(u);
-						u = predMatrix[std::get<0>(u)][std::get<1>(u)];
-						if(std::get<0>(u) != prevX && std::get<1>(u) != prevY){
-							diagonals++;
-						}
-						
-						currPathPoint = Point(std::get<0>(u),std::get<1>(u),0);
-					}
-					shortestPathWeights.push_back(matrix[startPoint.x][startPoint.y]);	
-					if(createShortestPathMatrix){
-						shortestPathMatrix1[startPoint.x][startPoint.y] = (shortestPathMatrix1[currPathPoint.x][currPathPoint.y] + randomRed) / 2;
-						shortestPathMatrix2[startPoint.x][startPoint.y] = (shortestPathMatrix2[currPathPoint.x][currPathPoint.y] + randomGreen) / 2;
-						shortestPathMatrix3[startPoint.x][startPoint.y] = (shortestPathMatrix3[currPathPoint.x][currPathPoint.y] + randomBlue) / 2;
-					}									
-					return shortestPathWeights;
+					return reconstructPath(startPoint, endPoint, randomRed, randomGreen, randomBlue, diagonals);
 				}
 				
-				if(current.weight - heuristic(current.x, current.y, endPoint.x, endPoint.y) > pixelWeights[current.x][current.y]){
+				if(current.weight - heuristic(current.x, current.y, endPoint.x, endPoint.y) > weight(current.x, current.y)){
 					continue;				
 				}
 				
@@ -141,21 +128,17 @@ class AStar {
 					int neighborX = std::get<0>(neighbor);
 					int neighborY = std::get<1>(neighbor);
 				
-					int newDistance = pixelWeights[current.x][current.y] + matrix[current.x][current.y];
+					int newDistance = weight(current.x, current.y) + (*matrix)[current.x][current.y];
 					
-					if(neighborX > 0 && neighborY > 0 && neighborX < int(matrix.size()) && neighborY < int(matrix[0].size())){
-						if(newDistance < pixelWeights[neighborX][neighborY]){
-							predMatrix[neighborX][neighborY] = std::make_tuple(current.x, current.y);
-							pixelWeights[neighborX][neighborY] = newDistance;
+					if(neighborX > 0 && neighborY > 0 && neighborX < rows && neighborY < cols){
+						if(newDistance < weight(neighborX, neighborY)){
+							predecessors[index(neighborX, neighborY)] = index(current.x, current.y);
+							setWeight(neighborX, neighborY, newDistance);
 							
 							if(createShortestPathMatrix){
-								if(shortestPathMatrix1[current.x][current.y] == 0 && shortestPathMatrix2[current.x][current.y] == 0 && shortestPathMatrix3[current.x][current.y] == 0){
-									shortestPathMatrix1[current.x][current.y] = 255;
-									shortestPathMatrix2[current.x][current.y] = 255;
-									shortestPathMatrix3[current.x][current.y] = 255;
-								}																	
+								markVisited(current.x, current.y);																	
 							}
-							int heuristicWeight = pixelWeights[neighborX][neighborY] + heuristic(neighborX, neighborY, endPoint.x, endPoint.y);						
+							int heuristicWeight = newDistance + heuristic(neighborX, neighborY, endPoint.x, endPoint.y);						
 							pq.push(Point(neighborX, neighborY, heuristicWeight));
 						}				
 					}
@@ -164,29 +147,429 @@ class AStar {
 			return {INT_MAX};
 		} 
 		
-		std::vector<std::vector<short>> &getShortestPathMatrix1(){
-			return shortestPathMatrix1;
+		// one to many Dijkstra search, which expands once from the source and stops as soon as the last target is settled,
+		// without targets all reachable pixels are settled
+		std::vector<std::pair<std::vector<int>,int>> shortestPathsFromSource(int x1, int y1, const std::vector<std::pair<int,int>> &targets){
+			startSearch();
+			
+			int randomRed = rand() % 255 + 1;
+			int randomGreen = rand() % 255 + 1;
+			int randomBlue = rand() % 255 + 1;
+
+			setWeight(x1, y1, 0);
+			
+			// target pixel -> positions of the target in targets
+			std::vector<std::pair<int,int>> targetIndices;
+			for(int i=0; i<int(targets.size()); i++){
+				targetIndices.push_back(std::make_pair(index(targets[i].first, targets[i].second), i));
+			}
+			std::sort(targetIndices.begin(), targetIndices.end());
+			std::vector<std::pair<std::vector<int>,int>> paths(targets.size(), std::make_pair(std::vector<int>{INT_MAX}, 0));
+			std::vector<bool> settled(targets.size(), false);
+			int remainingTargets = int(targets.size());
+			bool settleAll = targets.empty();
+			
+			Point startPoint = Point(x1,y1,0);
+			std::priority_queue<Point> pq;
+			pq.push(startPoint);
+			
+			while(!pq.empty() && (remainingTargets > 0 || settleAll)){
+				Point current = pq.top();
+				pq.pop();
+				
+				if(current.weight > weight(current.x, current.y)){
+					continue;
+				}
+				
+				auto target = std::lower_bound(targetIndices.begin(), targetIndices.end(), std::make_pair(index(current.x, current.y), 0));
+				bool pathFound = false;
+				for(; target != targetIndices.end() && target->first == index(current.x, current.y); target++){
+					if(settled[target->second]){
+						continue;
+					}
+					if(!pathFound){
+						int pathDiagonals = 0;
+						paths[target->second].first = reconstructPath(startPoint, current, randomRed, randomGreen, randomBlue, pathDiagonals);
+						paths[target->second].second = pathDiagonals;
+						pathFound = true;
+					}
+					else{
+						paths[target->second] = paths[(target - 1)->second];
+					}
+					settled[target->second] = true;
+					remainingTargets--;
+				}
+				if(remainingTargets == 0 && !settleAll){
+					break;
+				}
+				
+				for(std::tuple<int,int> neighbor : getNeighborIndices(current.x, current.y)){
+					int neighborX = std::get<0>(neighbor);
+					int neighborY = std::get<1>(neighbor);
+				
+					int newDistance = current.weight + (*matrix)[current.x][current.y];
+					
+					if(neighborX > 0 && neighborY > 0 && neighborX < rows && neighborY < cols){
+						if(newDistance < weight(neighborX, neighborY)){
+							predecessors[index(neighborX, neighborY)] = index(current.x, current.y);
+							setWeight(neighborX, neighborY, newDistance);
+							
+							if(createShortestPathMatrix){
+								markVisited(current.x, current.y);
+							}
+							pq.push(Point(neighborX, neighborY, newDistance));
+						}
+					}
+				}
+			}
+			return paths;
 		}
-		std::vector<std::vector<short>> &getShortestPathMatrix2(){
-			return shortestPathMatrix2;
+		
+		// computes the distances from landmarkCount landmarks to every pixel, the searches then use the landmark lower
+		// bounds (ALT) instead of the heuristic of heuristicIndex and are exact
+		void setLandmarks(int landmarkCount){
+			landmarks.clear();
+			landmarkDistances.reset();
+			if(landmarkCount <= 0 || rows < 2 || cols < 2){
+				return;
+			}
+			
+			// the landmark searches are not part of the shortest path view
+			bool createView = createShortestPathMatrix;
+			createShortestPathMatrix = false;
+			std::vector<std::vector<int>> distancesOfLandmarks;
+			std::vector<int> closest(size_t(rows) * cols, INT_MAX);
+			std::pair<int,int> landmark = std::make_pair(1, 1);
+			for(int l=0; l<landmarkCount; l++){
+				landmarks.push_back(landmark);
+				shortestPathsFromSource(landmark.first, landmark.second, {});
+				std::vector<int> distances(size_t(rows) * cols, INT_MAX);
+				for(size_t i=0; i<distances.size(); i++){
+					if(stamps[i] == generation){
+						distances[i] = pixelWeights[i];
+					}
+				}
+				distancesOfLandmarks.push_back(distances);
+				
+				// next landmark is the reachable pixel farthest away from all landmarks
+				int farthest = 0;
+				int farthestDistance = -1;
+				for(size_t i=0; i<closest.size(); i++){
+					closest[i] = std::min(closest[i], distances[i]);
+					if(closest[i] != INT_MAX && closest[i] > farthestDistance){
+						farthestDistance = closest[i];
+						farthest = int(i);
+					}
+				}
+				landmark = std::make_pair(farthest / cols, farthest % cols);
+				if(std::find(landmarks.begin(), landmarks.end(), landmark) != landmarks.end()){
+					break;
+				}
+			}
+			landmarkDistances = std::make_shared<const std::vector<std::vector<int>>>(std::move(distancesOfLandmarks));
+			createShortestPathMatrix = createView;
 		}
-		std::vector<std::vector<short>> &getShortestPathMatrix3(){
-			return shortestPathMatrix3;	
+		
+		// searches from both endpoints at once without a heuristic, the paths are exact
+		void setBidirectional(bool enabled){
+			bidirectional = enabled;
+			if(enabled && backwardStamps.empty()){
+				backwardWeights.resize(size_t(rows) * cols);
+				successors.resize(size_t(rows) * cols);
+				backwardStamps.assign(size_t(rows) * cols, 0);
+			}
+		}
+		
+		// whether the found paths are guaranteed to be shortest paths
+		bool isExact(){
+			return bidirectional || landmarkDistances || heuristicIndex == 0;
+		}
+		
+		// new AStar object with its own search buffers, which shares the raster and the landmarks with this
+		// object, so several threads can search through the raster at once
+		AStar copySearch(){
+			AStar copy(matrix, heuristicIndex, minValue, meanValue, false);
+			copy.landmarks = landmarks;
+			copy.landmarkDistances = landmarkDistances;
+			copy.setBidirectional(bidirectional);
+			return copy;
+		}
+		
+		// shortest paths of the pixel pairs (startRow, startCol, endRow, endCol). The pixel values of all paths are
+		// stored one after another in values, path i is values[offsets[i]:offsets[i+1]]. Pairs with a pixel outside
+		// of the raster get the path {INT_MAX}. The exact Dijkstra search shares one search for all pairs with the
+		// same start pixel.
+		void shortestPaths(const std::vector<std::array<int,4>> &pairs, std::vector<int> &values, std::vector<int64_t> &offsets, std::vector<int> &pathDiagonals){
+			std::vector<std::vector<int>> paths(pairs.size(), std::vector<int>{INT_MAX});
+			pathDiagonals.assign(pairs.size(), 0);
+			
+			// start pixel -> positions of the pairs starting there
+			std::map<std::pair<int,int>, std::vector<size_t>> pairsBySource;
+			for(size_t i=0; i<pairs.size(); i++){
+				const std::array<int,4> &pair = pairs[i];
+				if(!isPixel(pair[0], pair[1]) || !isPixel(pair[2], pair[3])){
+					continue;
+				}
+				if(heuristicIndex == 0 && !bidirectional && !landmarkDistances){
+					pairsBySource[std::make_pair(pair[0], pair[1])].push_back(i);
+				}
+				else{
+					paths[i] = shortestPath(pair[0], pair[1], pair[2], pair[3]);
+					pathDiagonals[i] = diagonals;
+				}
+			}
+			for(const auto &source : pairsBySource){
+				std::vector<std::pair<int,int>> targets;
+				for(size_t i : source.second){
+					targets.push_back(std::make_pair(pairs[i][2], pairs[i][3]));
+				}
+				std::vector<std::pair<std::vector<int>,int>> sourcePaths = shortestPathsFromSource(source.first.first, source.first.second, targets);
+				for(size_t t=0; t<source.second.size(); t++){
+					paths[source.second[t]] = std::move(sourcePaths[t].first);
+					pathDiagonals[source.second[t]] = sourcePaths[t].second;
+				}
+			}
+			
+			values.clear();
+			offsets.assign(1, 0);
+			for(const std::vector<int> &path : paths){
+				values.insert(values.end(), path.begin(), path.end());
+				offsets.push_back(int64_t(values.size()));
+			}
+		}
+		
+		// rows x cols x 3 RGB pixels of the visited pixels and the colored paths of all searches
+		std::vector<uint8_t> &getShortestPathView(){
+			return shortestPathView;
+		}
+		int getRowCount(){
+			return rows;
+		}
+		int getColCount(){
+			return cols;
 		}
 		int &getNumberOfDiagonals(){
 			return diagonals;
 		}
+		std::vector<std::pair<int,int>> &getPathPoints(){
+			return pathPoints;
+		}
 				
 	private:
-		std::vector<std::vector<int>> matrix;
+		// raster values, shared with the copies of copySearch
+		std::shared_ptr<const std::vector<std::vector<int>>> matrix;
 		int heuristicIndex;
 		int minValue;
 		int meanValue;
 		bool createShortestPathMatrix;
-		std::vector<std::vector<short>> shortestPathMatrix1;
-		std::vector<std::vector<short>> shortestPathMatrix2;
-		std::vector<std::vector<short>> shortestPathMatrix3;
+		std::vector<uint8_t> shortestPathView;
 		int diagonals = 0;
+		// pixels of the last found path from its end to its start
+		std::vector<std::pair<int,int>> pathPoints;
+		
+		// distances from the landmarks to every pixel and from the landmarks to the target of the current search
+		std::vector<std::pair<int,int>> landmarks;
+		std::shared_ptr<const std::vector<std::vector<int>>> landmarkDistances;
+		std::vector<int> targetLandmarkDistances;
+		
+		// backward search of the bidirectional search, allocated by setBidirectional
+		bool bidirectional = false;
+		std::vector<int> backwardWeights;
+		std::vector<int> successors;
+		std::vector<uint32_t> backwardStamps;
+
+		// distances and predecessors of the current search, an entry is only valid if its stamp
+		// equals the generation of the search, so a new search starts without clearing the buffers
+		int rows = 0;
+		int cols = 0;
+		std::vector<int> pixelWeights;
+		std::vector<int> predecessors;
+		std::vector<uint32_t> stamps;
+		uint32_t generation = 0;
+
+		void startSearch(){
+			generation++;
+			if(generation == 0){
+				// the stamps overflowed, entries of old searches could become valid again
+				std::fill(stamps.begin(), stamps.end(), 0);
+				std::fill(backwardStamps.begin(), backwardStamps.end(), 0);
+				generation = 1;
+			}
+		}
+
+		int index(int x, int y){
+			return x * cols + y;
+		}
+
+		int weight(int x, int y){
+			int i = index(x, y);
+			return stamps[i] == generation ? pixelWeights[i] : INT_MAX;
+		}
+
+		void setWeight(int x, int y, int value){
+			int i = index(x, y);
+			stamps[i] = generation;
+			pixelWeights[i] = value;
+		}
+		
+		bool isPixel(int x, int y){
+			return x >= 0 && y >= 0 && x < rows && y < cols;
+		}
+		
+		bool isInside(int x, int y){
+			return x > 0 && y > 0 && x < rows && y < cols;
+		}
+		
+		int backwardWeight(int x, int y){
+			int i = index(x, y);
+			return backwardStamps[i] == generation ? backwardWeights[i] : INT_MAX;
+		}
+
+		void setBackwardWeight(int x, int y, int value){
+			int i = index(x, y);
+			backwardStamps[i] = generation;
+			backwardWeights[i] = value;
+		}
+		
+		// bidirectional Dijkstra search, the backward search follows the steps into a pixel in reverse
+		std::vector<int> bidirectionalPath(Point startPoint, Point endPoint, int randomRed, int randomGreen, int randomBlue){
+			if(endPoint != startPoint && !isInside(endPoint.x, endPoint.y)){
+				return {INT_MAX};
+			}
+			setBackwardWeight(endPoint.x, endPoint.y, 0);
+			
+			std::priority_queue<Point> forwardQueue;
+			std::priority_queue<Point> backwardQueue;
+			forwardQueue.push(startPoint);
+			backwardQueue.push(endPoint);
+			
+			// length of the shortest path found so far and the pixel where its two halves meet
+			long long best = LLONG_MAX;
+			int meeting = -1;
+			if(startPoint == endPoint){
+				best = 0;
+				meeting = index(startPoint.x, startPoint.y);
+			}
+			
+			while(!forwardQueue.empty() && !backwardQueue.empty() && (long long)forwardQueue.top().weight + backwardQueue.top().weight < best){
+				if(forwardQueue.size() <= backwardQueue.size()){
+					Point current = forwardQueue.top();
+					forwardQueue.pop();
+					int currentDistance = weight(current.x, current.y);
+					if(current.weight > currentDistance){
+						continue;
+					}
+					for(std::tuple<int,int> neighbor : getNeighborIndices(current.x, current.y)){
+						int neighborX = std::get<0>(neighbor);
+						int neighborY = std::get<1>(neighbor);
+						int newDistance = currentDistance + (*matrix)[current.x][current.y];
+						if(isInside(neighborX, neighborY) && newDistance < weight(neighborX, neighborY)){
+							predecessors[index(neighborX, neighborY)] = index(current.x, current.y);
+							setWeight(neighborX, neighborY, newDistance);
+							if(createShortestPathMatrix){
+								markVisited(current.x, current.y);
+							}
+							forwardQueue.push(Point(neighborX, neighborY, newDistance));
+							int backward = backwardWeight(neighborX, neighborY);
+							if(backward != INT_MAX && (long long)newDistance + backward < best){
+								best = (long long)newDistance + backward;
+								meeting = index(neighborX, neighborY);
+							}
+						}
+					}
+				}
+				else{
+					Point current = backwardQueue.top();
+					backwardQueue.pop();
+					int currentDistance = backwardWeight(current.x, current.y);
+					if(current.weight > currentDistance){
+						continue;
+					}
+					for(std::tuple<int,int> neighbor : getNeighborIndices(current.x, current.y)){
+						int neighborX = std::get<0>(neighbor);
+						int neighborY = std::get<1>(neighbor);
+						// the forward search only steps into pixels inside of the raster bounds
+						if(!isInside(neighborX, neighborY) && !(neighborX == startPoint.x && neighborY == startPoint.y)){
+							continue;
+						}
+						int newDistance = currentDistance + (*matrix)[neighborX][neighborY];
+						if(newDistance < backwardWeight(neighborX, neighborY)){
+							successors[index(neighborX, neighborY)] = index(current.x, current.y);
+							setBackwardWeight(neighborX, neighborY, newDistance);
+							backwardQueue.push(Point(neighborX, neighborY, newDistance));
+							int forward = weight(neighborX, neighborY);
+							if(forward != INT_MAX && (long long)forward + newDistance < best){
+								best = (long long)forward + newDistance;
+								meeting = index(neighborX, neighborY);
+							}
+						}
+					}
+				}
+			}
+			if(meeting < 0){
+				return {INT_MAX};
+			}
+			
+			// path from the endPoint to the meeting pixel, followed by the path to the startPoint
+			std::vector<std::pair<int,int>> points;
+			int end = index(endPoint.x, endPoint.y);
+			for(int u = meeting; u != end;){
+				u = successors[u];
+				points.push_back(std::make_pair(u / cols, u % cols));
+			}
+			std::reverse(points.begin(), points.end());
+			std::vector<std::pair<int,int>> firstHalf = predecessorPoints(startPoint, Point(meeting / cols, meeting % cols, 0));
+			points.insert(points.end(), firstHalf.begin(), firstHalf.end());
+			return pathWeights(points, randomRed, randomGreen, randomBlue, diagonals);
+		}
+		
+		// marks a visited pixel white in the shortest path view unless it is already colored
+		void markVisited(int x, int y){
+			uint8_t *pixel = &shortestPathView[size_t(index(x, y)) * 3];
+			if(pixel[0] == 0 && pixel[1] == 0 && pixel[2] == 0){
+				pixel[0] = 255;
+				pixel[1] = 255;
+				pixel[2] = 255;
+			}
+		}
+		
+		// pixels on the path of the current search from endPoint back to startPoint
+		std::vector<std::pair<int,int>> predecessorPoints(Point startPoint, Point endPoint){
+			std::vector<std::pair<int,int>> points = {std::make_pair(endPoint.x, endPoint.y)};
+			int start = index(startPoint.x, startPoint.y);
+			for(int u = index(endPoint.x, endPoint.y); u != start;){
+				u = predecessors[u];
+				points.push_back(std::make_pair(u / cols, u % cols));
+			}
+			return points;
+		}
+		
+		// follows the predecessors of the current search from endPoint back to startPoint
+		std::vector<int> reconstructPath(Point startPoint, Point endPoint, int randomRed, int randomGreen, int randomBlue, int &pathDiagonals){
+			return pathWeights(predecessorPoints(startPoint, endPoint), randomRed, randomGreen, randomBlue, pathDiagonals);
+		}
+		
+		// pixel values of the points on a path, colors the path in the shortest path matrices
+		std::vector<int> pathWeights(const std::vector<std::pair<int,int>> &points, int randomRed, int randomGreen, int randomBlue, int &pathDiagonals){
+			pathDiagonals = 0;
+			std::vector<int> shortestPathWeights;
+			for(size_t i=0; i<points.size(); i++){
+				int x = points[i].first;
+				int y = points[i].second;
+				if(createShortestPathMatrix){
+					uint8_t *pixel = &shortestPathView[size_t(index(x, y)) * 3];
+					pixel[0] = uint8_t((pixel[0] + randomRed) / 2);
+					pixel[1] = uint8_t((pixel[1] + randomGreen) / 2);
+					pixel[2] = uint8_t((pixel[2] + randomBlue) / 2);
+				}
+				shortestPathWeights.push_back((*matrix)[x][y]);
+				if(i > 0 && x != points[i-1].first && y != points[i-1].second){
+					pathDiagonals++;
+				}
+			}
+			pathPoints = points;
+			return shortestPathWeights;
+		}
 		
 		std::vector<std::tuple<int,int>> getNeighborIndices(int i, int j){
 			// non diagonal
@@ -208,6 +591,18 @@ class AStar {
 		}
 		
 		int heuristic(int point1X, int point1Y, int point2X, int point2Y){
+			if(landmarkDistances){
+				// lower bound d(landmark, point2) - d(landmark, point1) of every landmark
+				int bound = std::max(std::abs(point2X-point1X), std::abs(point2Y-point1Y)) * minValue;
+				int i = index(point1X, point1Y);
+				for(size_t l=0; l<landmarkDistances->size(); l++){
+					int distance = (*landmarkDistances)[l][i];
+					if(targetLandmarkDistances[l] != INT_MAX && distance != INT_MAX){
+						bound = std::max(bound, targetLandmarkDistances[l] - distance);
+					}
+				}
+				return bound;
+			}
 			int factor = 0;
 			if(heuristicIndex == 0){
 				factor = minValue;			
@@ -237,9 +632,46 @@ class AStar {
 PYBIND11_MODULE(AStarC,m) {
 	py::class_<AStar>(m, "AStar")
 	.def(py::init<const std::vector<std::vector<int>>, int, int, int, bool>())
-	.def("shortestPath", &AStar::shortestPath)
-	.def("getShortestPathMatrix1", &AStar::getShortestPathMatrix1)
-	.def("getShortestPathMatrix2", &AStar::getShortestPathMatrix2)
-	.def("getShortestPathMatrix3", &AStar::getShortestPathMatrix3)
-	.def("getNumberOfDiagonals", &AStar::getNumberOfDiagonals);
+	// the searches run without the GIL, so other threads can search at the same time with other AStar objects
+	.def("shortestPath", &AStar::shortestPath, py::call_guard<py::gil_scoped_release>())
+	.def("shortestPathsFromSource", &AStar::shortestPathsFromSource, py::call_guard<py::gil_scoped_release>())
+	.def("shortestPaths", [](AStar &self, py::array_t<int, py::array::c_style | py::array::forcecast> pixelPairs){
+		// returns (values, offsets, diagonals) as numpy arrays, see AStar::shortestPaths
+		if(pixelPairs.ndim() != 2 || pixelPairs.shape(1) != 4){
+			throw std::invalid_argument("pixelPairs must have the shape (n, 4)");
+		}
+		std::vector<std::array<int,4>> pairs(size_t(pixelPairs.shape(0)));
+		auto pairValues = pixelPairs.unchecked<2>();
+		for(size_t i=0; i<pairs.size(); i++){
+			for(int j=0; j<4; j++){
+				pairs[i][j] = pairValues(py::ssize_t(i), j);
+			}
+		}
+		std::vector<int> values;
+		std::vector<int64_t> offsets;
+		std::vector<int> diagonals;
+		{
+			py::gil_scoped_release release;
+			self.shortestPaths(pairs, values, offsets, diagonals);
+		}
+		return py::make_tuple(py::array_t<int>(py::ssize_t(values.size()), values.data()),
+							  py::array_t<int64_t>(py::ssize_t(offsets.size()), offsets.data()),
+							  py::array_t<int>(py::ssize_t(diagonals.size()), diagonals.data()));
+	})
+	.def("copySearch", &AStar::copySearch)
+	.def("setLandmarks", &AStar::setLandmarks, py::call_guard<py::gil_scoped_release>())
+	.def("setBidirectional", &AStar::setBidirectional)
+	.def("isExact", &AStar::isExact)
+	.def("getShortestPathView", [](py::object self){
+		// numpy view of the shortest path view without a copy, which keeps the AStar object alive
+		AStar &aStar = self.cast<AStar&>();
+		std::vector<uint8_t> &view = aStar.getShortestPathView();
+		// the view is empty if the AStar object does not create it
+		py::ssize_t rows = view.empty() ? 0 : aStar.getRowCount();
+		py::ssize_t cols = view.empty() ? 0 : aStar.getColCount();
+		return py::array_t<uint8_t>({rows, cols, py::ssize_t(3)},
+									{cols * 3, py::ssize_t(3), py::ssize_t(1)}, view.data(), self);
+	})
+	.def("getNumberOfDiagonals", &AStar::getNumberOfDiagonals)
+	.def("getPathPoints", &AStar::getPathPoints);
 }
@@ -20,22 +20,33 @@ import sys
 
 import numpy as np
 
-from qgis.core import QgsCoordinateTransform, QgsProject, QgsRasterBandStats
+from qgis.core import QgsCoordinateTransform, QgsProject
 from osgeo import gdal
 
-try:
-    from ..lib.AStarC import AStar
-except ImportError:
-    # use non-performant pure Python implementation
-    from .aStarPython import AStar
+from .rasterSampler import pixelPositions
+from .rasterSearchCache import RasterSearchCache
+from .rasterTiles import deviationBound
 
 
 class AStarOnRasterData:
 
-    def __init__(self, rLayer, band, sourceCrs, heuristicIndex, createShortestPathMatrix, rasterID, heursticID):
+    def __init__(self, rLayer, band, sourceCrs, heuristicIndex, createShortestPathMatrix, rasterID, heursticID,
+                 memoryBudget=None, corridorMargin=200, searchMode="Heuristic", landmarkCount=8, hierarchyFactor=0):
+        """
+        Constructor
+
+        :type memoryBudget: Integer number of bytes, rasters which need more to be searched as a whole are
+                            read in tiles and searched in a corridor around the endpoints of every path.
+                            None to always search the whole raster
+        :type corridorMargin: Integer minimum number of pixels around the endpoints in a corridor search
+        :type searchMode: String Heuristic to search with the heuristic of heuristicIndex, Bidirectional or
+                          Landmarks for exact searches
+        :type landmarkCount: Integer number of landmarks of the Landmarks search
+        :type hierarchyFactor: Integer, if larger than 1 the paths are planned on blocks of hierarchyFactor x
+                               hierarchyFactor pixels and refined at full resolution along the planned path
+        """
         self.heuristicIndex = heuristicIndex
         ds = gdal.Open(rLayer.source())
-        readBand = ds.GetRasterBand(band)
         self.bandID = band
         self.rLayer = rLayer
         self.sourceCrs = sourceCrs
@@ -47,66 +58,98 @@ class AStarOnRasterData:
         self.cols = ds.RasterXSize
         self.rows = ds.RasterYSize
         self.transform = ds.GetGeoTransform()
-        self.xOrigin = self.transform[0]
-        self.yOrigin = self.transform[3]
-        self.pixelWidth = self.transform[1]
-        self.pixelHeight = -self.transform[5]
 
-        self.matrix = np.array(readBand.ReadAsArray())
-
-        self.matrixRowSize = self.matrix.shape[0]
-        self.matrixColSize = self.matrix.shape[1]
-        self.predMatrix = None
-
-        self.pixelWeights = None
-        minRasterValue = int((self.rLayer.dataProvider().bandStatistics(self.bandID, QgsRasterBandStats.All))
-                             .minimumValue)
-        meanRasterValue = int((self.rLayer.dataProvider().bandStatistics(self.bandID, QgsRasterBandStats.All)).mean)
+        self.matrixRowSize = self.rows
+        self.matrixColSize = self.cols
 
         # ----------------------------------
 
-        self.aStarObject = AStar(readBand.ReadAsArray(), heuristicIndex, minRasterValue, meanRasterValue,
-                                 createShortestPathMatrix)
+        # the search and the statistics of the band are shared by all calculations of the session
+        self.rasterSearch = RasterSearchCache.search(rLayer, band, heuristicIndex, createShortestPathMatrix,
+                                                     memoryBudget, corridorMargin, searchMode, landmarkCount,
+                                                     hierarchyFactor)
+        self.aStarObject = self.rasterSearch.search
+        self.matrix = self.rasterSearch.matrix
+        # results of the last search of this object
+        self.diagonals = 0
+        self.deviationBound = 0
 
         # ----------------------------------
 
-    def getShortestPathWeight(self, startPoint, endPoint):
-        # transform coordinates
-        startPointTransform = self.tr.transform(startPoint)
-        endPointTransform = self.tr.transform(endPoint)
-
-        self.predMatrix = np.empty((self.matrixRowSize, self.matrixColSize), dtype=object)
+    def _pixelPosition(self, point):
+        """
+        :type point: QgsPointXY in the source crs
+        :return (row, col) of the pixel containing the point or None if the point is outside the raster
+        """
+        pointTransform = self.tr.transform(point)
+        # same pixels as the parallel calculation of the AdvancedCostCalculator
+        cols, rows = pixelPositions(self.transform, [pointTransform.x()], [pointTransform.y()])
+        col, row = int(cols[0]), int(rows[0])
+        if col >= self.matrixColSize or col < 0 or row < 0 or row >= self.matrixRowSize:
+            return None
+        return row, col
 
+    def getShortestPathWeight(self, startPoint, endPoint):
         # get position of points in matrix
-        startPointCol = int((startPointTransform.x() - self.xOrigin) / self.pixelWidth)
-        startPointRow = int((self.yOrigin - startPointTransform.y()) / self.pixelHeight)
-        endPointCol = int((endPointTransform.x() - self.xOrigin) / self.pixelWidth)
-        endPointRow = int((self.yOrigin - endPointTransform.y()) / self.pixelHeight)
+        startPixel = self._pixelPosition(startPoint)
+        endPixel = self._pixelPosition(endPoint)
 
         # check startPoint and endPoint are inside the raster, if not return max value
-        if startPointCol > self.matrixColSize or startPointCol < 0 or startPointRow < 0 or\
-           startPointRow > self.matrixRowSize:
-            return [sys.maxsize]
-        if endPointCol > self.matrixColSize or endPointCol < 0 or endPointRow < 0 or endPointRow > self.matrixRowSize:
+        if startPixel is None or endPixel is None:
             return [sys.maxsize]
 
         # ----------------------------------
 
-        return self.aStarObject.shortestPath(startPointRow, startPointCol, endPointRow, endPointCol)
+        with self.rasterSearch.lock:
+            shortestPathWeights = self.aStarObject.shortestPath(startPixel[0], startPixel[1], endPixel[0],
+                                                                endPixel[1])
+            self.diagonals = self.aStarObject.getNumberOfDiagonals()
+            self.deviationBound = deviationBound(self.aStarObject)
+        return shortestPathWeights
 
         # ----------------------------------
 
-    def getShortestPathMatrix1(self):
-        numpyTransform = np.matrix(self.aStarObject.getShortestPathMatrix1())
-        return numpyTransform
-
-    def getShortestPathMatrix2(self):
-        numpyTransform = np.matrix(self.aStarObject.getShortestPathMatrix2())
-        return numpyTransform
-
-    def getShortestPathMatrix3(self):
-        numpyTransform = np.matrix(self.aStarObject.getShortestPathMatrix3())
-        return numpyTransform
+    def getShortestPathWeights(self, startPoint, endPoints):
+        """
+        Shortest paths from one point to several points with a single search through the raster.
+        The paths are exact, so this should only replace getShortestPathWeight if the heuristic is
+        admissible.
+
+        :type startPoint: QgsPointXY
+        :type endPoints: List of QgsPointXY
+        :return List of (pixel values on the path, number of diagonal steps) for every endPoint
+        """
+        startPixel = self._pixelPosition(startPoint)
+        endPixels = [self._pixelPosition(endPoint) for endPoint in endPoints]
+        if startPixel is None:
+            return [([sys.maxsize], 0)] * len(endPoints)
+
+        targets = list({endPixel for endPixel in endPixels if endPixel is not None})
+        with self.rasterSearch.lock:
+            paths = dict(zip(targets, self.aStarObject.shortestPathsFromSource(startPixel[0], startPixel[1],
+                                                                               targets)))
+            self.deviationBound = deviationBound(self.aStarObject)
+        return [(list(paths[endPixel][0]), paths[endPixel][1]) if endPixel is not None else ([sys.maxsize], 0)
+                for endPixel in endPixels]
+
+    def getShortestPathView(self):
+        """
+        :return numpy uint8 array of rows x columns x 3 RGB pixels with the visited pixels and the found paths
+        """
+        return np.asarray(self.aStarObject.getShortestPathView())
 
     def getNumberOfDiagonals(self):
-        return self.aStarObject.getNumberOfDiagonals()
+        return self.diagonals
+
+    def isExact(self):
+        """
+        :return Boolean whether the found paths are guaranteed to be shortest paths
+        """
+        return self.aStarObject.isExact()
+
+    def getDeviationBound(self):
+        """
+        :return upper bound of the difference between the cost of the last found paths and the cost of
+                the shortest paths, None if there is no bound
+        """
+        return self.deviationBound
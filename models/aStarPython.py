@@ -17,135 +17,476 @@
 #  https://www.gnu.org/licenses/gpl-2.0.html.
 
 import heapq
+import math
 import random
 import sys
+from array import array
 
 import numpy as np
 
+# (row offset, column offset) of the neighbors of a pixel, the first four are not diagonal
+NEIGHBOR_DIRECTIONS = [(-1, 0), (0, -1), (0, 1), (1, 0), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+
 
 class AStar:
+    """
+    Pure Python fallback of AStarC. A pixel is encoded as the integer row * columns + column, the
+    raster and the search buffers are flat typed arrays indexed by these integers and the priority
+    queues hold (priority, pixel) pairs.
+    """
+
     def __init__(self, matrix, heuristicIndex, minValue, meanValue, createShortestPathMatrix):
-        self.matrix = np.array(matrix)
-        self.matrixRowSize = self.matrix.shape[0]
-        self.matrixColSize = self.matrix.shape[1]
+        matrix = np.asarray(matrix)
+        self.matrixRowSize = matrix.shape[0]
+        self.matrixColSize = matrix.shape[1]
+        pixelCount = self.matrixRowSize * self.matrixColSize
+
+        typecode = "q" if np.issubdtype(matrix.dtype, np.integer) else "d"
+        # shares the memory of matrices which already have the type, for example a memory mapped band
+        values = np.ascontiguousarray(matrix, dtype=np.int64 if typecode == "q" else np.float64)
+        self.values = memoryview(values).cast("B").cast(typecode)
+
+        # a search only steps into pixels inside of the raster bounds without the first row and column.
+        # Bit d of the mask of a pixel is set if its neighbor in NEIGHBOR_DIRECTIONS[d] can be entered.
+        rows, cols = np.indices((self.matrixRowSize, self.matrixColSize))
+        masks = np.zeros((self.matrixRowSize, self.matrixColSize), dtype=np.uint8)
+        for direction, (rowOffset, colOffset) in enumerate(NEIGHBOR_DIRECTIONS):
+            inside = (rows + rowOffset > 0) & (cols + colOffset > 0) & (rows + rowOffset < self.matrixRowSize) &\
+                (cols + colOffset < self.matrixColSize)
+            masks |= inside.astype(np.uint8) << direction
+        self.neighborMasks = masks.tobytes()
+        # mask -> pixel offsets of the neighbors which can be entered
+        offsets = [rowOffset * self.matrixColSize + colOffset for rowOffset, colOffset in NEIGHBOR_DIRECTIONS]
+        self.neighborOffsets = [tuple(offset for direction, offset in enumerate(offsets) if mask & (1 << direction))
+                                for mask in range(256)]
+
+        # search workspace, allocated once per raster and reused by all searches. An entry of
+        # pixelWeights and predecessors is only valid if its stamp equals the generation of the
+        # search, so a new search starts without clearing the buffers.
+        self.pixelWeights = array("d", [0.0]) * pixelCount
+        self.predecessors = array("i", [0]) * pixelCount
+        self.stamps = array("I", [0]) * pixelCount
+        self.generation = 0
 
         self.heuristicIndex = heuristicIndex
         self.minValue = minValue
         self.meanValue = meanValue
+        self.heuristicFactor = self._heuristicFactor()
         self.createShortestPathMatrix = createShortestPathMatrix
         self.diagonals = 0
+        # pixels of the last found path from its end to its start
+        self.pathPoints = []
+        # target pixel of the current search
+        self.targetRow = 0
+        self.targetCol = 0
+
+        # distances from the landmarks to every pixel for lower bounds of the distances, see setLandmarks
+        self.landmarks = []
+        self.landmarkDistances = None
+        self.targetLandmarkDistances = None
+        # backward search workspace, allocated by setBidirectional
+        self.bidirectional = False
+
+        # RGB pixels of the visited pixels and the colored paths of all searches
+        self.shortestPathView = np.zeros((self.matrixRowSize if createShortestPathMatrix else 0,
+                                          self.matrixColSize if createShortestPathMatrix else 0, 3), dtype=np.uint8)
+
+    def _startSearch(self):
+        self.generation += 1
+        if self.generation > np.iinfo(np.uint32).max:
+            # the stamps overflowed, entries of old searches could become valid again
+            self.stamps = array("I", [0]) * len(self.stamps)
+            if self.bidirectional:
+                self.backwardStamps = array("I", [0]) * len(self.backwardStamps)
+            self.generation = 1
+
+    def _weight(self, pixel):
+        if self.stamps[pixel] != self.generation:
+            return math.inf
+        return self.pixelWeights[pixel]
+
+    def _setWeight(self, pixel, weight, predecessor):
+        self.stamps[pixel] = self.generation
+        self.pixelWeights[pixel] = weight
+        self.predecessors[pixel] = predecessor
+
+    def setLandmarks(self, landmarkCount):
+        """
+        Computes the distances from landmarkCount landmarks to every pixel. The searches then use the
+        landmark lower bounds (ALT) instead of the heuristic of heuristicIndex and are exact. The first
+        landmark is the pixel next to the raster origin, every further landmark is the pixel farthest
+        away from the landmarks chosen before.
+
+        :type landmarkCount: Integer, 0 to remove the landmarks
+        """
+        self.landmarks = []
+        self.landmarkDistances = None
+        if landmarkCount <= 0 or self.matrixRowSize < 2 or self.matrixColSize < 2:
+            return
+
+        # the landmark searches are not part of the shortest path view
+        createShortestPathMatrix = self.createShortestPathMatrix
+        self.createShortestPathMatrix = False
+        distances = []
+        closest = None
+        landmark = (1, 1)
+        for _ in range(landmarkCount):
+            self.landmarks.append(landmark)
+            distances.append(self._distancesFrom(landmark))
+            # next landmark is the reachable pixel farthest away from all landmarks
+            landmarkDistances = np.frombuffer(distances[-1], dtype=np.float64)
+            closest = landmarkDistances.copy() if closest is None else np.minimum(closest, landmarkDistances)
+            farthest = int(np.argmax(np.where(np.isfinite(closest), closest, -1)))
+            landmark = divmod(farthest, self.matrixColSize)
+            if landmark in self.landmarks:
+                break
+        self.landmarkDistances = distances
+        self.createShortestPathMatrix = createShortestPathMatrix
+
+    def setBidirectional(self, bidirectional):
+        """
+        Searches from both endpoints at once without a heuristic, the paths are exact.
 
-        if createShortestPathMatrix:
-            self.shortestPathMatrix1 = np.zeros((self.matrixRowSize, self.matrixColSize))
-            self.shortestPathMatrix2 = np.zeros((self.matrixRowSize, self.matrixColSize))
-            self.shortestPathMatrix3 = np.zeros((self.matrixRowSize, self.matrixColSize))
+        :type bidirectional: Boolean
+        """
+        self.bidirectional = bidirectional
+        if bidirectional and not hasattr(self, "backwardWeights"):
+            self.backwardWeights = array("d", [0.0]) * len(self.values)
+            self.successors = array("i", [0]) * len(self.values)
+            self.backwardStamps = array("I", [0]) * len(self.values)
+
+    def isExact(self):
+        """
+        :return Boolean whether the found paths are guaranteed to be shortest paths
+        """
+        return self.bidirectional or self.landmarkDistances is not None or self.heuristicIndex == 0
+
+    def _distancesFrom(self, source):
+        """
+        :return array of the distances from source to every pixel, inf for unreachable pixels
+        """
+        self.shortestPathsFromSource(source[0], source[1], [])
+        reached = np.frombuffer(self.stamps, dtype=np.uint32) == self.generation
+        distances = array("d")
+        distances.frombytes(np.where(reached, np.frombuffer(self.pixelWeights), np.inf).tobytes())
+        return distances
 
     def shortestPath(self, x1, y1, x2, y2):
         self.diagonals = 0
-        pixelWeights = np.full((self.matrixRowSize, self.matrixColSize), np.inf)
-        predMatrix = np.empty((self.matrixRowSize, self.matrixColSize), dtype=tuple)
+        self._startSearch()
+        startPixel = x1 * self.matrixColSize + y1
+        endPixel = x2 * self.matrixColSize + y2
+        self._setWeight(startPixel, 0, startPixel)
 
-        randomRed = random.randint(0, 255)
-        randomGreen = random.randint(0, 255)
-        randomBlue = random.randint(0, 255)
+        if self.bidirectional:
+            return self._bidirectionalPath(startPixel, endPixel)
+        self.targetRow = x2
+        self.targetCol = y2
+        if self.landmarkDistances is not None:
+            self.targetLandmarkDistances = [distances[endPixel] for distances in self.landmarkDistances]
+
+        # the relaxation of _relaxNeighbors is inlined in this loop with local names, which is the
+        # most expensive part of the search in Python
+        values = self.values
+        pixelWeights = self.pixelWeights
+        predecessors = self.predecessors
+        stamps = self.stamps
+        generation = self.generation
+        neighborMasks = self.neighborMasks
+        neighborOffsets = self.neighborOffsets
+        heuristic = self._heuristic
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        pq = [(0, startPixel)]
+        while pq:
+            currentWeight, current = heappop(pq)
 
-        pixelWeights[x1][y1] = 0
-
-        startPoint = (x1, y1)
-        endPoint = (x2, y2)
-
-        pq = []
-        heapq.heappush(pq, (0, startPoint))
-
-        while len(pq) > 0:
-            popResult = heapq.heappop(pq)
-            currentWeight = popResult[0]
-            current = popResult[1]
-
-            if current == endPoint:
-                shortestPathWeights = []
-                u = (endPoint[0], endPoint[1])
-                currPathPoint = (endPoint[0], endPoint[1])
-                while currPathPoint != startPoint:
-                    if self.createShortestPathMatrix:
-                        self.shortestPathMatrix1[currPathPoint[0]][currPathPoint[1]] =\
-                            (self.shortestPathMatrix1[currPathPoint[0]][currPathPoint[1]] + randomRed) / 2
-                        self.shortestPathMatrix2[currPathPoint[0]][currPathPoint[1]] =\
-                            (self.shortestPathMatrix2[currPathPoint[0]][currPathPoint[1]] + randomGreen) / 2
-                        self.shortestPathMatrix3[currPathPoint[0]][currPathPoint[1]] =\
-                            (self.shortestPathMatrix3[currPathPoint[0]][currPathPoint[1]] + randomBlue) / 2
-                    shortestPathWeights.append(self.matrix[u[0]][u[1]])
-                    prevX = u[0]
-                    prevY = u[1]
-                    u = predMatrix[u[0]][u[1]]
-                    if u[0] != prevX and u[1] != prevY:
-                        self.diagonals = self.diagonals + 1
-
-                    currPathPoint = (u[0], u[1])
-                shortestPathWeights.append(self.matrix[startPoint[0], startPoint[1]])
-                if self.createShortestPathMatrix:
-                    self.shortestPathMatrix1[startPoint[0]][startPoint[1]] =\
-                        (self.shortestPathMatrix1[currPathPoint[0]][currPathPoint[1]] + randomRed) / 2
-                    self.shortestPathMatrix2[startPoint[0]][startPoint[1]] =\
-                        (self.shortestPathMatrix2[currPathPoint[0]][currPathPoint[1]] + randomGreen) / 2
-                    self.shortestPathMatrix3[startPoint[0]][startPoint[1]] =\
-                        (self.shortestPathMatrix3[currPathPoint[0]][currPathPoint[1]] + randomBlue) / 2
+            if current == endPixel:
+                shortestPathWeights, self.diagonals = self._reconstructPath(startPixel, endPixel)
                 return shortestPathWeights
 
-            if currentWeight - self._heuristic(current, endPoint) > pixelWeights[current[0]][current[1]]:
+            currentDistance = pixelWeights[current]
+            # same sum as the priority of the push, subtracting the heuristic could round up and skip the pixel
+            if currentWeight > currentDistance + heuristic(current):
                 continue
 
-            # check the neighbor pixels of current
-            for neighbor in self._getNeighborIndices(current[0], current[1]):
-                newDistance = pixelWeights[current[0]][current[1]] + self.matrix[current[0]][current[1]]
-
-                # check that the neighbor is not out of raster bounds
-                if neighbor[0] > 0 and neighbor[1] > 0 and neighbor[0] < len(self.matrix) and\
-                   neighbor[1] < len(self.matrix[0]):
-                    if newDistance < pixelWeights[neighbor[0]][neighbor[1]]:
-                        predMatrix[neighbor[0]][neighbor[1]] = (current[0], current[1])
-                        pixelWeights[neighbor[0]][neighbor[1]] = newDistance
-                        if self.createShortestPathMatrix:
-                            if self.shortestPathMatrix1[current[0]][current[1]] == 0 and\
-                               self.shortestPathMatrix2[current[0]][current[1]] == 0 and\
-                               self.shortestPathMatrix3[current[0]][current[1]] == 0:
-                                self.shortestPathMatrix1[current[0]][current[1]] = 255
-                                self.shortestPathMatrix2[current[0]][current[1]] = 255
-                                self.shortestPathMatrix3[current[0]][current[1]] = 255
-
-                        heapq.heappush(pq, (pixelWeights[neighbor[0]][neighbor[1]] +
-                                            self._heuristic(neighbor, endPoint), neighbor))
+            newDistance = currentDistance + values[current]
+            improved = False
+            for offset in neighborOffsets[neighborMasks[current]]:
+                neighbor = current + offset
+                if stamps[neighbor] != generation or newDistance < pixelWeights[neighbor]:
+                    stamps[neighbor] = generation
+                    pixelWeights[neighbor] = newDistance
+                    predecessors[neighbor] = current
+                    heappush(pq, (newDistance + heuristic(neighbor), neighbor))
+                    improved = True
+            if improved and self.createShortestPathMatrix:
+                self._markVisited(current)
 
         return [sys.maxsize]
 
-    def getShortestPathMatrix1(self):
-        return self.shortestPathMatrix1
+    def shortestPathsFromSource(self, x1, y1, targets):
+        """
+        One to many Dijkstra search, which expands once from the source and stops as soon as the
+        last target is settled. Settles all reachable pixels if there are no targets.
 
-    def getShortestPathMatrix2(self):
-        return self.shortestPathMatrix2
+        :type targets: List of (x, y)
+        :return List of (pixel values on the shortest path, number of diagonal steps) for every target
+        """
+        self._startSearch()
+        startPixel = x1 * self.matrixColSize + y1
+        self._setWeight(startPixel, 0, startPixel)
 
-    def getShortestPathMatrix3(self):
-        return self.shortestPathMatrix3
+        targetPixels = [x * self.matrixColSize + y for x, y in targets]
+        remainingTargets = set(targetPixels)
+        paths = {}
+        # without targets all reachable pixels are settled
+        settleAll = len(remainingTargets) == 0
 
-    def getNumberOfDiagonals(self):
-        return self.diagonals
+        values = self.values
+        pixelWeights = self.pixelWeights
+        predecessors = self.predecessors
+        stamps = self.stamps
+        generation = self.generation
+        neighborMasks = self.neighborMasks
+        neighborOffsets = self.neighborOffsets
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        pq = [(0, startPixel)]
+        while pq and (remainingTargets or settleAll):
+            currentWeight, current = heappop(pq)
+            currentDistance = pixelWeights[current]
+            if currentWeight > currentDistance:
+                continue
+
+            if current in remainingTargets:
+                remainingTargets.discard(current)
+                paths[current] = self._reconstructPath(startPixel, current)
+                if not remainingTargets:
+                    break
+
+            newDistance = currentDistance + values[current]
+            improved = False
+            for offset in neighborOffsets[neighborMasks[current]]:
+                neighbor = current + offset
+                if stamps[neighbor] != generation or newDistance < pixelWeights[neighbor]:
+                    stamps[neighbor] = generation
+                    pixelWeights[neighbor] = newDistance
+                    predecessors[neighbor] = current
+                    heappush(pq, (newDistance, neighbor))
+                    improved = True
+            if improved and self.createShortestPathMatrix:
+                self._markVisited(current)
+
+        return [paths.get(targetPixel, ([sys.maxsize], 0)) for targetPixel in targetPixels]
 
-    def _getNeighborIndices(self, i, j):
-        # non diagonal
-        bm = (i-1, j)
-        ml = (i, j-1)
-        mr = (i, j+1)
-        tm = (i+1, j)
+    def shortestPaths(self, pixelPairs):
+        """
+        Batch version of shortestPath, the exact Dijkstra search shares one search for all pairs with the
+        same start pixel.
 
-        # diagonal
-        bl = (i-1, j-1)
-        br = (i-1, j+1)
-        tl = (i+1, j-1)
-        tr = (i+1, j+1)
+        :type pixelPairs: numpy array of shape (n, 4) with the rows (startRow, startCol, endRow, endCol)
+        :return (numpy array of the pixel values of all paths one after another, numpy array of the offsets
+                 of the paths, path i is values[offsets[i]:offsets[i + 1]], numpy array with the number of
+                 diagonal steps of every path). Pairs with a pixel outside of the raster get [sys.maxsize]
+        """
+        pixelPairs = np.asarray(pixelPairs, dtype=np.int64).reshape(-1, 4)
+        paths = [[sys.maxsize]] * len(pixelPairs)
+        diagonals = [0] * len(pixelPairs)
+        inside = (pixelPairs >= 0).all(axis=1) & (pixelPairs[:, [0, 2]] < self.matrixRowSize).all(axis=1) &\
+            (pixelPairs[:, [1, 3]] < self.matrixColSize).all(axis=1)
 
-        return [bm, ml, mr, tm, bl, br, tl, tr]
+        # start pixel -> positions of the pairs starting there
+        pairsBySource = {}
+        for i in np.nonzero(inside)[0]:
+            startRow, startCol, endRow, endCol = (int(value) for value in pixelPairs[i])
+            if self.heuristicIndex == 0 and not self.bidirectional and self.landmarkDistances is None:
+                pairsBySource.setdefault((startRow, startCol), []).append(i)
+            else:
+                paths[i] = self.shortestPath(startRow, startCol, endRow, endCol)
+                diagonals[i] = self.diagonals
+        for (startRow, startCol), positions in pairsBySource.items():
+            targets = [(int(pixelPairs[i][2]), int(pixelPairs[i][3])) for i in positions]
+            for i, (pixelValues, numberOfDiagonals) in zip(positions, self.shortestPathsFromSource(startRow, startCol,
+                                                                                                  targets)):
+                paths[i] = pixelValues
+                diagonals[i] = numberOfDiagonals
 
-    def _heuristic(self, point1, point2):
+        offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(path) for path in paths])
+        values = np.fromiter((value for path in paths for value in path),
+                             dtype=np.int64 if self.values.format == "q" else np.float64, count=int(offsets[-1]))
+        return values, offsets, np.array(diagonals, dtype=np.int64)
+
+    def _relaxNeighbors(self, current, newDistance):
+        """
+        Updates the distances of the neighbor pixels of current.
+
+        :type newDistance: distance of the neighbors over current
+        :return List of the neighbors with a shorter distance
+        """
+        pixelWeights = self.pixelWeights
+        stamps = self.stamps
+        generation = self.generation
+        improved = []
+        for offset in self.neighborOffsets[self.neighborMasks[current]]:
+            neighbor = current + offset
+            if stamps[neighbor] != generation or newDistance < pixelWeights[neighbor]:
+                stamps[neighbor] = generation
+                pixelWeights[neighbor] = newDistance
+                self.predecessors[neighbor] = current
+                improved.append(neighbor)
+        if improved and self.createShortestPathMatrix:
+            self._markVisited(current)
+        return improved
+
+    def _markVisited(self, pixel):
+        # marks the pixel white in the shortest path view unless it is already colored
+        row, col = divmod(pixel, self.matrixColSize)
+        if not self.shortestPathView[row, col].any():
+            self.shortestPathView[row, col] = 255
+
+    def _bidirectionalPath(self, startPixel, endPixel):
+        """
+        Bidirectional Dijkstra search, the backward search follows the steps into a pixel in reverse.
+
+        :return List of pixel values from the endPixel to the startPixel
+        """
+        if endPixel != startPixel and not self._isInside(endPixel):
+            return [sys.maxsize]
+        self._setBackwardWeight(endPixel, 0, endPixel)
+        # the forward search only steps into pixels inside of the raster bounds, which are also the only
+        # pixels it steps from besides the startPixel
+        startRow, startCol = divmod(startPixel, self.matrixColSize)
+        startOutside = not self._isInside(startPixel)
+
+        forwardQueue = [(0, startPixel)]
+        backwardQueue = [(0, endPixel)]
+        # length of the shortest path found so far and the pixel where its two halves meet
+        best = math.inf
+        meeting = None
+        if startPixel == endPixel:
+            best = 0
+            meeting = startPixel
+
+        while forwardQueue and backwardQueue and forwardQueue[0][0] + backwardQueue[0][0] < best:
+            if len(forwardQueue) <= len(backwardQueue):
+                currentWeight, current = heapq.heappop(forwardQueue)
+                currentDistance = self.pixelWeights[current]
+                if currentWeight > currentDistance:
+                    continue
+                newDistance = currentDistance + self.values[current]
+                for neighbor in self._relaxNeighbors(current, newDistance):
+                    heapq.heappush(forwardQueue, (newDistance, neighbor))
+                    if newDistance + self._backwardWeight(neighbor) < best:
+                        best = newDistance + self._backwardWeight(neighbor)
+                        meeting = neighbor
+            else:
+                currentWeight, current = heapq.heappop(backwardQueue)
+                currentDistance = self.backwardWeights[current]
+                if currentWeight > currentDistance:
+                    continue
+                neighbors = [current + offset for offset in self.neighborOffsets[self.neighborMasks[current]]]
+                if startOutside:
+                    row, col = divmod(current, self.matrixColSize)
+                    if current != startPixel and abs(row - startRow) <= 1 and abs(col - startCol) <= 1:
+                        neighbors.append(startPixel)
+                for neighbor in neighbors:
+                    newDistance = currentDistance + self.values[neighbor]
+                    if newDistance < self._backwardWeight(neighbor):
+                        self._setBackwardWeight(neighbor, newDistance, current)
+                        heapq.heappush(backwardQueue, (newDistance, neighbor))
+                        if self._weight(neighbor) + newDistance < best:
+                            best = self._weight(neighbor) + newDistance
+                            meeting = neighbor
+
+        if meeting is None:
+            return [sys.maxsize]
+
+        # path from the endPixel to the meeting pixel, followed by the path to the startPixel
+        pixels = []
+        u = meeting
+        while u != endPixel:
+            u = self.successors[u]
+            pixels.append(u)
+        pixels.reverse()
+        pixels.extend(self._predecessorPixels(startPixel, meeting))
+        shortestPathWeights, self.diagonals = self._pathWeights(pixels)
+        return shortestPathWeights
+
+    def _isInside(self, pixel):
+        row, col = divmod(pixel, self.matrixColSize)
+        return row > 0 and col > 0
+
+    def _backwardWeight(self, pixel):
+        if self.backwardStamps[pixel] != self.generation:
+            return math.inf
+        return self.backwardWeights[pixel]
+
+    def _setBackwardWeight(self, pixel, weight, successor):
+        self.backwardStamps[pixel] = self.generation
+        self.backwardWeights[pixel] = weight
+        self.successors[pixel] = successor
+
+    def _predecessorPixels(self, startPixel, endPixel):
+        """
+        :return List of the pixels on the path of the current search from the endPixel to the startPixel
+        """
+        pixels = [endPixel]
+        u = endPixel
+        while u != startPixel:
+            u = self.predecessors[u]
+            pixels.append(u)
+        return pixels
+
+    def _reconstructPath(self, startPixel, endPixel):
+        """
+        Follows the predecessors of the current search from the endPixel back to the startPixel.
+
+        :return (pixel values from the endPixel to the startPixel, number of diagonal steps)
+        """
+        return self._pathWeights(self._predecessorPixels(startPixel, endPixel))
+
+    def _pathWeights(self, pixels):
+        """
+        Colors the path in the shortest path matrices.
+
+        :type pixels: List of the pixels on the path
+        :return (pixel values of the pixels, number of diagonal steps)
+        """
+        randomRed = random.randint(0, 255)
+        randomGreen = random.randint(0, 255)
+        randomBlue = random.randint(0, 255)
+
+        cols = self.matrixColSize
+        diagonals = 0
+        for i in range(1, len(pixels)):
+            step = abs(pixels[i] - pixels[i - 1])
+            if step != 1 and step != cols:
+                diagonals = diagonals + 1
+        shortestPathWeights = [self.values[pixel] for pixel in pixels]
+        self.pathPoints = [divmod(pixel, cols) for pixel in pixels]
+        if self.createShortestPathMatrix:
+            pathRows, pathCols = np.divmod(np.array(pixels), cols)
+            color = np.array([randomRed, randomGreen, randomBlue], dtype=np.uint16)
+            self.shortestPathView[pathRows, pathCols] = (self.shortestPathView[pathRows, pathCols] + color) // 2
+        return shortestPathWeights, diagonals
+
+    def getShortestPathView(self):
+        """
+        :return numpy uint8 array of rows x columns x 3 RGB pixels, empty if the view is not created
+        """
+        return self.shortestPathView
+
+    def getNumberOfDiagonals(self):
+        return self.diagonals
+
+    def getPathPoints(self):
+        return self.pathPoints
+
+    def _heuristicFactor(self):
         factor = 0
         if self.heuristicIndex == 0:
             factor = self.minValue
@@ -160,4 +501,16 @@ class AStar:
                 factor = int(self.meanValue/1.25)
             elif self.heuristicIndex == 5:
                 factor = int(self.meanValue)
-        return max(abs(point2[0]-point1[0]), abs(point2[1]-point1[1])) * factor
+        return factor
+
+    def _heuristic(self, pixel):
+        row, col = divmod(pixel, self.matrixColSize)
+        distance = max(abs(self.targetRow - row), abs(self.targetCol - col))
+        if self.landmarkDistances is not None:
+            # lower bound d(landmark, target) - d(landmark, pixel) of every landmark
+            bound = distance * self.minValue
+            for targetDistance, distances in zip(self.targetLandmarkDistances, self.landmarkDistances):
+                if targetDistance != math.inf and targetDistance - distances[pixel] > bound:
+                    bound = targetDistance - distances[pixel]
+            return bound
+        return distance * self.heuristicFactor
@@ -16,20 +16,28 @@
 #  License along with this program; if not, see
 #  https://www.gnu.org/licenses/gpl-2.0.html.
 
+import copy
 import math
-import random
-import re
-import statistics
+import sys
+from concurrent.futures import as_completed
+from functools import partial
 
 import numpy as np
 
-from qgis.core import (QgsWkbTypes, QgsField, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPoint, QgsPointXY,
-                       QgsDistanceArea, QgsProcessingUtils, QgsRasterLayer, QgsCoordinateTransform, QgsProject)
-from qgis.PyQt.QtCore import QVariant
-from qgis import processing
+from qgis.core import (QgsWkbTypes, QgsPointXY, QgsDistanceArea, QgsProcessingUtils, QgsRasterLayer,
+                       QgsCoordinateTransform, QgsProject)
 from osgeo import gdal, osr
 
 from .aStarOnRasterData import AStarOnRasterData
+from .costFormula import CostFormula
+from .costWorkers import (createProcessPool, createSearchThreadPool, initializeShortestPathWorker, shortestPathBatch,
+                          threadSearchBatch)
+from .polygonPredicates import PolygonPredicates
+from .rasterCache import rasterCacheKey
+from .rasterSearchCache import RasterSearchCache
+from .rasterSampler import pixelPositions, sampleAlongEdges, transformCoordinates
+from .rasterTiles import NATIVE_SEARCH, fullSearchBytes, maxDeviationBound, searchThreadCount, shareBand
+from .segmentStatistics import SegmentStatistics
 
 
 class AdvancedCostCalculator():
@@ -39,7 +47,9 @@ class AdvancedCostCalculator():
     """
 
     def __init__(self, rLayers, vLayer, graph, polygons, usePolygons, rasterBands, task, allowDoubleEdges,
-                 createShortestPathView=False):
+                 createShortestPathView=False, workerCount=1, rasterCache=None, rasterMemoryBudget=None,
+                 rasterCorridorMargin=200, rasterSearchMode="Heuristic", rasterLandmarkCount=8,
+                 rasterHierarchyFactor=0):
         """
         Constructor
 
@@ -48,6 +58,17 @@ class AdvancedCostCalculator():
         :type graph: ExtGraph
         :type usePolygons: Boolean
         :type rasterBands: List of Integer [1..numberOfBands]
+        :type workerCount: Integer number of processes for shortest paths through the raster,
+                           not used if the shortest path view is created
+        :type rasterCache: RasterCache with shortest paths of earlier calculations or None, the cached paths
+                           are not read if the shortest path view is created
+        :type rasterMemoryBudget: Integer number of bytes for the shortest paths through a raster, larger
+                                  rasters are searched in corridors around the edges. None for no limit
+        :type rasterCorridorMargin: Integer minimum number of pixels around the edges in a corridor search
+        :type rasterSearchMode: String one of Heuristic, Bidirectional, Landmarks, see AStarOnRasterData
+        :type rasterLandmarkCount: Integer number of landmarks of the Landmarks search
+        :type rasterHierarchyFactor: Integer block size of the coarse to fine search through a raster, 0 to
+                                     search at full resolution
         """
         self.rLayers = rLayers
         self.vLayerFields = []
@@ -55,671 +76,685 @@ class AdvancedCostCalculator():
         self.graph = graph
         self.allowDoubleEdges = allowDoubleEdges
 
-        self.pointValuesForEdge = [None] * len(self.rLayers)
-        self.pixelValuesForEdge = [None] * len(self.rLayers) * 6
+        # (rasterIndex, heuristicIndex, fromPoint, toPoint) -> (pixel values, number of diagonals)
         self.spForPointPairs = {}
 
         self.polygons = polygons
         self.usePolygons = usePolygons
         self.rasterBands = rasterBands
-        self.operators = ["+", "-", "*", "/", "(", ")"]
-        self.mathOperatorsWithTwoVar = ["pow", "dist", "comb", "copysign", "fmod", "ldexp", "remainder", "log", "atan2"]
-        self.translatedParts = {}
-        self.formulaParts = []
         self.aStarAlgObjects = []
         self.task = task
         self.createShortestPathView = createShortestPathView
+        self.workerCount = workerCount
+        self.rasterCache = rasterCache
+        self.rasterMemoryBudget = rasterMemoryBudget
+        self.rasterCorridorMargin = rasterCorridorMargin
+        self.rasterSearchMode = rasterSearchMode
+        self.rasterLandmarkCount = rasterLandmarkCount
+        self.rasterHierarchyFactor = rasterHierarchyFactor
+        # (rasterIndex, heuristicIndex) -> largest deviation bound of the calculated shortest paths, see deviationBound
+        self.shortestPathDeviationBounds = {}
         self.shortestPathViewLayers = []
-        self.euclDistPixelNeighbors = []
-        self.manDistPixelNeighbors = []
-        self.geoDistPixelNeighbors = []
-        self.ellDistPixelNeighbors = []
-
-    def __translate(self, part, edgeID, sampledPointsLayer, edgesInPolygonsList=None,
-                    edgesCrossingPolygonsList=None):
+        # (rasterIndex, metric) -> distance between neighboring pixels
+        self.pixelNeighborDistances = {}
+        # polygonIndex -> PolygonPredicates, kept to check edited edges
+        self.polygonPredicates = {}
+        # rasterIndex -> path of the band mapped into memory by the workers, see shareBand
+        self.__sharedBands = {}
+
+        # cost functions of the last call of setAllEdgeCosts, used to update the costs of edited edges
+        self.costFunctions = []
+        self.costFunctionSeeds = []
+        self.__formulas = []
+
+        # per call of setAllEdgeCosts or updateEdgeCosts
+        self.__edgeIds = []
+        self.__useWorkers = False
+        self.__edgeCoordinates = None
+        self.__samples = {}
+        self.__statistics = {}
+        self.__polygonColumns = {}
+        self.__termProgress = 0
+        self.__termProgressSpent = 0
+
+    def copy(self, graph):
         """
-        Method translates the given part into a number that can replace the variable in the formula.
+        Creates a calculator for a copy of the graph, so updating the costs of one graph does not
+        change the calculator of the other one. Layers, cost functions and the searches of the
+        RasterSearchCache are shared, the shortest paths found so far are copied. Polygon predicates
+        and AStar objects keep state between searches and are created again by the copy.
 
-        :type part: String
-        :type edgeID: Int defining the edge that gets the translated weight
-        :type sampledPointsLayer: List of features
-        :type edgesInPolygonList: List of features
-        :type edgesCrossingPolygonsList: List of features
-        :return translated part as string
+        :type graph: ExtGraph copy of the graph of this calculator
+        :return AdvancedCostCalculator
+        """
+        calculatorCopy = copy.copy(self)
+        calculatorCopy.graph = graph
+        calculatorCopy.task = None
+        calculatorCopy.vLayerFields = list(self.vLayerFields)
+        calculatorCopy.spForPointPairs = dict(self.spForPointPairs)
+        calculatorCopy.aStarAlgObjects = []
+        calculatorCopy.shortestPathDeviationBounds = dict(self.shortestPathDeviationBounds)
+        calculatorCopy.shortestPathViewLayers = list(self.shortestPathViewLayers)
+        calculatorCopy.pixelNeighborDistances = dict(self.pixelNeighborDistances)
+        calculatorCopy.polygonPredicates = {}
+        calculatorCopy.__sharedBands = dict(self.__sharedBands)
+        calculatorCopy.costFunctions = list(self.costFunctions)
+        calculatorCopy.costFunctionSeeds = list(self.costFunctionSeeds)
+        calculatorCopy.__formulas = list(self.__formulas)
+
+        calculatorCopy.__edgeIds = []
+        calculatorCopy.__edgeCoordinates = None
+        calculatorCopy.__samples = {}
+        calculatorCopy.__statistics = {}
+        calculatorCopy.__polygonColumns = {}
+        return calculatorCopy
+
+    def __getEdgeCoordinates(self):
+        """
+        :return numpy arrays (fromX, fromY, toX, toY) of the edges of the current calculation
+        """
+        if self.__edgeCoordinates is None:
+            coordinates = np.zeros((4, len(self.__edgeIds)))
+            for i, edgeId in enumerate(self.__edgeIds):
+                edge = self.graph.edge(edgeId)
+                fromPoint = self.graph.vertex(edge.fromVertex()).point()
+                toPoint = self.graph.vertex(edge.toVertex()).point()
+                coordinates[:, i] = (fromPoint.x(), fromPoint.y(), toPoint.x(), toPoint.y())
+            self.__edgeCoordinates = tuple(coordinates)
+        return self.__edgeCoordinates
+
+    def __raggedArray(self, valuesPerEdge):
+        """
+        :type valuesPerEdge: List with a list of values for every edge
+        :return (numpy array of all values, numpy array of offsets)
+        """
+        offsets = np.zeros(len(valuesPerEdge) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(values) for values in valuesPerEdge])
+        values = np.fromiter((value for values in valuesPerEdge for value in values), dtype=float,
+                             count=offsets[-1])
+        return values, offsets
+
+    def __isCanceled(self):
+        return self.task is not None and self.task.isCanceled()
+
+    def __advanceProgress(self, progress):
+        if self.task is not None:
+            newProgress = self.task.progress() + progress
+            if newProgress <= 100:
+                self.task.setProgress(round(newProgress, 2))
+
+    def __advanceTermProgress(self, share):
         """
+        Reports the progress inside the calculation of a term column.
 
-        # check if part string was already translated
-        if part in self.translatedParts.keys():
-            return self.translatedParts[part]
-        edge = self.graph.edge(edgeID)
-        # operator or bracket do not need to be translated
-        if part in self.operators or part.isnumeric() or part == "True" or part == "False":
-            return str(part)
+        :type share: float part of the work of the current term that is done
+        """
+        progress = self.__termProgress * share
+        self.__termProgressSpent += progress
+        self.__advanceProgress(progress)
 
-        try:
-            float(part)
-            return str(part)
-        except ValueError:
-            pass
-
-        # normal distance metrics
-        if part == "euclidean":
-            return str(self.graph.euclideanDist(edgeID))
-
-        if part == "manhattan":
-            return str(self.graph.manhattanDist(edgeID))
-
-        if part == "geodesic":
-            return str(self.graph.geodesicDist(edgeID))
-
-        if part == "ellipsoidal":
-            return str(self.graph.ellipsoidalDist(edgeID))
-
-        # translate polygon construct
-        regex = re.compile(r'polygon\[[0-9]\]:crossesPolygon')
-        res = regex.search(part)
-        if res is not None:
-            index = int(res.group().split("[")[1].split("]")[0])
-            for feature in edgesCrossingPolygonsList[index].getFeatures():
-                if edgeID == feature["ID"]:
-                    return "True"
-            return "False"
-
-        # translate polygon construct
-        regex = re.compile(r'polygon\[[0-9]\]:insidePolygon')
-        res = regex.search(part)
-        if res is not None:
-            index = int(res.group().split("[")[1].split("]")[0])
-            for feature in edgesInPolygonsList[index].getFeatures():
-                if edgeID == feature["ID"]:
-                    return "True"
-            return "False"
-
-        # python math method
-        if "math." in part:
+    def __metricColumn(self, metric):
+        """
+        :type metric: String one of euclidean, manhattan, geodesic, ellipsoidal
+        :return numpy array with the distance of every edge
+        """
+        fromX, fromY, toX, toY = self.__getEdgeCoordinates()
+        if metric == "euclidean":
+            return np.hypot(fromX - toX, fromY - toY)
+
+        if metric == "manhattan":
+            return np.abs(fromX - toX) + np.abs(fromY - toY)
+
+        if metric == "geodesic":
+            radius = 6371000
+            phi1 = np.radians(fromY)
+            phi2 = np.radians(toY)
+            deltaPhi = np.radians(toY - fromY)
+            deltaLambda = np.radians(toX - fromX)
+            a = np.sin(deltaPhi / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(deltaLambda / 2.0) ** 2
+            return radius * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+        return np.fromiter((self.graph.ellipsoidalDist(edgeId) for edgeId in self.__edgeIds), dtype=float,
+                           count=len(self.__edgeIds))
+
+    def __fieldColumn(self, name):
+        """
+        :type name: String name of a field of the vector layer
+        :return numpy array with the field value of every edge
+        """
+        column = np.full(len(self.__edgeIds), np.nan)
+
+        # use information from points to set the edge weights
+        # only incoming edges are considered
+        if self.vLayer.geometryType() == QgsWkbTypes.PointGeometry:
+            values = self.graph.vertexFieldValues[name]
+            toVertices = np.array([self.graph.edge(edgeId).toVertex() for edgeId in self.__edgeIds], dtype=np.int64)
+            # vertices added while editing the graph have no feature
+            known = toVertices < len(values)
+            if isinstance(values, np.ndarray):
+                column[known] = values[toVertices[known]]
+            else:
+                # values of non numeric fields, e.g. strings or NULL, which are not numbers stay nan
+                column[known] = [self.__numericValue(values[vertex]) for vertex in toVertices[known]]
+            return column
+
+        # every edge of a line layer knows the feature it was created from
+        for i, edgeId in enumerate(self.__edgeIds):
+            feature = self.graph.edge(edgeId).feature
+            if feature is None:
+                continue
             try:
-                mathOperation = part.split(".", 1)[1].split("%")[0]
-                if mathOperation in self.mathOperatorsWithTwoVar:
-                    # recursive calls
-                    var1 = part.split("%")[1].split(",")[0]
-                    var2 = part.split("$")[0].split(",")[1]
-                    return "math." + mathOperation + "(" + var1 + "," + var2 + ")"
-                else:
-                    # recursive call
-                    var = part.split("$")[0].split("%")[1]
-                    return "math." + mathOperation + "(" + var + ")"
-            except Exception:
+                column[i] = self.__numericValue(feature[name])
+            except KeyError:
                 pass
+        return column
 
-        if "rnd?" in part:
-            lb = part.split("?")[1].split("§")[0]
-            ub = part.split("&")[0].split("§")[1]
+    def __numericValue(self, value):
+        """
+        :return float of the field value or nan if it is not a number
+        """
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
 
-            if lb.isnumeric() and ub.isnumeric():
-                if int(lb) > int(ub):
-                    return str(0)
-                return str(random.randint(int(lb), int(ub)))
-            try:
-                convertedLB = float(eval(lb))
-                convertedUB = float(eval(ub))
-                if convertedLB > convertedUB:
-                    return str(0)
-                return str(random.uniform(convertedLB, convertedUB))
-            except Exception:
-                pass
+    def __polygonColumn(self, polygonIndex, analysis):
+        """
+        Both polygon checks are evaluated together once per polygon layer.
 
-            return part
-
-        # translate if part
-        if "if" in part:
-            expression = part.split(";")[0].split("{", 1)[1]
-            expression = expression.replace("and", " and ")
-            expression = expression.replace("or", " or ")
-            expressionParts = re.split("and|or", expression)
-            for expPart in expressionParts:
-                if "pixelValue" in expPart:
-                    listString = expPart.split("(")[1].split(")")[0]
-                    if "," in listString:
-                        listStringSplit = listString.split(",")
-                        equalTrue = False
-                        for l in listStringSplit:
-                            toEval = re.sub(r"pixelValue\(([0-9]+,)+[0-9]+\)", "", expPart)
-                            toEval = l + toEval
-                            if eval(toEval) == True:
-                                expression = expression.replace(expPart, " True ")
-                                equalTrue = True
-                                break
-                        if equalTrue == False:
-                            expression = expression.replace(expPart, " False ")
-
-                    # only one value in list
-                    else:
-                        toEval = re.sub(r"pixelValue\([0-9]\)", "", expPart)
-                        toEval = listString + toEval
-                        if eval(toEval) == True:
-                            expression = expression.replace(expPart, " True ")
-                            break
-                        else:
-                            expression = expression.replace(expPart, " False ")
-
-                if "percentOfValues" in expPart:
-                    # percentage is first value in the list
-                    listString = expPart.split("(")[1].split(")")[0]
-                    listStringSplit = listString.split(",")
-                    percentage = listStringSplit[0]
-                    trueExpFount = 0
-                    for l in range(1, len(listStringSplit)):
-                        toEval = re.sub(r"percentOfValues\(([0-9]+,)+[0-9]+\)", "", expPart)
-                        toEval = listStringSplit[l] + toEval
-
-                        if eval(toEval) == True:
-                            trueExpFount += 1
-                    if int(percentage) <= (trueExpFount / (len(listStringSplit)-1))*100:
-                        expression = expression.replace(expPart, " True ")
-                    else:
-                        expression = expression.replace(expPart, " False ")
-
-            if eval(expression) == True:
-                return str(eval(part.split(";")[1]))
+        :type polygonIndex: Integer
+        :type analysis: String insidePolygon or crossesPolygon
+        :return numpy boolean array which is True for every edge inside or crossing the polygons
+        """
+        if polygonIndex not in self.__polygonColumns:
+            if polygonIndex not in self.polygonPredicates:
+                self.polygonPredicates[polygonIndex] = PolygonPredicates(self.polygons[polygonIndex],
+                                                                         self.vLayer.crs())
+            predicates = self.polygonPredicates[polygonIndex]
+            self.__polygonColumns[polygonIndex] = predicates.evaluate(*self.__getEdgeCoordinates(), task=self.task)
+        return self.__polygonColumns[polygonIndex][analysis]
+
+    def __rasterSamples(self, rasterIndex):
+        """
+        Reads the pixel values along all edges from the raster band.
+
+        :type rasterIndex: Integer
+        :return (numpy array of pixel values, numpy array of offsets of the edges)
+        """
+        key = ("raster", rasterIndex)
+        if key in self.__samples:
+            return self.__samples[key]
+
+        fromX, fromY, toX, toY = self.__getEdgeCoordinates()
+        self.__samples[key] = sampleAlongEdges(self.rLayers[rasterIndex], self.rasterBands[rasterIndex],
+                                               self.vLayer.crs(), fromX, fromY, toX, toY)
+        return self.__samples[key]
+
+    def __getAStarObject(self, rasterIndex, heuristicIndex):
+        for aStarObj in self.aStarAlgObjects:
+            if aStarObj.rasterID == rasterIndex and aStarObj.heuristicID == heuristicIndex:
+                return aStarObj
+
+        aStarObj = AStarOnRasterData(self.rLayers[rasterIndex], self.rasterBands[rasterIndex], self.vLayer.crs(),
+                                     heuristicIndex, self.createShortestPathView, rasterIndex, heuristicIndex,
+                                     self.rasterMemoryBudget, self.rasterCorridorMargin, self.rasterSearchMode,
+                                     self.rasterLandmarkCount, self.rasterHierarchyFactor)
+        self.aStarAlgObjects.append(aStarObj)
+        return aStarObj
+
+    def __shortestPathSamples(self, rasterIndex, heuristicIndex):
+        """
+        Calculates the pixel values on the shortest paths through the raster of all edges.
+
+        :type rasterIndex: Integer
+        :type heuristicIndex: Integer
+        :return (numpy array of pixel values, numpy array of offsets of the edges,
+                 numpy array with the number of diagonal steps of every path)
+        """
+        key = ("shortestPath", rasterIndex, heuristicIndex)
+        if key in self.__samples:
+            return self.__samples[key]
+
+        paths = [None] * len(self.__edgeIds)
+        if self.rasterCache is not None:
+            rasterKey = rasterCacheKey(self.rLayers[rasterIndex], self.rasterBands[rasterIndex], heuristicIndex,
+                                       self.vLayer.crs(), self.rasterMemoryBudget, self.rasterCorridorMargin,
+                                       self.rasterSearchMode, self.rasterLandmarkCount, self.rasterHierarchyFactor)
+            endpoints = list(zip(*(coordinates.tolist() for coordinates in self.__getEdgeCoordinates())))
+            # cached paths would be missing in the shortest path view, so with the view every path is searched
+            # again. The searched paths are written into the cache in both cases
+            if not self.createShortestPathView:
+                paths = self.rasterCache.getPaths(rasterKey, endpoints)
+                for i, path in enumerate(paths):
+                    if path is not None:
+                        pixelValues, diagonals, deviationBound = path
+                        self.__recordDeviationBound(rasterIndex, heuristicIndex, deviationBound)
+                        paths[i] = (pixelValues, diagonals)
+
+        missing = [i for i, path in enumerate(paths) if path is None]
+        if missing:
+            if self.__useWorkers and self.workerCount > 1 and not self.createShortestPathView:
+                calculatedPaths = self.__parallelShortestPaths(rasterIndex, heuristicIndex, missing)
             else:
-                return str(eval(part.split(";")[2].split("}")[0]))
-
-        # get specified field information from feature
-        if "field:" in part:
-            name = part.split(":")[1]
-            if self.vLayer.geometryType() == QgsWkbTypes.LineGeometry and not self.usePolygons:
-                return str((self.graph.featureMatchings[edgeID])[name])
-
-            # if polygons are used edges get deleted thus its not possible to just iterate the edges
-            elif self.vLayer.geometryType() == QgsWkbTypes.LineGeometry and self.usePolygons:
-                for feature in self.vLayer.getFeatures():
-                    geom = feature.geometry()
-                    if QgsWkbTypes.isMultiType(geom.wkbType()):
-                        for part in geom.asMultiPolyline():
-                            for i in range(1, len(part)):
-                                if part[i-1] == self.graph.vertex(edge.fromVertex()).point() and\
-                                   part[i] == self.graph.vertex(edge.toVertex()).point():
-                                    return str(feature[name])
-                    else:
-                        vertices = geom.asPolyline()
-                        for i in range(len(vertices)-1):
-                            if vertices[i] == self.graph.vertex(edge.fromVertex()).point() and\
-                               vertices[i+1] == self.graph.vertex(edge.toVertex()).point():
-                                return str(feature[name])
-
-            # use information from points to set the edge weights
-            # only incoming edges are considered
-            elif self.vLayer.geometryType() == QgsWkbTypes.PointGeometry:
-                return str((self.graph.pointsToFeatureHash[self.graph.vertex(edge.toVertex()).point()
-                                                                                             .toString()])[name])
-
-        # analysis of raster data
-        if "raster[" in part:
-            rasterDataID = int(part.split("[")[1].split("]")[0])
-            bandForRaster = self.rasterBands[rasterDataID]
-            stringForLookup = "SAMPLE_" + str(bandForRaster)
-            # check if the pointValues are already created for this edge
-            if self.pointValuesForEdge[rasterDataID] is None:
-                self.pointValuesForEdge[rasterDataID] = []
-                # search for the right edgeID
-                for feature in sampledPointsLayer[rasterDataID].getFeatures():
-                    if feature["line_id"] == edgeID:
-                        pointValue = feature[stringForLookup]
-                        if pointValue is None:
-                            pointValue = 0
-                        self.pointValuesForEdge[rasterDataID].append(pointValue)
-
-            if ":sp" in part:
-                # search for correct aStarAlgObject
-                if "," in part:
-                    heurID = int(part.split("(")[1].split(")")[0].split(",")[0])
+                calculatedPaths = self.__serialShortestPaths(rasterIndex, heuristicIndex, missing)
+            for i, path in zip(missing, calculatedPaths):
+                paths[i] = path
+
+            # paths of a canceled calculation are incomplete
+            if self.rasterCache is not None and not self.__isCanceled():
+                self.rasterCache.putPaths(rasterKey, [endpoints[i] for i in missing], calculatedPaths,
+                                          self.shortestPathDeviationBounds.get((rasterIndex, heuristicIndex), 0))
+
+        values, offsets = self.__raggedArray([pixelValues for pixelValues, _ in paths])
+        diagonals = np.array([numberOfDiagonals for _, numberOfDiagonals in paths], dtype=np.int64)
+        self.__samples[key] = (values, offsets, diagonals)
+        return self.__samples[key]
+
+    def __serialShortestPaths(self, rasterIndex, heuristicIndex, edgeIndices):
+        """
+        With the admissible heuristic the paths of all edges leaving the same vertex are calculated
+        by one search from the vertex, the other heuristics calculate every path on its own.
+
+        :type edgeIndices: List of Integer positions of the edges in the current calculation
+        :return List of (pixel values, number of diagonal steps) of the shortest path of every edge
+        """
+        aStarObj = self.__getAStarObject(rasterIndex, heuristicIndex)
+        edgeCount = len(edgeIndices)
+        paths = [([], 0)] * edgeCount
+
+        # vertex id -> positions of the edges leaving the vertex
+        edgesBySource = {}
+        for i, edgeIndex in enumerate(edgeIndices):
+            edge = self.graph.edge(self.__edgeIds[edgeIndex])
+            edgesBySource.setdefault(edge.fromVertex(), []).append(i)
+
+        for fromVertex, sourceEdges in edgesBySource.items():
+            if self.__isCanceled():
+                break
+            fromPoint = self.graph.vertex(fromVertex).point()
+            toPoints = {}
+            for i in sourceEdges:
+                toPoint = self.graph.vertex(self.graph.edge(self.__edgeIds[edgeIndices[i]]).toVertex()).point()
+                if self.allowDoubleEdges and (rasterIndex, heuristicIndex, fromPoint, toPoint) in self.spForPointPairs:
+                    paths[i] = self.spForPointPairs[rasterIndex, heuristicIndex, fromPoint, toPoint]
                 else:
-                    heurID = int(part.split("(")[1].split(")")[0])
-                numberOfDiagonals = None
-                for aStarObj in self.aStarAlgObjects:
-                    if aStarObj.heuristicID == heurID and aStarObj.rasterID == rasterDataID:
-                        if self.pixelValuesForEdge[rasterDataID*6 + heurID] is None:
-                            if self.allowDoubleEdges and (self.graph.vertex(edge.fromVertex()).point(),
-                                                          self.graph.vertex(edge.toVertex()).point()) in\
-                                    self.spForPointPairs.keys():
-                                pixelValues = self.spForPointPairs[self.graph.vertex(edge.fromVertex()).point(),
-                                                                   self.graph.vertex(edge.toVertex()).point()]
-                            else:
-                                pixelValues = aStarObj.getShortestPathWeight(
-                                    self.graph.vertex(edge.fromVertex()).point(),
-                                    self.graph.vertex(edge.toVertex()).point())
-                                if self.allowDoubleEdges:
-                                    self.spForPointPairs[(self.graph.vertex(edge.toVertex()).point(),
-                                                          self.graph.vertex(edge.fromVertex()).point())] = pixelValues
-                            self.pixelValuesForEdge[rasterDataID*6 + heurID] = pixelValues
-                        numberOfDiagonals = aStarObj.getNumberOfDiagonals()
-                if "," in part:
-                    part = part.split("(")[0] + "(" + part.split(",")[1]
-
-                return self.__calculateRasterAnalysis(self.pixelValuesForEdge[rasterDataID*6 + heurID],
-                                                      part.split(":sp")[1], rasterDataID, numberOfDiagonals)
+                    toPoints[i] = toPoint
+
+            if heuristicIndex == 0 and len(toPoints) > 1:
+                sourcePaths = aStarObj.getShortestPathWeights(fromPoint, list(toPoints.values()))
+                self.__recordDeviationBound(rasterIndex, heuristicIndex, aStarObj.getDeviationBound())
             else:
-                return self.__calculateRasterAnalysis(self.pointValuesForEdge[rasterDataID], part.split(":")[1])
-
-        for operator in self.operators:
-            if operator in part:
-                return str(eval(part))
-
-        return str("0")
-
-    def __calculateRasterAnalysis(self, values, analysis, rLayerIndex=0, numberOfDiagonals=None):
-        """
-        Method is responsible to translate all the raster analysis constructs.
-
-        :type values: List of pixel values
-        :type analysis: String defining the type of analysis
-        :return translated raster analysis as string usually containing a number
-        """
-        if "sum" in analysis.lower():
-            return str(sum(values))
-        elif "mean" in analysis.lower():
-            return str(statistics.mean(values))
-        elif analysis.lower() == "median":
-            return str(statistics.median(values))
-        elif "min" in analysis.lower():
-            return str(min(values))
-        elif "max" in analysis.lower():
-            return str(max(values))
-        elif "variance" in analysis.lower():
-            return str(statistics.variance(values))
-        elif analysis == "standdev":
-            return str(statistics.stdev(values))
-        elif "gradientsum" in analysis.lower():
-            f = np.array(values, dtype=float)
-            gradient = np.gradient(f)
-            return str(np.sum(gradient))
-        elif "gradientmin" in analysis.lower():
-            f = np.array(values, dtype=float)
-            gradient = np.gradient(f)
-            return str(np.min(gradient))
-        elif "gradientmax" in analysis.lower():
-            f = np.array(values, dtype=float)
-            gradient = np.gradient(f)
-            return str(np.max(gradient))
-        elif "ascent" in analysis.lower():
-            ascent = 0
-            for i in range(len(values)-1):
-                if values[i] < values[i+1]:
-                    ascent = ascent + (values[i+1] - values[i])
-            return str(ascent)
-        elif "descent" in analysis.lower():
-            descent = 0
-            for i in range(len(values)-1):
-                if values[i] > values[i+1]:
-                    descent = descent + (values[i] - values[i+1])
-            return str(descent)
-        elif "totalclimb" in analysis.lower():
-            totalClimb = 0
-            for i in range(len(values)-1):
-                totalClimb = totalClimb + abs(values[i] - values[i+1])
-            return str(totalClimb)
-        # last two types can only occur in if construct
-        elif "pixelvalue" in analysis.lower():
-            listOfPixelValuesAsString = "pixelValue(" + str(values[0])
-            for pValue in values:
-                listOfPixelValuesAsString = listOfPixelValuesAsString + "," + str(pValue)
-            listOfPixelValuesAsString = listOfPixelValuesAsString + ")"
-            return listOfPixelValuesAsString
-        elif "percentofvalues" in analysis.lower():
-            findPercentage = re.search(r"percentofvalues\([0-9]+\)", analysis.lower())
-            findPercentageHelp = findPercentage.group().replace("(", "").replace(")", "")
-            percentage = findPercentageHelp.split("percentofvalues")[1]
-
-            listOfPixelValuesAsString = "percentOfValues(" + percentage
-            for pValue in values:
-                listOfPixelValuesAsString = listOfPixelValuesAsString + "," + str(pValue)
-
-            listOfPixelValuesAsString = listOfPixelValuesAsString + ")"
-            return listOfPixelValuesAsString
-        elif "euclidean" in analysis.lower():
-            diagonalLength = numberOfDiagonals * (math.sqrt(math.pow(self.euclDistPixelNeighbors[rLayerIndex], 2) +
-                                                            math.pow(self.euclDistPixelNeighbors[rLayerIndex], 2)))
-            nonDiagonalLength = self.euclDistPixelNeighbors[rLayerIndex] * (len(values)-1-numberOfDiagonals)
-            shortestPathEucl = diagonalLength + nonDiagonalLength
-            return str(shortestPathEucl)
-        elif "manhattan" in analysis.lower():
-            shortestPathMan = self.manDistPixelNeighbors[rLayerIndex] * len(values)-1
-            diagonalLength = numberOfDiagonals * (math.sqrt(math.pow(self.manDistPixelNeighbors[rLayerIndex], 2) +
-                                                            math.pow(self.manDistPixelNeighbors[rLayerIndex], 2)))
-            nonDiagonalLength = self.manDistPixelNeighbors[rLayerIndex] * (len(values)-1-numberOfDiagonals)
-            shortestPathMan = diagonalLength + nonDiagonalLength
-            return str(shortestPathMan)
-        elif "geodesic" in analysis.lower():
-            diagonalLength = numberOfDiagonals * (math.sqrt(math.pow(self.geoDistPixelNeighbors[rLayerIndex], 2) +
-                                                            math.pow(self.geoDistPixelNeighbors[rLayerIndex], 2)))
-            nonDiagonalLength = self.geoDistPixelNeighbors[rLayerIndex] * (len(values)-1-numberOfDiagonals)
-            shortestPathGeo = diagonalLength + nonDiagonalLength
-            return str(shortestPathGeo)
-        elif "ellipsoidal" in analysis.lower():
-            diagonalLength = numberOfDiagonals * (math.sqrt(math.pow(self.ellDistPixelNeighbors[rLayerIndex], 2) +
-                                                            math.pow(self.ellDistPixelNeighbors[rLayerIndex], 2)))
-            nonDiagonalLength = self.ellDistPixelNeighbors[rLayerIndex] * (len(values)-1-numberOfDiagonals)
-            shortestPathEll = diagonalLength + nonDiagonalLength
-            return str(shortestPathEll)
-
-    def __createEdgeLayer(self):
-        """
-        Creates an edge layer for the graph. This is used to call QGIS-Tools which
-        require vector layers as attributes
-
-        :return QgsVectorLayer
-        """
-        graphLayerEdges = QgsVectorLayer("LineString", "GraphEdges", "memory")
-        dpEdgeLayer = graphLayerEdges.dataProvider()
-        dpEdgeLayer.addAttributes([QgsField("ID", QVariant.Int), ])
-        graphLayerEdges.updateFields()
-
-        graphLayerEdges.setCrs(self.vLayer.crs())
-
-        for i in range(self.graph.edgeCount()):
-            newFeature = QgsFeature()
-            fromVertex = self.graph.vertex(self.graph.edge(i).fromVertex()).point()
-            toVertex = self.graph.vertex(self.graph.edge(i).toVertex()).point()
-            newFeature.setGeometry(QgsGeometry.fromPolyline([QgsPoint(fromVertex), QgsPoint(toVertex)]))
-            newFeature.setAttributes([i])
-            dpEdgeLayer.addFeature(newFeature)
-
-        return graphLayerEdges
-
-    def __translateRegexSearch(self, costFunction, regex, edgeID, sampledPointsLayers, edgesInPolygonsList,
-                               edgesCrossingPolygonsList, constructCall):
-        """
-        The method iteratively calls the translate method with different parts of the formula.
-        The parts are found by checking the formula for the given regular expression that matches one specific formula
-        construct.
-
-        :type costFunction: Formula for the edge weight calculation
-        :type regex: String defining a regular expression
-        :type edgeID: Int defining the edge that gets the translated weight
-        :type sampledPointsLayers: List of features
-        :type edgesInPolygonList: List of features
-        :type edgesCrossingPolygonsList: List of features
-        :type constructCall: Boolean
-        :return translated formula
-        """
-        rasterReg = False
-        rasterRegexString = r'raster\[[0-9]+\]:(percentOfValues\([0-9]+\)|sp[A-z]+\([0-9]+(,[0-9]+)?\)|[A-z]+)'
-        if regex == rasterRegexString:
-            rasterReg = True
-        regex = re.compile(regex)
-        matches = regex.finditer(costFunction)
-
-        matchesTranslationHash = {}
-
-        for res in matches:
-            if rasterReg:
-                partBeforeAndOr = re.split(r'and|or', res.group())[0]
-                translated = self.__translate(partBeforeAndOr, edgeID, sampledPointsLayers, edgesInPolygonsList,
-                                              edgesCrossingPolygonsList)
-                if not constructCall:
-                    self.translatedParts[partBeforeAndOr] = translated
-                matchesTranslationHash[partBeforeAndOr] = translated
+                sourcePaths = []
+                for toPoint in toPoints.values():
+                    sourcePaths.append((aStarObj.getShortestPathWeight(fromPoint, toPoint),
+                                        aStarObj.getNumberOfDiagonals()))
+                    self.__recordDeviationBound(rasterIndex, heuristicIndex, aStarObj.getDeviationBound())
+
+            for (i, toPoint), path in zip(toPoints.items(), sourcePaths):
+                paths[i] = path
+                if self.allowDoubleEdges:
+                    self.spForPointPairs[rasterIndex, heuristicIndex, toPoint, fromPoint] = path
+            self.__advanceTermProgress(len(sourceEdges) / edgeCount)
+        return paths
+
+    def __recordDeviationBound(self, rasterIndex, heuristicIndex, bound):
+        key = (rasterIndex, heuristicIndex)
+        self.shortestPathDeviationBounds[key] = maxDeviationBound([self.shortestPathDeviationBounds.get(key, 0), bound])
+
+    def __parallelShortestPaths(self, rasterIndex, heuristicIndex, edgeIndices):
+        """
+        Distributes the shortest path calculations in batches over workerCount processes. Edges
+        between the same pixels share one calculation. With AStarC on the whole band the batches
+        are calculated by up to workerCount threads instead, which search without the GIL, as many as
+        fit into the memory budget with their search buffers.
+
+        :type edgeIndices: List of Integer positions of the edges in the current calculation
+        :return List of (pixel values, number of diagonal steps) of the shortest path of every edge
+        """
+        rLayer = self.rLayers[rasterIndex]
+        band = self.rasterBands[rasterIndex]
+        edgeCount = len(edgeIndices)
+
+        ds = gdal.Open(rLayer.source())
+        fromX, fromY, toX, toY = (coordinates[edgeIndices] for coordinates in self.__getEdgeCoordinates())
+        fromCols, fromRows = pixelPositions(ds.GetGeoTransform(),
+                                            *transformCoordinates(self.vLayer.crs(), rLayer.crs(), fromX, fromY))
+        toCols, toRows = pixelPositions(ds.GetGeoTransform(),
+                                        *transformCoordinates(self.vLayer.crs(), rLayer.crs(), toX, toY))
+        inside = (fromCols >= 0) & (fromCols < ds.RasterXSize) & (fromRows >= 0) & (fromRows < ds.RasterYSize) &\
+            (toCols >= 0) & (toCols < ds.RasterXSize) & (toRows >= 0) & (toRows < ds.RasterYSize)
+
+        # pixel pair -> index of the calculation
+        pairIndices = {}
+        edgePairIndices = [None] * edgeCount
+        for i in np.nonzero(inside)[0]:
+            pair = (int(fromRows[i]), int(fromCols[i]), int(toRows[i]), int(toCols[i]))
+            reversePair = (pair[2], pair[3], pair[0], pair[1])
+            if self.allowDoubleEdges and reversePair in pairIndices:
+                pair = reversePair
+            edgePairIndices[i] = pairIndices.setdefault(pair, len(pairIndices))
+
+        # pairs with the same start pixel are placed next to each other, so a worker shares one search for them
+        pairs = sorted(pairIndices)
+        pairPositions = [0] * len(pairs)
+        for position, pair in enumerate(pairs):
+            pairPositions[pairIndices[pair]] = position
+        edgePairIndices = [pairPositions[pairIndex] if pairIndex is not None else None
+                           for pairIndex in edgePairIndices]
+        results = [([], 0)] * len(pairs)
+        if pairs:
+            batchSize = max(1, min(256, len(pairs) // (self.workerCount * 8)))
+            threadCount = searchThreadCount(rLayer.source(), band, self.workerCount, self.rasterMemoryBudget,
+                                            self.rasterHierarchyFactor) if NATIVE_SEARCH else 0
+            if threadCount > 0:
+                aStarObj = self.__getAStarObject(rasterIndex, heuristicIndex)
+                executor, searches = createSearchThreadPool(aStarObj.aStarObject, threadCount)
+                batchFunction = partial(threadSearchBatch, searches)
             else:
-                translated = self.__translate(costFunction[res.start():res.end()], edgeID, sampledPointsLayers,
-                                              edgesInPolygonsList, edgesCrossingPolygonsList)
-                if not constructCall:
-                    self.translatedParts[costFunction[res.start():res.end()]] = translated
-                matchesTranslationHash[res.group()] = translated
+                minValue, meanValue = RasterSearchCache.searchStatistics(rLayer, band, heuristicIndex,
+                                                                         self.rasterSearchMode,
+                                                                         self.rasterHierarchyFactor)
+                # every worker gets its share of the memory budget
+                workerBudget = self.rasterMemoryBudget // self.workerCount if self.rasterMemoryBudget is not None\
+                    else None
+                # workers which search the whole band map one copy of it into memory, tiled bands are read by every
+                # worker
+                sharedBandPath = None
+                if workerBudget is None or fullSearchBytes(rLayer.source(), band) <= workerBudget:
+                    sharedBandPath = self.__getSharedBand(rasterIndex)
+                executor = createProcessPool(self.workerCount, initializeShortestPathWorker,
+                                             (rLayer.source(), band, heuristicIndex, minValue, meanValue,
+                                              workerBudget, self.rasterCorridorMargin, self.rasterSearchMode,
+                                              self.rasterLandmarkCount, self.rasterHierarchyFactor,
+                                              sharedBandPath))
+                batchFunction = shortestPathBatch
+            futures = {executor.submit(batchFunction, pairs[start:start + batchSize]): start
+                       for start in range(0, len(pairs), batchSize)}
+            try:
+                for future in as_completed(futures):
+                    if self.__isCanceled():
+                        break
+                    batchResults, batchDeviationBound = future.result()
+                    self.__recordDeviationBound(rasterIndex, heuristicIndex, batchDeviationBound)
+                    start = futures[future]
+                    results[start:start + len(batchResults)] = batchResults
+                    self.__advanceTermProgress(len(batchResults) / len(pairs))
+            finally:
+                executor.shutdown(wait=not self.__isCanceled(), cancel_futures=True)
+
+        # edges outside of the raster get the maximum value as in AStarOnRasterData
+        return [results[pairIndex] if pairIndex is not None else ([sys.maxsize], 0) for pairIndex in edgePairIndices]
+
+    def __getSharedBand(self, rasterIndex):
+        """
+        :type rasterIndex: Integer
+        :return String path of the band of the raster written by shareBand, which the workers map into memory
+        """
+        if rasterIndex not in self.__sharedBands:
+            fileName = "SharedBand_" + str(rasterIndex) + ".npy"
+            self.__sharedBands[rasterIndex] = shareBand(self.rLayers[rasterIndex].source(),
+                                                        self.rasterBands[rasterIndex],
+                                                        QgsProcessingUtils.generateTempFilename(fileName))
+        return self.__sharedBands[rasterIndex]
+
+    def __getPixelNeighborDistance(self, rasterIndex, metric):
+        """
+        Distance between the centers of two neighboring pixels of the raster in the crs of the vector layer.
 
-        for key in matchesTranslationHash:
-            costFunction = costFunction.replace(key, matchesTranslationHash[key])
+        :type rasterIndex: Integer
+        :type metric: String one of euclidean, manhattan, geodesic, ellipsoidal
+        :return float
+        """
+        if (rasterIndex, metric) in self.pixelNeighborDistances:
+            return self.pixelNeighborDistances[rasterIndex, metric]
+
+        rLayer = self.rLayers[rasterIndex]
+        ds = gdal.Open(rLayer.source())
+        transform = ds.GetGeoTransform()
+        xOrigin = transform[0]
+        yOrigin = transform[3]
+        pixelWidth = transform[1]
+        pixelHeight = -transform[5]
+
+        # get coordinates of top left pixel
+        xCoord = xOrigin + (pixelWidth/2)
+        yCoord = yOrigin + (pixelHeight/2)
+        originalPoint = QgsPointXY(xCoord, yCoord)
+
+        # get coordinates of a neighbor
+        xCoordN = xOrigin + (pixelWidth/2)
+        yCoordN = (pixelHeight*1) + yOrigin + (pixelHeight/2)
+        originalPointN = QgsPointXY(xCoordN, yCoordN)
+
+        # make coordinate transformation from raster crs to the vLayer crs
+        tr = QgsCoordinateTransform(rLayer.crs(), self.vLayer.crs(), QgsProject.instance())
+        transformedPoint = tr.transform(originalPoint)
+        transformedPointN = tr.transform(originalPointN)
+        if metric == "euclidean":
+            distance = math.sqrt(pow(transformedPoint.x()-transformedPointN.x(), 2) +
+                                 pow(transformedPoint.y()-transformedPointN.y(), 2))
+
+        elif metric == "manhattan":
+            distance = abs(transformedPoint.x()-transformedPointN.x()) +\
+                abs(transformedPoint.y()-transformedPointN.y())
+
+        elif metric == "geodesic":
+            radius = 6371000
+            phi1 = math.radians(transformedPoint.y())
+            phi2 = math.radians(transformedPointN.y())
+            deltaPhi = math.radians(transformedPointN.y()-transformedPoint.y())
+            deltaLambda = math.radians(transformedPointN.x()-transformedPoint.x())
+            a = math.sin(deltaPhi/2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(deltaLambda / 2.0) ** 2
+            c = 2*math.atan2(math.sqrt(a), math.sqrt(1-a))
+            distance = radius*c
 
-        if rasterReg and "raster" in costFunction:
-            costFunction = self.__translateRegexSearch(costFunction, rasterRegexString, edgeID, sampledPointsLayers,
-                                                       edgesInPolygonsList, edgesCrossingPolygonsList, constructCall)
+        else:
+            distArea = QgsDistanceArea()
+            distArea.setEllipsoid(self.vLayer.crs().ellipsoidAcronym())
+            distance = distArea.measureLine(transformedPoint, transformedPointN)
+            if str(distance) == "nan":
+                distance = 0
 
-        return costFunction
+        self.pixelNeighborDistances[rasterIndex, metric] = distance
+        return distance
 
-    def __fullyTranslatedCheck(self, costFunction):
+    def __getSegmentStatistics(self, key, values, offsets):
+        """
+        :return SegmentStatistics of the samples, shared by all raster analyses of the same samples
         """
-        Checks if the formula is fully translated, which means it consists only of
-        +,-,*,/,(,) and numbers.
+        if key not in self.__statistics:
+            self.__statistics[key] = SegmentStatistics(values, offsets)
+        return self.__statistics[key]
 
-        :type costFunction: String
-        :return Boolean
+    def __rasterStatisticColumn(self, term):
         """
-        try:
-            eval(costFunction)
-        except Exception:
-            return False
-        return True
+        :type term: Term of kind rasterStatistic or shortestPathStatistic
+        :return numpy array with the raster analysis of every edge
+        """
+        if term.kind == "rasterStatistic":
+            key = ("raster", term.rasterIndex)
+            values, offsets = self.__rasterSamples(term.rasterIndex)
+            return self.__getSegmentStatistics(key, values, offsets).statistic(term.name)
+
+        key = ("shortestPath", term.rasterIndex, term.heuristicIndex)
+        values, offsets, diagonals = self.__shortestPathSamples(term.rasterIndex, term.heuristicIndex)
+
+        # length of the shortest paths through the raster
+        if term.name in ["euclidean", "manhattan", "geodesic", "ellipsoidal"]:
+            pixelDistance = self.__getPixelNeighborDistance(term.rasterIndex, term.name)
+            counts = np.diff(offsets)
+            lengths = pixelDistance * (math.sqrt(2) * diagonals + (counts - 1 - diagonals))
+            lengths[counts == 0] = 0
+            return lengths
+
+        return self.__getSegmentStatistics(key, values, offsets).statistic(term.name)
+
+    def __termColumn(self, term):
+        """
+        Translates a variable of the cost function into a column with one value for every edge.
+
+        :type term: Term
+        :return numpy array or (values, offsets) for pixel value terms
+        """
+        if term.kind == "metric":
+            return self.__metricColumn(term.name)
+
+        if term.kind == "field":
+            return self.__fieldColumn(term.name)
+
+        if term.kind == "polygon":
+            return self.__polygonColumn(term.polygonIndex, term.name)
+
+        if term.kind == "rasterSamples":
+            return self.__rasterSamples(term.rasterIndex)
+
+        if term.kind == "shortestPathSamples":
+            values, offsets, _ = self.__shortestPathSamples(term.rasterIndex, term.heuristicIndex)
+            return values, offsets
+
+        return self.__rasterStatisticColumn(term)
 
     def setEdgeCosts(self, costFunction, edgeID=None, costFunctionCount=None):
         """
-        Set the cost function for the edge cost calculation.
+        Set the cost function for the edge cost calculation. The cost function is parsed once
+        and evaluated for all edges at once.
 
         :type costFunction: String
         :return graph with set edge costs
         """
-        weights = []
-
-        # call QGIS-Tools to get the pixel values for the edges
-        # sampledPointsLayers holds the sampled raster values of all edges
-        sampledPointsLayers = []
-        if len(self.rLayers) > 0:
-            edgeLayer = self.__createEdgeLayer()
-            for i in range(len(self.rLayers)):
-                result = processing.run("qgis:generatepointspixelcentroidsalongline", {"INPUT_RASTER": self.rLayers[i],
-                                                                                       "INPUT_VECTOR": edgeLayer,
-                                                                                       "OUTPUT": "memory:"})
-                result2 = processing.run(
-                    "qgis:rastersampling",
-                    {"INPUT": result["OUTPUT"],
-                     "RASTERCOPY": self.rLayers[i],
-                     "COLUMN_PREFIX": "SAMPLE_", "OUTPUT": "memory:"})
-                sampledPointsLayers.append(result2["OUTPUT"])
-
-        # initialize all necessary AStarOnRasterData objects
-        regex = re.compile(r'raster\[[0-9]\]:sp[A-z]+\([0-9]+,?[0-9]*\)')
-        res = regex.findall(costFunction)
-        for matchString in res:
-            rasterIndex = int(matchString.split("[")[1].split("]")[0])
-            heuristicIndexString = matchString.split("(")[1].split(")")[0]
-
-            if "," in heuristicIndexString:
-                heuristicIndex = int(heuristicIndexString.split(",")[0])
-                # costFunction = costFunction.replace(matchString, matchString.split("(")[0] + "(" +\
-                #                                    matchString.split(",")[1])
-            else:
-                heuristicIndex = int(heuristicIndexString)
-            found = False
-            for aStarObj in self.aStarAlgObjects:
-                if aStarObj.rasterID == rasterIndex and aStarObj.heuristicID == heuristicIndex:
-                    found = True
-                    break
-            if not found:
-                self.aStarAlgObjects.append(AStarOnRasterData(self.rLayers[rasterIndex], self.rasterBands[rasterIndex],
-                                                              self.vLayer.crs(), heuristicIndex,
-                                                              self.createShortestPathView, rasterIndex, heuristicIndex))
-
-        # precalculate the distance between neighboring pixels
-        if "spEuclidean" in costFunction or "spManhattan" in costFunction or "spGeodesic" in costFunction or\
-           "spEllipsoidal" in costFunction:
-
-            for rLayer in self.rLayers:
-                ds = gdal.Open(rLayer.source())
-                transform = ds.GetGeoTransform()
-                xOrigin = transform[0]
-                yOrigin = transform[3]
-                pixelWidth = transform[1]
-                pixelHeight = -transform[5]
-
-                # get coordinates of top left pixel
-                xCoord = xOrigin + (pixelWidth/2)
-                yCoord = yOrigin + (pixelHeight/2)
-                originalPoint = QgsPointXY(xCoord, yCoord)
-
-                # get coordinates of a neighbor
-                xCoordN = xOrigin + (pixelWidth/2)
-                yCoordN = (pixelHeight*1) + yOrigin + (pixelHeight/2)
-                originalPointN = QgsPointXY(xCoordN, yCoordN)
-
-                # make coordinate transformation from raster crs to the vLayer crs
-                tr = QgsCoordinateTransform(rLayer.crs(), self.vLayer.crs(), QgsProject.instance())
-                transformedPoint = tr.transform(originalPoint)
-                transformedPointN = tr.transform(originalPointN)
-                if "spEuclidean" in costFunction:
-                    euclDist = math.sqrt(pow(transformedPoint.x()-transformedPointN.x(), 2) +
-                                         pow(transformedPoint.y()-transformedPointN.y(), 2))
-                    self.euclDistPixelNeighbors.append(euclDist)
-
-                if "spManhattan" in costFunction:
-                    manhattenDist = abs(transformedPoint.x()-transformedPointN.x()) +\
-                        abs(transformedPoint.y()-transformedPointN.y())
-                    self.manDistPixelNeighbors.append(manhattenDist)
-
-                if "spGeodesic" in costFunction:
-                    radius = 6371000
-                    phi1 = math.radians(transformedPoint.y())
-                    phi2 = math.radians(transformedPointN.y())
-                    deltaPhi = math.radians(transformedPointN.y()-transformedPoint.y())
-                    deltaLambda = math.radians(transformedPointN.x()-transformedPoint.x())
-                    a = math.sin(deltaPhi/2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(deltaLambda / 2.0) ** 2
-                    c = 2*math.atan2(math.sqrt(a), math.sqrt(1-a))
-                    geoDist = radius*c
-                    self.geoDistPixelNeighbors.append(geoDist)
-
-                if "spEllipsoidal" in costFunction:
-                    distArea = QgsDistanceArea()
-                    distArea.setEllipsoid(self.vLayer.crs().ellipsoidAcronym())
-                    ellDist = distArea.measureLine(transformedPoint, transformedPointN)
-                    if str(ellDist) == "nan":
-                        self.ellDistPixelNeighbors.append(0)
-                    else:
-                        self.ellDistPixelNeighbors.append(ellDist)
-
-        edgesInPolygonsList = []
-        edgesCrossingPolygonsList = []
-        edgesInPolygons = QgsVectorLayer()
-        edgesCrossingPolygons = QgsVectorLayer()
-
-        # check if polygons for cost functions are set
-        if len(self.polygons) > 0:
-            # check if edgeLayer was already created
-            if len(self.rLayers) == 0:
-                edgeLayer = self.__createEdgeLayer()
-            for polygon in self.polygons:
-                if "insidePolygon" in costFunction:
-                    polygonResult = processing.run("native:extractbylocation", {"INPUT": edgeLayer, "PREDICATE": 6,
-                                                                                "INTERSECT": polygon,
-                                                                                "OUTPUT": "memory:"})
-                    edgesInPolygons = polygonResult["OUTPUT"]
-                    edgesInPolygonsList.append(edgesInPolygons)
-                if "crossesPolygon" in costFunction:
-                    polygonResult = processing.run("native:extractbylocation", {"INPUT": edgeLayer, "PREDICATE": 7,
-                                                                                "INTERSECT": polygon,
-                                                                                "OUTPUT": "memory:"})
-                    edgesCrossingPolygons = polygonResult["OUTPUT"]
-                    edgesCrossingPolygonsList.append(edgesCrossingPolygons)
-
-        costFunction = costFunction.replace(" ", "").replace('"', '')
-        costFunctionSave = costFunction
-
-        for i in range(self.graph.edgeCount()):
-            if self.task is not None and self.task.isCanceled():
-                break
+        return self.setAllEdgeCosts([costFunction])
 
-            if self.task is not None:
-                newProgress = self.task.progress() + 70/self.graph.edgeCount()
-                if newProgress <= 100:
-                    self.task.setProgress(round(newProgress, 2))
-            self.pointValuesForEdge = [None] * len(self.rLayers)
-            self.pixelValuesForEdge = [None] * len(self.rLayers) * 6
+    def setAllEdgeCosts(self, costFunctions, seeds=None):
+        """
+        Calculates the edge costs of several cost functions in one pass. Every variable (distance,
+        field, raster analysis or polygon check) used by any of the functions is calculated once, and
+        subexpressions which occur in several functions are evaluated only once.
 
-            costFunction = costFunctionSave
-            self.translatedParts = {}
-            # translate different formula parts by searching constructs with regular expressions:
-            # Call translate method with each extracted construct and replace in formula
+        :type costFunctions: List of String
+        :type seeds: List of Integer, seed of the random terms of every cost function, random seeds if None
+        :return graph with one list of edge costs per cost function
+        """
+        fieldNames = self.vLayer.fields().names()
+        self.costFunctions = list(costFunctions)
+        self.costFunctionSeeds = list(seeds) if seeds is not None else\
+            [int(np.random.SeedSequence().generate_state(1, np.uint64)[0]) for _ in costFunctions]
+        self.__formulas = [CostFormula(costFunction, fieldNames) for costFunction in costFunctions]
 
-            regexList = [
-                r'euclidean', r'manhattan', r'ellipsoidal', r'geodesic', r'field:[A-z]+',
-                r'raster\[[0-9]+\]:(percentOfValues\([0-9]+\)|sp[A-z]+\([0-9]+(,[0-9]+)?\)|[A-z]+)',
-                r'polygon\[[0-9]?\]:(crossesPolygon|insidePolygon)']
+        allWeights = self.__evaluateFormulas(list(range(self.graph.edgeCount())), True)
+        if allWeights is None:
+            return self.graph
 
-            for regex in regexList:
-                costFunction = self.__translateRegexSearch(costFunction, regex, i, sampledPointsLayers,
-                                                           edgesInPolygonsList, edgesCrossingPolygonsList, False)
+        for weights in allWeights:
+            self.graph.edgeWeights.append(weights.tolist())
 
-            constructRegexList = [r'math\.[a-z]+%.+?\$', r'rnd\?.+?§.+?&', r'if\{.+?;.+?;.+?\}']
-            while not self.__fullyTranslatedCheck(costFunction):
-                if self.task is not None and self.task.isCanceled():
-                    break
-                for regex in constructRegexList:
-                    costFunction = self.__translateRegexSearch(costFunction, regex, i, sampledPointsLayers,
-                                                               edgesInPolygonsList, edgesCrossingPolygonsList, True)
+        if self.createShortestPathView:
+            self.__createShortestPathViewLayers()
 
-            weights.append(eval(costFunction))
+        return self.graph
 
-        # append the list
-        self.graph.edgeWeights.append(weights)
+    def updateEdgeCosts(self, edgeIds, graph=None):
+        """
+        Recalculates the costs of edited edges with the cost functions of the last call of
+        setAllEdgeCosts, e.g. after a vertex got moved or an edge got added. Only the given edges
+        are analysed, the costs of all other edges are kept. Polygon indices, AStar objects and
+        shortest paths between known points are reused.
+
+        :type edgeIds: List of Integer
+        :type graph: ExtGraph to update, the graph of the calculator if None
+        :return graph with updated edge costs
+        """
+        if graph is not None:
+            self.graph = graph
+        # the task of the GraphBuilder is finished when the graph gets edited
+        self.task = None
 
-        if self.createShortestPathView:
-            self.shortestPathViewLayers = []
-            for aStarObj in self.aStarAlgObjects:
-                if aStarObj is not None:
-                    fileName = "SPView" + "_" + str(aStarObj.rasterID) + "_" + str(aStarObj.heuristicID)
-                    tmpPath = QgsProcessingUtils.generateTempFilename(fileName + ".tif")
-                    driver = gdal.GetDriverByName('GTiff')
-                    ds = driver.Create(tmpPath, ysize=aStarObj.matrixRowSize, xsize=aStarObj.matrixColSize, bands=3,
-                                       eType=gdal.GDT_Byte)
-                    ds.GetRasterBand(1).WriteArray(aStarObj.getShortestPathMatrix1())
-                    ds.GetRasterBand(2).WriteArray(aStarObj.getShortestPathMatrix2())
-                    ds.GetRasterBand(3).WriteArray(aStarObj.getShortestPathMatrix3())
-                    ds.GetRasterBand(1).SetColorInterpretation(gdal.GCI_RedBand)
-                    ds.GetRasterBand(2).SetColorInterpretation(gdal.GCI_GreenBand)
-                    ds.GetRasterBand(3).SetColorInterpretation(gdal.GCI_BlueBand)
-                    dsRasterLayer = gdal.Open(self.rLayers[aStarObj.rasterID].source())
-                    geot = dsRasterLayer.GetGeoTransform()
-                    srs = osr.SpatialReference()
-                    if "EPSG" in self.rLayers[aStarObj.rasterID].crs().authid():
-                        importID = self.rLayers[aStarObj.rasterID].crs().authid().split(":")[1]
-                        srs.ImportFromEPSG(int(importID))
-                    elif "ESRI" in self.rLayers[aStarObj.rasterID].crs().authid():
-                        importID = self.rLayers[aStarObj.rasterID].crs().authid().split(":")[1]
-                        srs.ImportFromESRI(int(importID))
-                    ds.SetGeoTransform(geot)
-                    ds.SetProjection(srs.ExportToWkt())
-                    ds.FlushCache()
-                    ds = None
-                    viewRasterLayer = QgsRasterLayer(tmpPath, fileName)
-                    self.shortestPathViewLayers.append(viewRasterLayer)
-
-        """
-        FOR EDITING WITH ADVANCED COSTS:
-        else:
-            translatedParts = []
-            # call function to translate the  parts
-            for j in range(len(formulaParts)):
-                # check if the current variables was already analyzed
-                alreadyDone = False
-                foundIndex = 0
-                for o in range(j):
-                    if formulaParts[o] == formulaParts[j]:
-                        alreadyDone = True
-                        foundIndex = o
-                        break
-                # only translate if not already done
-                if alreadyDone == False:
-                    translatedParts.append(self.__translate(formulaParts[j], edgeID, sampledPointsLayers,
-                                           edgesInPolygons, edgesCrossingPolygons))
-                else:
-                    translatedParts.append(translatedParts[foundIndex])
+        edgeIds = [edgeId for edgeId in dict.fromkeys(edgeIds) if edgeId in self.graph.edges()]
+        if not edgeIds or not self.__formulas:
+            return self.graph
 
-            # after all variables are translated to numbers if conditions can be evaluated
-            for j in range(len(formulaParts)):
-                translatedParts[j] = self.__evaluateIfs(str(translatedParts[j]))
+        allWeights = self.__evaluateFormulas(edgeIds, False)
+        for functionIndex, weights in enumerate(allWeights):
+            for edgeId, weight in zip(edgeIds, weights.tolist()):
+                self.graph.setCostOfEdge(edgeId, functionIndex, weight)
 
-            counter = 0
-            translatedFormula = costFunction
-            for var in variables:
-                translatedFormula = translatedFormula.replace(var,str(translatedParts[counter]))
-                counter+=1
+        return self.graph
 
-            self.graph.edgeWeights[costFunctionCount].append(eval(translatedFormula))
+    def __evaluateFormulas(self, edgeIds, allEdges):
         """
-        return self.graph
+        Calculates the columns of all terms of the parsed cost functions for the given edges and
+        evaluates the cost functions on them.
+
+        :type edgeIds: List of Integer
+        :type allEdges: Boolean True if the costs of all edges of a new graph are calculated, only then
+                        shortest paths are distributed over worker processes
+        :return List with a numpy array of edge costs per cost function, None if the task got canceled
+        """
+        if allEdges:
+            rngs = [np.random.default_rng(seed) for seed in self.costFunctionSeeds]
+        else:
+            # edited edges get random values depending on the seed and the edited edges
+            rngs = [np.random.default_rng([seed] + list(edgeIds)) for seed in self.costFunctionSeeds]
+
+        terms = list(dict.fromkeys(term for formula in self.__formulas for term in formula.terms()))
+
+        self.__edgeIds = edgeIds
+        self.__useWorkers = allEdges
+        self.__edgeCoordinates = None
+        self.__samples = {}
+        self.__statistics = {}
+        self.__polygonColumns = {}
+        self.shortestPathDeviationBounds = {}
+
+        columns = {}
+        for term in terms:
+            if self.__isCanceled():
+                return None
+            self.__termProgress = 70 / len(terms)
+            self.__termProgressSpent = 0
+            columns[term.key] = self.__termColumn(term)
+            self.__advanceProgress(self.__termProgress - self.__termProgressSpent)
+
+        if self.__isCanceled():
+            return None
+
+        sharedSubexpressions = {}
+        return [formula.evaluate(columns, len(edgeIds), sharedSubexpressions, rng)
+                for formula, rng in zip(self.__formulas, rngs)]
+
+    def __createShortestPathViewLayers(self):
+        """
+        Writes the shortest paths of all AStarOnRasterData objects into temporary raster layers.
+        """
+        self.shortestPathViewLayers = []
+        for aStarObj in self.aStarAlgObjects:
+            if aStarObj is not None:
+                fileName = "SPView" + "_" + str(aStarObj.rasterID) + "_" + str(aStarObj.heuristicID)
+                tmpPath = QgsProcessingUtils.generateTempFilename(fileName + ".tif")
+                driver = gdal.GetDriverByName('GTiff')
+                ds = driver.Create(tmpPath, ysize=aStarObj.matrixRowSize, xsize=aStarObj.matrixColSize, bands=3,
+                                   eType=gdal.GDT_Byte, options=["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512",
+                                                                 "COMPRESS=DEFLATE", "PHOTOMETRIC=RGB"])
+                # write the view in strips of tile rows, so only one strip of a band is copied at a time
+                view = aStarObj.getShortestPathView()
+                for rowStart in range(0, aStarObj.matrixRowSize, 512):
+                    for bandIndex in range(3):
+                        ds.GetRasterBand(bandIndex + 1).WriteArray(
+                            np.ascontiguousarray(view[rowStart:rowStart + 512, :, bandIndex]), 0, rowStart)
+                ds.GetRasterBand(1).SetColorInterpretation(gdal.GCI_RedBand)
+                ds.GetRasterBand(2).SetColorInterpretation(gdal.GCI_GreenBand)
+                ds.GetRasterBand(3).SetColorInterpretation(gdal.GCI_BlueBand)
+                dsRasterLayer = gdal.Open(self.rLayers[aStarObj.rasterID].source())
+                geot = dsRasterLayer.GetGeoTransform()
+                srs = osr.SpatialReference()
+                if "EPSG" in self.rLayers[aStarObj.rasterID].crs().authid():
+                    importID = self.rLayers[aStarObj.rasterID].crs().authid().split(":")[1]
+                    srs.ImportFromEPSG(int(importID))
+                elif "ESRI" in self.rLayers[aStarObj.rasterID].crs().authid():
+                    importID = self.rLayers[aStarObj.rasterID].crs().authid().split(":")[1]
+                    srs.ImportFromESRI(int(importID))
+                ds.SetGeoTransform(geot)
+                ds.SetProjection(srs.ExportToWkt())
+                ds.FlushCache()
+                ds = None
+                viewRasterLayer = QgsRasterLayer(tmpPath, fileName)
+                self.shortestPathViewLayers.append(viewRasterLayer)
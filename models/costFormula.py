@@ -0,0 +1,556 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+"""
+Parser and vectorized evaluator for the cost functions of the advanced distance strategy.
+
+The parser works on the formula translated by formulaCheck, where the brackets of the
+constructs are replaced by other symbols:
+
+    if(c;a;b)       -> if{c;a;b}
+    random(a,b)     -> rnd?a§b&
+    math.f(a,b)     -> math.f%a,b$
+
+The formula is parsed once into an expression tree. Every variable of the formula (distance
+metrics, fields, raster analyses and polygon checks) is a Term, which the AdvancedCostCalculator
+translates into a column holding one value per edge. The tree is then evaluated with numpy
+on the whole columns at once.
+"""
+
+import math
+import re
+
+import numpy as np
+
+from .segmentStatistics import segmentCounts
+
+METRICS = ["euclidean", "manhattan", "geodesic", "ellipsoidal"]
+
+RASTER_ANALYSES = ["sum", "mean", "median", "min", "max", "variance", "standDev", "gradientSum", "gradientMin",
+                   "gradientMax", "ascent", "descent", "totalClimb"]
+
+SHORTEST_PATH_ANALYSES = RASTER_ANALYSES + ["euclidean", "manhattan", "geodesic", "ellipsoidal"]
+
+POLYGON_ANALYSES = ["insidePolygon", "crossesPolygon"]
+
+# math functions which have a numpy equivalent, all others are vectorized with np.vectorize
+NUMPY_FUNCTIONS = {
+    "sqrt": np.sqrt, "exp": np.exp, "expm1": np.expm1, "log10": np.log10, "log2": np.log2, "log1p": np.log1p,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan,
+    "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh, "asinh": np.arcsinh, "acosh": np.arccosh,
+    "atanh": np.arctanh, "fabs": np.fabs, "floor": np.floor, "ceil": np.ceil, "trunc": np.trunc,
+    "degrees": np.degrees, "radians": np.radians, "pow": np.power, "atan2": np.arctan2, "copysign": np.copysign,
+    "fmod": np.fmod, "hypot": np.hypot,
+}
+
+COMPARISONS = {
+    "<=": np.less_equal, ">=": np.greater_equal, "==": np.equal, "!=": np.not_equal, "<": np.less, ">": np.greater,
+}
+
+
+class Term:
+    """
+    Variable of a cost function that is translated into one column of per edge values.
+
+    kind is one of "metric", "field", "rasterStatistic", "rasterSamples", "shortestPathStatistic",
+    "shortestPathSamples" and "polygon". The columns of the sample kinds are tuples (values, offsets)
+    where the samples of edge i are values[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, kind, name, rasterIndex=None, heuristicIndex=None, polygonIndex=None):
+        self.kind = kind
+        self.name = name
+        self.rasterIndex = rasterIndex
+        self.heuristicIndex = heuristicIndex
+        self.polygonIndex = polygonIndex
+
+    @property
+    def key(self):
+        if self.kind == "metric":
+            return self.name
+        if self.kind == "field":
+            return "field:" + self.name
+        if self.kind == "rasterStatistic":
+            return "raster[{}]:{}".format(self.rasterIndex, self.name)
+        if self.kind == "rasterSamples":
+            return "raster[{}]:pixelValue".format(self.rasterIndex)
+        if self.kind == "shortestPathStatistic":
+            return "raster[{}]:sp{}({})".format(self.rasterIndex, self.name[0].upper() + self.name[1:],
+                                                self.heuristicIndex)
+        if self.kind == "shortestPathSamples":
+            return "raster[{}]:spPixelValue({})".format(self.rasterIndex, self.heuristicIndex)
+        return "polygon[{}]:{}".format(self.polygonIndex, self.name)
+
+    def __eq__(self, other):
+        return isinstance(other, Term) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return "Term({})".format(self.key)
+
+
+class _Context:
+
+    def __init__(self, columns, edgeCount, cache, rng):
+        self.columns = columns
+        self.edgeCount = edgeCount
+        self.cache = cache
+        self.rng = rng
+
+
+class _Node:
+    """
+    Node of the expression tree. The key describes the subexpression of the node, results of
+    cacheable nodes are stored in the cache of the context under their key, so equal subexpressions
+    of all formulas evaluated with the same cache are only computed once.
+    """
+
+    key = ""
+    cacheable = True
+
+    def evaluate(self, context):
+        if not self.cacheable:
+            return self.compute(context)
+        if self.key not in context.cache:
+            context.cache[self.key] = self.compute(context)
+        return context.cache[self.key]
+
+    def compute(self, context):
+        raise NotImplementedError
+
+    def terms(self):
+        return []
+
+
+class _Constant(_Node):
+
+    def __init__(self, value, isInteger=False):
+        self.value = value
+        self.isInteger = isInteger
+        self.key = repr(value)
+
+    def evaluate(self, context):
+        return self.value
+
+
+class _Variable(_Node):
+
+    def __init__(self, term):
+        self.term = term
+        self.key = term.key
+
+    def evaluate(self, context):
+        return context.columns[self.term.key]
+
+    def terms(self):
+        return [self.term]
+
+
+class _Operation(_Node):
+
+    def __init__(self, symbol, function, *operands):
+        self.function = function
+        self.operands = operands
+        self.key = "{}({})".format(symbol, ",".join(operand.key for operand in operands))
+        self.cacheable = all(operand.cacheable for operand in operands)
+
+    def compute(self, context):
+        return self.function(*[operand.evaluate(context) for operand in self.operands])
+
+    def terms(self):
+        return [term for operand in self.operands for term in operand.terms()]
+
+
+class _SampleComparison(_Node):
+    """
+    Comparison of the pixel values of an edge with a value. Without a percentage the comparison is
+    True if any value satisfies it, otherwise if at least percentage percent of the values satisfy it.
+    """
+
+    def __init__(self, samples, comparison, operand, percentage=None):
+        self.samples = samples
+        self.operator, self.comparison = comparison
+        self.operand = operand
+        self.percentage = percentage
+        self.key = "samples({}{}{},{})".format(samples.key, self.operator, operand.key, percentage)
+        self.cacheable = operand.cacheable
+
+    def compute(self, context):
+        values, offsets = context.columns[self.samples.term.key]
+        operand = np.broadcast_to(self.operand.evaluate(context), (context.edgeCount,))
+        counts = np.diff(offsets)
+        satisfied = segmentCounts(self.comparison(values, np.repeat(operand, counts)), offsets)
+        if self.percentage is None:
+            return satisfied > 0
+        share = np.divide(satisfied, counts, out=np.zeros(len(counts)), where=counts > 0)
+        return self.percentage <= share * 100
+
+    def terms(self):
+        return self.samples.terms() + self.operand.terms()
+
+
+class _If(_Node):
+
+    def __init__(self, condition, trueValue, falseValue):
+        self.condition = condition
+        self.trueValue = trueValue
+        self.falseValue = falseValue
+        self.key = "if({},{},{})".format(condition.key, trueValue.key, falseValue.key)
+        self.cacheable = condition.cacheable and trueValue.cacheable and falseValue.cacheable
+
+    def compute(self, context):
+        return np.where(self.condition.evaluate(context), self.trueValue.evaluate(context),
+                        self.falseValue.evaluate(context))
+
+    def terms(self):
+        return self.condition.terms() + self.trueValue.terms() + self.falseValue.terms()
+
+
+class _Random(_Node):
+    """
+    Random value between the bounds of every edge, integers if both bounds are integer numbers.
+    If the lower bound is bigger than the upper bound the value is 0. Random values are never shared,
+    the values of all edges are drawn at once from the generator of the context.
+    """
+
+    cacheable = False
+
+    def __init__(self, lowerBound, upperBound):
+        self.lowerBound = lowerBound
+        self.upperBound = upperBound
+        self.key = "random({},{})".format(lowerBound.key, upperBound.key)
+
+    def compute(self, context):
+        lowerBounds = np.broadcast_to(self.lowerBound.evaluate(context), (context.edgeCount,)).astype(float)
+        upperBounds = np.broadcast_to(self.upperBound.evaluate(context), (context.edgeCount,)).astype(float)
+        useIntegers = getattr(self.lowerBound, "isInteger", False) and getattr(self.upperBound, "isInteger", False)
+
+        values = np.zeros(context.edgeCount)
+        valid = lowerBounds <= upperBounds
+        if useIntegers:
+            values[valid] = context.rng.integers(lowerBounds[valid].astype(np.int64),
+                                                 upperBounds[valid].astype(np.int64), endpoint=True)
+        else:
+            values[valid] = context.rng.uniform(lowerBounds[valid], upperBounds[valid])
+        return values
+
+    def terms(self):
+        return self.lowerBound.terms() + self.upperBound.terms()
+
+
+def _mathFunction(name, argumentCount):
+    if name == "log" and argumentCount == 1:
+        return np.log
+    if name == "log":
+        return lambda x, base: np.log(x) / np.log(base)
+    if name in NUMPY_FUNCTIONS:
+        return NUMPY_FUNCTIONS[name]
+    if not hasattr(math, name):
+        raise ValueError("Unknown math function: math.{}".format(name))
+    return np.vectorize(getattr(math, name), otypes=[float])
+
+
+def _toFloat(value):
+    return np.asarray(value, dtype=float)
+
+
+def _truthy(value):
+    # truth value of every edge as in Python, NaN is true
+    return np.asarray(value) != 0
+
+
+def _or(a, b):
+    # like Python's or, the value of a where it is true, otherwise the value of b
+    return np.where(_truthy(a), a, b)
+
+
+def _and(a, b):
+    # like Python's and, the value of b where a is true, otherwise the value of a
+    return np.where(_truthy(a), b, a)
+
+
+class CostFormula:
+    """
+    Cost function of the advanced distance strategy parsed into an expression tree.
+    """
+
+    __numberRegex = re.compile(r'[0-9]+(\.[0-9]*)?([eE][+-]?[0-9]+)?|\.[0-9]+')
+    __nameRegex = re.compile(r'[A-z]+')
+    __fieldNameRegex = re.compile(r'\w+')
+    __indexRegex = re.compile(r'\[([0-9]+)\]:')
+    __shortestPathRegex = re.compile(r'sp([A-z]+?)\(([0-9]+)(,([0-9]+))?\)')
+    __percentRegex = re.compile(r'percentOfValues\(([0-9]+)\)')
+
+    def __init__(self, formula, fieldNames=None):
+        """
+        Constructor
+
+        :type formula: String translated by formulaCheck
+        :type fieldNames: List of String, used to separate field names from following and/or
+        """
+        self.formula = formula.replace(" ", "").replace('"', '')
+        self.fieldNames = sorted(fieldNames or [], key=len, reverse=True)
+        self.__pos = 0
+        self.__root = self.__parseOr()
+        if self.__pos != len(self.formula):
+            self.__error("Unexpected character")
+
+        # unique terms in order of occurrence
+        self.__terms = list(dict.fromkeys(self.__root.terms()))
+
+    def terms(self):
+        """
+        :return list of Terms the formula depends on
+        """
+        return list(self.__terms)
+
+    def evaluate(self, columns, edgeCount, cache=None, rng=None):
+        """
+        Evaluates the formula for all edges.
+
+        :type columns: dict of Term key -> numpy array with one value per edge or (values, offsets) for sample terms
+        :type edgeCount: Integer
+        :type cache: dict shared by several formulas evaluated on the same columns to compute
+                     common subexpressions only once
+        :type rng: numpy Generator for the random terms, an unseeded generator if None
+        :return numpy float array with the cost of every edge
+        """
+        context = _Context(columns, edgeCount, {} if cache is None else cache,
+                           np.random.default_rng() if rng is None else rng)
+        with np.errstate(all="ignore"):
+            result = self.__root.evaluate(context)
+        return np.array(np.broadcast_to(result, (edgeCount,)), dtype=float)
+
+    def __error(self, message):
+        raise ValueError("{} at position {} of cost function {}".format(message, self.__pos, self.formula))
+
+    def __accept(self, token):
+        if self.formula.startswith(token, self.__pos):
+            self.__pos += len(token)
+            return True
+        return False
+
+    def __expect(self, token):
+        if not self.__accept(token):
+            self.__error("Expected '{}'".format(token))
+
+    def __parseOr(self):
+        node = self.__parseAnd()
+        while self.__accept("or"):
+            node = _Operation("or", _or, node, self.__parseAnd())
+        return node
+
+    def __parseAnd(self):
+        node = self.__parseComparison()
+        while self.__accept("and"):
+            node = _Operation("and", _and, node, self.__parseComparison())
+        return node
+
+    def __comparison(self):
+        for operator, function in COMPARISONS.items():
+            if self.__accept(operator):
+                return operator, function
+        return None
+
+    def __parseComparison(self):
+        # pixel value analyses are only allowed as first operand of a comparison
+        samples = self.__parseSamples()
+        if samples is not None:
+            node, percentage = samples
+            comparison = self.__comparison()
+            if comparison is None:
+                self.__error("Missing comparison operator")
+            return _SampleComparison(node, comparison, self.__parseAdditive(), percentage)
+
+        node = self.__parseAdditive()
+        comparison = self.__comparison()
+        if comparison is not None:
+            node = _Operation(comparison[0], comparison[1], node, self.__parseAdditive())
+        return node
+
+    def __parseAdditive(self):
+        node = self.__parseMultiplicative()
+        while True:
+            if self.__accept("+"):
+                # booleans are summed as numbers, numpy would add them as a logical or
+                node = _Operation("+", lambda a, b: np.add(_toFloat(a), _toFloat(b)), node,
+                                  self.__parseMultiplicative())
+            elif self.__accept("-"):
+                node = _Operation("-", lambda a, b: np.subtract(_toFloat(a), _toFloat(b)), node,
+                                  self.__parseMultiplicative())
+            else:
+                return node
+
+    def __parseMultiplicative(self):
+        node = self.__parseUnary()
+        while True:
+            if self.__accept("*"):
+                node = _Operation("*", np.multiply, node, self.__parseUnary())
+            elif self.__accept("/"):
+                node = _Operation("/", lambda a, b: np.true_divide(_toFloat(a), b), node,
+                                  self.__parseUnary())
+            else:
+                return node
+
+    def __parseUnary(self):
+        if self.__accept("-"):
+            return _Operation("neg", lambda a: np.negative(_toFloat(a)), self.__parseUnary())
+        if self.__accept("+"):
+            return self.__parseUnary()
+        return self.__parsePrimary()
+
+    def __parsePrimary(self):
+        if self.__accept("("):
+            node = self.__parseOr()
+            self.__expect(")")
+            return node
+
+        if self.__accept("if{"):
+            condition = self.__parseOr()
+            self.__expect(";")
+            trueValue = self.__parseOr()
+            self.__expect(";")
+            falseValue = self.__parseOr()
+            self.__expect("}")
+            return _If(condition, trueValue, falseValue)
+
+        if self.__accept("rnd?"):
+            lowerBound = self.__parseOr()
+            self.__expect("§")
+            upperBound = self.__parseOr()
+            self.__expect("&")
+            return _Random(lowerBound, upperBound)
+
+        if self.__accept("math."):
+            match = self.__nameRegex.match(self.formula, self.__pos)
+            if match is None:
+                self.__error("Missing math function")
+            self.__pos = match.end()
+            self.__expect("%")
+            arguments = [self.__parseOr()]
+            while self.__accept(","):
+                arguments.append(self.__parseOr())
+            self.__expect("$")
+            function = _mathFunction(match.group(), len(arguments))
+            return _Operation("math." + match.group(), lambda *values: function(*[_toFloat(value) for value in values]),
+                              *arguments)
+
+        if self.__accept("True"):
+            return _Constant(True)
+        if self.__accept("False"):
+            return _Constant(False)
+
+        match = self.__numberRegex.match(self.formula, self.__pos)
+        if match is not None:
+            self.__pos = match.end()
+            text = match.group()
+            if text.isdigit():
+                return _Constant(int(text), isInteger=True)
+            return _Constant(float(text))
+
+        for metric in METRICS:
+            if self.__accept(metric):
+                return _Variable(Term("metric", metric))
+
+        if self.__accept("field:"):
+            return _Variable(Term("field", self.__parseFieldName()))
+
+        if self.__accept("polygon"):
+            index = self.__parseIndex()
+            for analysis in POLYGON_ANALYSES:
+                if self.__accept(analysis):
+                    return _Variable(Term("polygon", analysis, polygonIndex=index))
+            self.__error("Invalid polygon analysis")
+
+        if self.formula.startswith("raster", self.__pos):
+            return self.__parseRasterStatistic()
+
+        self.__error("Invalid operand")
+
+    def __parseFieldName(self):
+        for fieldName in self.fieldNames:
+            if self.__accept(fieldName):
+                return fieldName
+        match = self.__fieldNameRegex.match(self.formula, self.__pos)
+        if match is None:
+            self.__error("Missing field name")
+        self.__pos = match.end()
+        return match.group()
+
+    def __parseIndex(self):
+        match = self.__indexRegex.match(self.formula, self.__pos)
+        if match is None:
+            self.__error("Missing index")
+        self.__pos = match.end()
+        return int(match.group(1))
+
+    def __parseSamples(self):
+        """
+        Parses a pixelValue or percentOfValues analysis if one starts at the current position.
+
+        :return (_Variable of a sample Term, percentage or None) or None
+        """
+        start = self.__pos
+        if not self.__accept("raster"):
+            return None
+        rasterIndex = self.__parseIndex()
+
+        if self.__accept("pixelValue"):
+            return _Variable(Term("rasterSamples", "pixelValue", rasterIndex)), None
+
+        match = self.__percentRegex.match(self.formula, self.__pos)
+        if match is not None:
+            self.__pos = match.end()
+            return _Variable(Term("rasterSamples", "pixelValue", rasterIndex)), int(match.group(1))
+
+        match = self.__shortestPathRegex.match(self.formula, self.__pos)
+        if match is not None and match.group(1) in ["PixelValue", "PercentOfValues"]:
+            self.__pos = match.end()
+            samples = _Variable(Term("shortestPathSamples", "pixelValue", rasterIndex, int(match.group(2))))
+            if match.group(1) == "PixelValue":
+                return samples, None
+            if match.group(4) is None:
+                self.__error("Missing percentage")
+            return samples, int(match.group(4))
+
+        self.__pos = start
+        return None
+
+    def __parseRasterStatistic(self):
+        self.__expect("raster")
+        rasterIndex = self.__parseIndex()
+
+        match = self.__shortestPathRegex.match(self.formula, self.__pos)
+        if match is not None:
+            analysis = match.group(1)[0].lower() + match.group(1)[1:]
+            if analysis not in SHORTEST_PATH_ANALYSES:
+                self.__error("Invalid raster analysis")
+            self.__pos = match.end()
+            # the optional second value is only used as percentage by spPercentOfValues
+            return _Variable(Term("shortestPathStatistic", analysis, rasterIndex, int(match.group(2))))
+
+        # the analysis is directly followed by the next operator, which can be and/or
+        for analysis in sorted(RASTER_ANALYSES, key=len, reverse=True):
+            if self.__accept(analysis):
+                return _Variable(Term("rasterStatistic", analysis, rasterIndex))
+
+        if self.formula.startswith("pixelValue", self.__pos) or self.formula.startswith("percentOfValues", self.__pos):
+            self.__error("Pixel value analysis can only be used as first operand of a comparison")
+        self.__error("Invalid raster analysis")
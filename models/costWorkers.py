@@ -0,0 +1,189 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+"""
+Worker processes for the AdvancedCostCalculator. The workers do not use any QGIS classes,
+every worker opens the raster with GDAL on its own or maps the band written by the main process
+into memory and receives pixel positions, which are calculated in the main process.
+"""
+
+import multiprocessing
+import os
+import queue
+import runpy
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from . import workerStartup
+from .rasterTiles import AStar, createRasterSearch, deviationBound, maxDeviationBound
+
+# search and heuristic of the worker process, created by initializeShortestPathWorker
+_aStar = None
+_heuristicIndex = None
+
+
+def initializeShortestPathWorker(rasterPath, band, heuristicIndex, minRasterValue, meanRasterValue,
+                                 memoryBudget=None, corridorMargin=200, searchMode="Heuristic", landmarkCount=8,
+                                 hierarchyFactor=0, sharedBandPath=None):
+    """
+    Initializer of a worker process, reads or maps the raster band and creates the AStar object.
+
+    :type rasterPath: String
+    :type band: Integer [1..numberOfBands]
+    :type heuristicIndex: Integer
+    :type minRasterValue: Integer
+    :type meanRasterValue: Integer
+    :type memoryBudget: Integer number of bytes of the worker, see createRasterSearch
+    :type corridorMargin: Integer minimum number of pixels around the endpoints in a corridor search
+    :type searchMode: String one of Heuristic, Bidirectional, Landmarks
+    :type landmarkCount: Integer number of landmarks of the Landmarks search
+    :type hierarchyFactor: Integer block size of the coarse to fine search, 0 to search at full resolution
+    :type sharedBandPath: String path of the band written by shareBand or None, see createRasterSearch
+    """
+    global _aStar, _heuristicIndex
+    _heuristicIndex = heuristicIndex
+    _aStar, _ = createRasterSearch(rasterPath, band, heuristicIndex, minRasterValue, meanRasterValue, False,
+                                   memoryBudget, corridorMargin, searchMode, landmarkCount, hierarchyFactor,
+                                   sharedBandPath)
+
+
+def shortestPathBatch(pixelPairs):
+    """
+    Calculates the shortest paths through the raster of the worker. With the admissible heuristic
+    all pairs with the same start pixel share one search.
+
+    :type pixelPairs: List of (startRow, startCol, endRow, endCol)
+    :return (List of (pixel values on the path, number of diagonal steps),
+             largest deviation bound of the paths, see deviationBound)
+    """
+    if isinstance(_aStar, AStar):
+        return searchBatch(_aStar, pixelPairs)
+
+    deviationBounds = []
+    if _heuristicIndex == 0:
+        # start pixel -> positions of the pairs starting there
+        pairsBySource = {}
+        for i, (startRow, startCol, _, _) in enumerate(pixelPairs):
+            pairsBySource.setdefault((startRow, startCol), []).append(i)
+
+        results = [None] * len(pixelPairs)
+        for (startRow, startCol), positions in pairsBySource.items():
+            targets = [(pixelPairs[i][2], pixelPairs[i][3]) for i in positions]
+            paths = _aStar.shortestPathsFromSource(startRow, startCol, targets)
+            deviationBounds.append(deviationBound(_aStar))
+            for i, (pixelValues, diagonals) in zip(positions, paths):
+                results[i] = (list(pixelValues), diagonals)
+        return results, maxDeviationBound(deviationBounds)
+
+    results = []
+    for startRow, startCol, endRow, endCol in pixelPairs:
+        pixelValues = _aStar.shortestPath(startRow, startCol, endRow, endCol)
+        deviationBounds.append(deviationBound(_aStar))
+        results.append((list(pixelValues), _aStar.getNumberOfDiagonals()))
+    return results, maxDeviationBound(deviationBounds)
+
+
+def searchBatch(aStar, pixelPairs):
+    """
+    Calculates the shortest paths with one call of the batch entry point of the AStar object.
+
+    :type aStar: AStar
+    :type pixelPairs: List of (startRow, startCol, endRow, endCol)
+    :return see shortestPathBatch
+    """
+    values, offsets, diagonals = aStar.shortestPaths(np.array(pixelPairs, dtype=np.int32).reshape(-1, 4))
+    results = [(values[offsets[i]:offsets[i + 1]].tolist(), int(diagonals[i])) for i in range(len(pixelPairs))]
+    return results, deviationBound(aStar)
+
+
+def createSearchThreadPool(aStar, threadCount):
+    """
+    Creates a pool of threads, which search with copies of aStar sharing its raster. Only AStarC
+    searches without the GIL, see NATIVE_SEARCH.
+
+    :type aStar: AStarC AStar
+    :type threadCount: Integer
+    :return (ThreadPoolExecutor, queue.Queue of the AStar objects of the threads)
+    """
+    searches = queue.Queue()
+    for _ in range(threadCount):
+        searches.put(aStar.copySearch())
+    return ThreadPoolExecutor(max_workers=threadCount), searches
+
+
+def threadSearchBatch(searches, pixelPairs):
+    """
+    Calculates the shortest paths in a thread of createSearchThreadPool.
+
+    :type searches: queue.Queue of AStar objects, one of them is used for the batch
+    :type pixelPairs: List of (startRow, startCol, endRow, endCol)
+    :return see shortestPathBatch
+    """
+    aStar = searches.get()
+    try:
+        return searchBatch(aStar, pixelPairs)
+    finally:
+        searches.put(aStar)
+
+
+def pythonExecutable():
+    """
+    Inside of QGIS sys.executable is the QGIS binary, the workers have to be started with the
+    python interpreter QGIS is using.
+
+    :return String path of the python interpreter
+    """
+    if "python" in os.path.basename(sys.executable).lower():
+        return sys.executable
+
+    candidates = [os.path.join(sys.exec_prefix, "bin", "python3"), os.path.join(sys.exec_prefix, "python3.exe"),
+                  os.path.join(sys.exec_prefix, "python.exe")]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return shutil.which("python3") or sys.executable
+
+
+def createProcessPool(workerCount, initializer, initargs):
+    """
+    Creates a pool of spawned worker processes. The workers are started with the script workerStartup,
+    which imports the initializer and the functions submitted to the pool without running the __init__
+    of the plugin package, so the workers do not import the user interface of the plugin.
+
+    :type workerCount: Integer
+    :type initializer: function called once in every worker
+    :type initargs: tuple of arguments of the initializer
+    :return ProcessPoolExecutor
+    """
+    packageName = __name__.split(".")[0]
+    workerStart = {
+        "packageName": packageName,
+        "packagePaths": list(sys.modules[packageName].__path__),
+        "initializerModule": initializer.__module__,
+        "initializerName": initializer.__qualname__,
+        "initargs": tuple(initargs),
+    }
+    startupPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workerStartup.py")
+
+    context = multiprocessing.get_context("spawn")
+    context.set_executable(pythonExecutable())
+    return ProcessPoolExecutor(max_workers=workerCount, mp_context=context, initializer=runpy.run_path,
+                               initargs=(startupPath, {"workerStart": workerStart}, workerStartup.RUN_NAME))
@@ -26,6 +26,7 @@ from qgis.core import (QgsUnitTypes, QgsDistanceArea, QgsRectangle, QgsPointXY,
 from qgis.PyQt.QtCore import QObject
 
 from ..lib.kdtree import kdtree
+from . import neighborSearch
 
 
 class ExtGraph(QObject):
@@ -185,6 +186,18 @@ class ExtGraph(QObject):
         self.featureMatchings = []
         self.pointsToFeatureHash = {}
 
+        # feature ids of the layer the graph was created from, used to update the graph on layer edits
+        self.featureToVertexHash = {}
+        self.featureToEdgesHash = {}
+
+        # attribute columns of the point features used by cost functions, field name -> values by vertex id
+        self.vertexFieldValues = {}
+
+        # AdvancedCostCalculator which calculated the advanced costs, used to update the costs of edited edges
+        self.costCalculator = None
+        # seeds of the random terms, one for every cost function
+        self.costFunctionSeeds = []
+
         # default information from GraphBuilder
         self.numberNeighbours = 20
         self.edgeDirection = "Directed"
@@ -192,6 +205,8 @@ class ExtGraph(QObject):
         self.nnAllowDoubleEdges = True
         self.distance = (0, QgsUnitTypes.DistanceUnknownUnit)
         self.randomSeed = None
+        # estimated recall if the neighbors were searched approximately
+        self.approximateNNRecall = None
 
         self.kdTree = None
 
@@ -262,6 +277,67 @@ class ExtGraph(QObject):
 
         return size
 
+    def copy(self):
+        """
+        Creates an independent copy of the graph. Vertices, edges and weights are copied,
+        features and layers are shared with the original graph.
+
+        :return ExtGraph
+        """
+        graphCopy = ExtGraph()
+        graphCopy.distanceStrategy = self.distanceStrategy
+        graphCopy.mConnectionType = self.mConnectionType
+        graphCopy.edgeWeights = [list(weights) for weights in self.edgeWeights]
+        graphCopy.vertexWeights = [list(weights) for weights in self.vertexWeights]
+        graphCopy.crs = self.crs
+
+        graphCopy.vLayer = self.vLayer
+        graphCopy.lineLayerForConnection = self.lineLayerForConnection
+
+        for vertexId, vertex in self.mVertices.items():
+            vertexCopy = self.ExtVertex(QgsPointXY(vertex.point()))
+            vertexCopy.mIncomingEdges = list(vertex.mIncomingEdges)
+            vertexCopy.mOutgoingEdges = list(vertex.mOutgoingEdges)
+            if hasattr(vertex, "mClusterID"):
+                vertexCopy.setClusterID(vertex.mClusterID)
+            graphCopy.mVertices[vertexId] = vertexCopy
+
+        for edgeId, edge in self.mEdges.items():
+            edgeCopy = self.ExtEdge(edge.mFromID, edge.mToID, edge.isHighlighted)
+            edgeCopy.feature = edge.feature
+            graphCopy.mEdges[edgeId] = edgeCopy
+
+        graphCopy.verticesSorted = self.verticesSorted
+        graphCopy.edgesSorted = self.edgesSorted
+        graphCopy.mEdgeCount = self.mEdgeCount
+        graphCopy.mVertexCount = self.mVertexCount
+        graphCopy.mMaxEdgeID = self.mMaxEdgeID
+        graphCopy.mMaxVertexID = self.mMaxVertexID
+
+        graphCopy.featureMatchings = list(self.featureMatchings)
+        graphCopy.pointsToFeatureHash = dict(self.pointsToFeatureHash)
+        graphCopy.featureToVertexHash = dict(self.featureToVertexHash)
+        graphCopy.vertexFieldValues = {fieldName: values.copy() for fieldName, values in self.vertexFieldValues.items()}
+        graphCopy.featureToEdgesHash = {featureId: list(edgeIds)
+                                        for featureId, edgeIds in self.featureToEdgesHash.items()}
+
+        graphCopy.setGraphBuilderInformation(self.numberNeighbours, self.edgeDirection, self.clusterNumber,
+                                             self.nnAllowDoubleEdges, self.distance)
+        graphCopy.randomSeed = self.randomSeed
+        graphCopy.approximateNNRecall = self.approximateNNRecall
+        # the copy gets its own calculator, updating its costs must not change the calculator of this graph
+        if self.costCalculator is not None:
+            graphCopy.costCalculator = self.costCalculator.copy(graphCopy)
+        graphCopy.costFunctionSeeds = list(self.costFunctionSeeds)
+        graphCopy.mJobId = self.mJobId
+
+        if hasattr(self, "mNextClusterID"):
+            graphCopy.setNextClusterID(self.mNextClusterID)
+        if hasattr(self, "advancedVertexWeights"):
+            graphCopy.advancedVertexWeights = self.advancedVertexWeights
+
+        return graphCopy
+
     def setVectorLayer(self, layer):
         self.vLayer = layer
 
@@ -274,6 +350,9 @@ class ExtGraph(QObject):
     def setRandomSeed(self, seed):
         self.randomSeed = seed
 
+    def setApproximateNNRecall(self, recall):
+        self.approximateNNRecall = recall
+
     def setDistanceStrategy(self, strategy):
         """
         Function is called by the GraphBuilder every time the makeGraph
@@ -329,6 +408,32 @@ class ExtGraph(QObject):
 
         self.edgeWeights[functionIndex][edgeId] = cost
 
+    def setCostCalculator(self, costCalculator):
+        self.costCalculator = costCalculator
+
+    def setCostFunctionSeeds(self, seeds):
+        self.costFunctionSeeds = list(seeds)
+
+    def canUpdateEdgeCosts(self):
+        """
+        :return Bool True if the advanced costs of edited edges can be recalculated
+        """
+        return self.distanceStrategy == "Advanced" and self.costCalculator is not None and\
+            len(self.costCalculator.costFunctions) > 0
+
+    def updateEdgeCosts(self, edgeIds):
+        """
+        Recalculates the advanced costs of the given edges with the cost functions the graph was
+        created with. The costs of all other edges stay the same.
+
+        :type edgeIds: List of Integer
+        :return Bool True if the costs got recalculated
+        """
+        if not self.canUpdateEdgeCosts():
+            return False
+        self.costCalculator.updateEdgeCosts(edgeIds, self)
+        return True
+
     def costOfEdge(self, edgeId, functionIndex=0):
         """
         Function to get the weight of an edge. The returned value
@@ -561,6 +666,7 @@ class ExtGraph(QObject):
         addedEdge = self.ExtEdge(vertex1ID, vertex2ID, highlighted)
         if feat is not None:
             addedEdge.feature = feat
+            self.featureToEdgesHash.setdefault(feat.id(), []).append(addedEdgeID)
 
         self.mEdges[addedEdgeID] = addedEdge
 
@@ -604,7 +710,7 @@ class ExtGraph(QObject):
             self.mNextClusterID += 1
 
         if self.kdTree:
-            self.kdTree.add([point.x(), point.y()])
+            self.kdTree.add(neighborSearch.searchKey(point, addedVertexID, self.crs))
 
         # NOTE: this is commented since the plugin is mainly used for spanners atm
         # so vertexWeights are not always used
@@ -624,22 +730,21 @@ class ExtGraph(QObject):
 
         Complete, NearestNeighbor (NN), DistanceNN, ClusterNN, ClusterComplete
 
-        Does not support graphs with advanced costs
+        Graphs with advanced costs are only supported if their costs can be recalculated
 
         :type vertexCoordinates: list with x,y-Coordinates
         :type fromUndo: Bool, if the call comes from an UndoCommand
         :return list of edges
         """
-        if self.distanceStrategy == "Advanced":
+        if self.distanceStrategy == "Advanced" and not self.canUpdateEdgeCosts():
             return
 
         if not self.kdTree and self.mConnectionType != "Complete":
             points = []
             for vertexId in self.mVertices:
-                point = self.vertex(vertexId).point()
-                points.append([point.x(), point.y()])
+                points.append(neighborSearch.searchKey(self.vertex(vertexId).point(), vertexId, self.crs))
 
-            self.kdTree = kdtree.create(points)
+            self.kdTree = kdtree.create(points, neighborSearch.dimensions(self.crs))
 
         listOfEdges = []
         addedVertexID = self.addVertex(QgsPointXY(vertexCoordinates[0], vertexCoordinates[1]))
@@ -669,33 +774,28 @@ class ExtGraph(QObject):
                     if vertexId == addedVertexID:
                         continue
 
-                    p = self.vertex(vertexId).point()
-                    points.append([p.x(), p.y()])
-                self.kdTree = kdtree.create(points)
+                    points.append(neighborSearch.searchKey(self.vertex(vertexId).point(), vertexId, self.crs))
+                self.kdTree = kdtree.create(points, neighborSearch.dimensions(self.crs))
 
             # else:
             #     # this should already happen in addVertex
             #     self.kdTree.add([point.x(),point.y()])
 
+            searchKey = neighborSearch.searchKey(point, addedVertexID, self.crs)
             if self.mConnectionType == "Nearest neighbor":
-                listOfNeighbors = self.kdTree.search_knn([point.x(), point.y()], self.numberNeighbours+1)
-                rangeStart = 1
-                rangeEnd = len(listOfNeighbors)
+                listOfNeighbors = self.kdTree.search_knn(searchKey, self.numberNeighbours+1)
+                neighborIDs = [neighborSearch.keyId(neighbor[0].data) for neighbor in listOfNeighbors]
             elif self.mConnectionType == "DistanceNN":
-                transDistValue = self.distance[0] * QgsUnitTypes.fromUnitToUnitFactor(self.distance[1],
-                                                                                      self.crs.mapUnits())
-                listOfNeighbors = self.kdTree.search_nn_dist([point.x(), point.y()], pow(transDistValue, 2))
-                rangeStart = 0
-                rangeEnd = len(listOfNeighbors)-1
+                listOfNeighbors = self.kdTree.search_nn_dist(searchKey,
+                                                             neighborSearch.squaredSearchRadius(self.distance,
+                                                                                                self.crs))
+                neighborIDs = [neighborSearch.keyId(neighbor) for neighbor in listOfNeighbors]
+            neighborIDs = [neighborID for neighborID in neighborIDs if neighborID != addedVertexID]
+            if self.mConnectionType == "Nearest neighbor":
+                neighborIDs = neighborIDs[:self.numberNeighbours]
 
             addedEdgesCount = 1
-            for j in range(rangeStart, rangeEnd):
-                if self.mConnectionType == "Nearest neighbor":
-                    neighborPoint = listOfNeighbors[j][0].data
-                elif self.mConnectionType == "DistanceNN":
-                    neighborPoint = listOfNeighbors[j]
-
-                neighborID = self.findVertex(QgsPointXY(neighborPoint[0], neighborPoint[1]))
+            for neighborID in neighborIDs:
                 if not fromUndo:
                     edgeId = self.addEdge(addedVertexID, neighborID)
                 else:
@@ -714,8 +814,8 @@ class ExtGraph(QObject):
         elif self.mConnectionType == "ClusterComplete":
 
             # search nearest point
-            neighborPoint = self.kdTree.search_knn([point.x(), point.y()], 2)
-            neighborPointId = self.findVertex(QgsPointXY(neighborPoint[1][0].data[0], neighborPoint[1][0].data[1]))
+            neighborPoint = self.kdTree.search_knn(neighborSearch.searchKey(point, addedVertexID, self.crs), 2)
+            neighborPointId = neighborSearch.keyId(neighborPoint[1][0].data)
             neighborVertex = self.vertex(neighborPointId)
             neighborClusterID = neighborVertex.clusterID()
 
@@ -777,8 +877,8 @@ class ExtGraph(QObject):
         elif self.mConnectionType == "ClusterNN":
 
             # search nearest point
-            neighborPoint = self.kdTree.search_knn([point.x(), point.y()], 2)
-            neighborPointId = self.findVertex(QgsPointXY(neighborPoint[1][0].data[0], neighborPoint[1][0].data[1]))
+            neighborPoint = self.kdTree.search_knn(neighborSearch.searchKey(point, addedVertexID, self.crs), 2)
+            neighborPointId = neighborSearch.keyId(neighborPoint[1][0].data)
             neighborVertex = self.vertex(neighborPointId)
             neighborClusterID = neighborVertex.clusterID()
 
@@ -787,17 +887,17 @@ class ExtGraph(QObject):
             for vertexId in self.mVertices:
                 vertex = self.vertex(vertexId)
                 if vertex.clusterID() == neighborClusterID:
-                    points.append([vertex.point().x(), vertex.point().y(), vertexId])
+                    points.append(neighborSearch.searchKey(vertex.point(), vertexId, self.crs))
 
-            clusterKDTree = kdtree.create(points)
+            clusterKDTree = kdtree.create(points, neighborSearch.dimensions(self.crs))
 
             self.vertex(addedVertexID).setClusterID(neighborClusterID)
 
-            listOfNeighbors = clusterKDTree.search_knn([point.x(), point.y(), addedVertexID], self.numberNeighbours)
+            listOfNeighbors = clusterKDTree.search_knn(neighborSearch.searchKey(point, addedVertexID, self.crs),
+                                                       self.numberNeighbours)
             addedEdgesCount = 1
             for neighbor in listOfNeighbors:
-                neighborVertexID = self.findVertex(QgsPointXY(neighbor[0].data[0],
-                                                   neighbor[0].data[1]))
+                neighborVertexID = neighborSearch.keyId(neighbor[0].data)
 
                 if not fromUndo:
                     edgeId = self.addEdge(addedVertexID, neighborVertexID)
@@ -849,6 +949,9 @@ class ExtGraph(QObject):
                         addedEdgesCount += 1
                     listOfEdges.append([edgeId, randomVertexID, addedVertexID])
 
+        if not fromUndo and self.distanceStrategy == "Advanced":
+            self.updateEdgeCosts([edge[0] for edge in listOfEdges])
+
         return listOfEdges
 
     def edge(self, edgeId):
@@ -940,7 +1043,7 @@ class ExtGraph(QObject):
             vertex.mOutgoingEdges = []
 
             if self.kdTree:
-                self.kdTree.remove([vertex.point().x(), vertex.point().y()])
+                self.kdTree = self.kdTree.remove(neighborSearch.searchKey(vertex.point(), vertexId, self.crs))
 
             del self.mVertices[vertexId]
 
@@ -976,6 +1079,9 @@ class ExtGraph(QObject):
 
                     vertex.setNewPoint(newCoords)
 
+                # search keys depend on the coordinates and the crs
+                self.kdTree = None
+
             self.crs = newCrs
 
     def writeGraphML(self, path):
@@ -1101,6 +1207,8 @@ class ExtGraph(QObject):
                           '" distance="' + str(self.distance[0]) +\
                           '" distanceunit="' + str(self.distance[1]) + '"' +\
                           ((' seed="' + str(self.randomSeed)) + '"' if self.randomSeed else '') +\
+                          ((' costseeds="' + ",".join(str(seed) for seed in self.costFunctionSeeds) + '"')
+                           if self.costFunctionSeeds else '') +\
                           ((' crs="' + self.crs.authid() + '"') if self.crs else '') + '>\n'
             file.write(graphString)
 
@@ -1221,14 +1329,20 @@ class ExtGraph(QObject):
             if 'distanceunit=' in line:
                 self.distance.append(int(line.split('distanceunit="')[1].split('"')[0]))
 
-            if 'seed' in line:
-                self.randomSeed = int(line.split('seed="')[1].split('"')[0])
+            if ' seed="' in line:
+                self.randomSeed = int(line.split(' seed="')[1].split('"')[0])
+
+            if 'costseeds="' in line:
+                self.costFunctionSeeds = [int(seed) for seed in line.split('costseeds="')[1].split('"')[0].split(",")]
 
             if 'crs' in line:
                 self.crs = QgsCoordinateReferenceSystem(line.split('crs="')[1].split('"')[0])
 
             if 'key="x"' in line:
                 nodeCoordinatesGiven = True
+
+            # the attributes of the graph are followed by the nodes
+            if '<graph ' in line:
                 break
 
         self.edgeDirection = edgeTypeDirection
@@ -605,11 +605,10 @@ def formulaCheck(function, fields, numberOfRasterData, numberOfPolygons):
 
     partCounter = 1
     fieldSet = False
-    regex = re.compile(r'field:[A-z]+')
+    regex = re.compile(r'field:(\w+)')
     res = regex.findall(function)
-    for matchString in res:
+    for fieldName in res:
         fieldSet = True
-        fieldName = matchString.split("field:")[1]
         if not fieldName in possibleFields:
             errorPos = __findConstructPosition(originalFunction, "field", partCounter)
             toReturn = ("Error in field query: Invalid field name", "", errorPos[0], errorPos[1])
@@ -0,0 +1,127 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Dennis Benz, Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+import os
+from collections import OrderedDict
+
+from qgis.core import QgsRasterLayer
+
+
+class GraphBuildCache:
+    """
+    In memory cache for graphs created by the GraphBuilder. The cache key is a fingerprint
+    of the input layer contents and the builder options, a hit returns a copy of the cached graph.
+    The least recently used graph is dropped if more than maxEntries graphs are cached.
+    """
+
+    maxEntries = 5
+
+    # key -> (graph, [(path, name)] of the shortest path view rasters)
+    __entries = OrderedDict()
+
+    @classmethod
+    def get(cls, key):
+        """
+        Returns a copy of the cached graph and freshly loaded shortest path view layers.
+
+        :type key: String
+        :return (ExtGraph, [QgsRasterLayer]) or None if key is not cached
+        """
+        if key is None or key not in cls.__entries:
+            return None
+
+        cls.__entries.move_to_end(key)
+        graph, shortestPathViews = cls.__entries[key]
+
+        shortestPathViewLayers = []
+        for path, name in shortestPathViews:
+            if not os.path.isfile(path):
+                # temporary files got removed, entry is no longer complete
+                del cls.__entries[key]
+                return None
+            shortestPathViewLayers.append(QgsRasterLayer(path, name))
+
+        return graph.copy(), shortestPathViewLayers
+
+    @classmethod
+    def put(cls, key, graph, shortestPathViewLayers=None):
+        """
+        Stores a copy of the graph under the given key.
+
+        :type key: String
+        :type graph: ExtGraph
+        :type shortestPathViewLayers: [QgsRasterLayer]
+        """
+        if key is None:
+            return
+
+        shortestPathViews = []
+        if shortestPathViewLayers:
+            shortestPathViews = [(layer.source(), layer.name()) for layer in shortestPathViewLayers]
+
+        cls.__entries[key] = (graph.copy(), shortestPathViews)
+        cls.__entries.move_to_end(key)
+        while len(cls.__entries) > cls.maxEntries:
+            cls.__entries.popitem(last=False)
+
+    @classmethod
+    def clear(cls):
+        cls.__entries.clear()
+
+    @classmethod
+    def size(cls):
+        return len(cls.__entries)
+
+
+def fingerprintVectorLayer(layer, hashObject):
+    """
+    Adds the crs, fields, geometries and attributes of all features of the layer to the hash object.
+
+    :type layer: QgsVectorLayer
+    :type hashObject: hashlib hash object
+    """
+    if layer is None or not layer.isValid():
+        hashObject.update(b"invalid")
+        return
+
+    hashObject.update(layer.crs().authid().encode())
+    hashObject.update(layer.crs().toWkt().encode())
+    hashObject.update(str(layer.wkbType()).encode())
+    for field in layer.fields():
+        hashObject.update("{}:{};".format(field.name(), field.typeName()).encode())
+
+    for feature in layer.getFeatures():
+        hashObject.update(str(feature.id()).encode())
+        if feature.hasGeometry():
+            hashObject.update(bytes(feature.geometry().asWkb()))
+        hashObject.update(repr(feature.attributes()).encode())
+
+
+def fingerprintRasterLayer(layer, hashObject):
+    """
+    Adds the source, crs and file state of the raster layer to the hash object.
+
+    :type layer: QgsRasterLayer
+    :type hashObject: hashlib hash object
+    """
+    source = layer.source()
+    hashObject.update(source.encode())
+    hashObject.update(layer.crs().toWkt().encode())
+    if os.path.isfile(source):
+        stat = os.stat(source)
+        hashObject.update("{}:{}".format(stat.st_size, stat.st_mtime_ns).encode())
@@ -16,13 +16,17 @@
 #  License along with this program; if not, see
 #  https://www.gnu.org/licenses/gpl-2.0.html.
 
+import hashlib
 import math
 import random
+import re
 import sys
 
+import numpy as np
+
 from qgis.core import (QgsVectorLayer, QgsUnitTypes, QgsWkbTypes, QgsPointXY, QgsField, QgsCoordinateReferenceSystem,
                        QgsFeature, QgsGeometry, QgsProject, QgsPoint, QgsPalLayerSettings, QgsTextFormat,
-                       QgsTextBufferSettings, QgsVectorLayerSimpleLabeling, QgsMessageLog, Qgis)
+                       QgsTextBufferSettings, QgsVectorLayerSimpleLabeling, QgsMessageLog, Qgis, QgsFeatureRequest)
 from qgis.PyQt.QtGui import QFont, QColor
 from qgis.PyQt.QtCore import QVariant
 from qgis import processing
@@ -30,7 +34,10 @@ from qgis import processing
 from .extGraph import ExtGraph
 from .formulaCheck import formulaCheck
 from .advancedCostCalculator import AdvancedCostCalculator
+from .rasterCache import RasterCache
 from .graphLayer import GraphLayer
+from .graphBuildCache import GraphBuildCache, fingerprintVectorLayer, fingerprintRasterLayer
+from . import neighborSearch
 
 from ..lib.kdtree import kdtree
 
@@ -57,6 +64,23 @@ class GraphBuilder:
         - randomConnectionNumber: int
         - createFeatureInfos: False, True
         - degreeThreshold: int
+        - ingestionPageSize: int (number of point features read at once)
+        - approximateNN: False, True (approximate neighbor search for Nearest neighbor, see neighborSearch)
+        - approximateNNCellRings: int (searched grid cells around a point, more rings increase recall and runtime)
+        - approximateNNCellCapacity: int (points per grid cell used, multiple of neighborNumber)
+        - useBuildCache: False, True (reuse a graph built earlier from identical inputs and options)
+        - costWorkerCount: int (processes used for shortest paths through raster data in cost functions)
+        - rasterCachePath: String (sqlite file to keep shortest paths through raster data between runs,
+                           empty to disable)
+        - rasterCacheMaxSize: int (maximum number of bytes of the pixel values in the raster cache)
+        - rasterMemoryBudget: int (bytes for shortest paths through a raster, larger rasters are read in tiles
+                              and searched in a corridor around every edge, None for no limit)
+        - rasterCorridorMargin: int (minimum number of pixels around the edge in a corridor search)
+        - rasterSearchMode: "Heuristic", "Bidirectional", "Landmarks" (shortest paths through a raster with the
+                            heuristic of the cost function or exact with a bidirectional or landmark search)
+        - rasterLandmarkCount: int (landmarks computed once per raster for the Landmarks search)
+        - rasterHierarchyFactor: int (plan shortest paths through a raster on blocks of factor x factor pixels and
+                                 refine them at full resolution, 0 to search at full resolution)
 
     Random options:
         - numberOfVertices: int
@@ -102,7 +126,20 @@ class GraphBuilder:
             "createShortestPathView": False,
             "randomConnectionNumber": 100,
             "createFeatureInfos": False,
-            "degreeThreshold": 3
+            "degreeThreshold": 3,
+            "ingestionPageSize": 10000,
+            "approximateNN": False,
+            "approximateNNCellRings": 1,
+            "approximateNNCellCapacity": 2,
+            "useBuildCache": False,
+            "costWorkerCount": 1,
+            "rasterCachePath": "",
+            "rasterCacheMaxSize": 512 * 1024 * 1024,
+            "rasterMemoryBudget": 4 * 1024 * 1024 * 1024,
+            "rasterCorridorMargin": 200,
+            "rasterSearchMode": "Heuristic",
+            "rasterLandmarkCount": 8,
+            "rasterHierarchyFactor": 0
         }
 
         self.__randomOptions = {
@@ -253,21 +290,84 @@ class GraphBuilder:
                 self.graph.addVertex(QgsPointXY(random.uniform(rectangleExtent.xMinimum(), rectangleExtent.xMaximum()),
                                                 random.uniform(rectangleExtent.yMinimum(), rectangleExtent.yMaximum())))
 
+    def __inputCrs(self):
+        """
+        Returns the crs of the input points.
+
+        :return QgsCoordinateReferenceSystem
+        """
+        if self.__options["createRandomGraph"] == True:
+            if isinstance(self.__randomOptions["area"], tuple):
+                _, inputCRS = self.__randomOptions["area"]
+                return QgsCoordinateReferenceSystem(inputCRS)
+            return QgsCoordinateReferenceSystem("EPSG:4326")
+        return self.vLayer.crs()
+
+    def __costFunctionFields(self):
+        """
+        Returns the names of all fields used by the cost functions.
+
+        :return list of field names
+        """
+        fieldNames = []
+        for function in self.costFunctions:
+            for fieldName in re.findall(r'field:(\w+)', function):
+                if fieldName not in fieldNames and self.vLayer.fields().indexOf(fieldName) >= 0:
+                    fieldNames.append(fieldName)
+        return fieldNames
+
     def __createVerticesForPoints(self):
         """
         Method creates a new vertex in the graph for every point inside
-        the given vectorLayer.
+        the given vectorLayer. The layer is read in pages of ingestionPageSize features,
+        only the coordinates and the fields needed by the cost functions are kept.
         """
-        for feat in self.vLayer.getFeatures():
+        fieldNames = []
+        if self.__options["distanceStrategy"] == "Advanced":
+            fieldNames = self.__costFunctionFields()
+
+        featureIds = sorted(self.vLayer.allFeatureIds())
+        featureCount = len(featureIds)
+        if featureCount == 0:
+            return
+
+        # numeric columns are stored as float arrays, other columns as lists, both are indexed by the
+        # vertex id and sized to the ids the features get, vertices added later have no field values
+        fields = self.vLayer.fields()
+        valueCount = self.graph.nextVertexID() + featureCount
+        for fieldName in fieldNames:
+            if fields.field(fieldName).isNumeric():
+                self.graph.vertexFieldValues[fieldName] = np.full(valueCount, np.nan)
+            else:
+                self.graph.vertexFieldValues[fieldName] = [None] * valueCount
+
+        pageSize = max(1, self.__options["ingestionPageSize"])
+        for pageStart in range(0, featureCount, pageSize):
             if self.task is not None and self.task.isCanceled():
                 break
-            if self.task is not None:
-                self.task.setProgress(self.task.progress() + 10/self.vLayer.featureCount())
-            geom = feat.geometry()
 
-            if self.__options["distanceStrategy"] == "Advanced":
-                self.graph.pointsToFeatureHash[geom.asPoint().toString()] = feat
-            self.graph.addVertex(geom.asPoint())
+            request = QgsFeatureRequest().setFilterFids(featureIds[pageStart:pageStart + pageSize])
+            if fieldNames:
+                request.setSubsetOfAttributes(fieldNames, fields)
+            else:
+                request.setNoAttributes()
+
+            for feat in self.vLayer.getFeatures(request):
+                vertexId = self.graph.addVertex(feat.geometry().asPoint())
+                self.graph.featureToVertexHash[feat.id()] = vertexId
+                for fieldName in fieldNames:
+                    value = feat[fieldName]
+                    if isinstance(self.graph.vertexFieldValues[fieldName], np.ndarray):
+                        try:
+                            self.graph.vertexFieldValues[fieldName][vertexId] = float(value)
+                        except (TypeError, ValueError):
+                            pass
+                    else:
+                        self.graph.vertexFieldValues[fieldName][vertexId] = value
+
+            if self.task is not None:
+                self.task.setProgress(self.task.progress() + 10 * min(pageSize, featureCount - pageStart) /
+                                      featureCount)
 
     def __createLineBasedConnections(self):
         # initialize buckets: every bucket stands for one line segment and contains all assigned points
@@ -597,18 +697,20 @@ class GraphBuilder:
         The edges for the options DistanceNN and Nearest neighbor are created inside
         this method. A KD-Tree is used to find the nearest points.
         """
+        if self.__options["connectionType"] == "Nearest neighbor" and self.__options["approximateNN"]:
+            self.__createApproximateNearestNeighbor()
+            return
+
+        # geographic coordinates are searched on the unit sphere
+        crs = self.__inputCrs()
         points = []
         for i in range(self.graph.vertexCount()):
-            point = self.graph.vertex(i).point()
-            points.append([point.x(), point.y(), i])
+            points.append(neighborSearch.searchKey(self.graph.vertex(i).point(), i, crs))
 
-        self.kdTree = kdtree.create(points)
+        self.kdTree = kdtree.create(points, neighborSearch.dimensions(crs))
 
         if self.__options["connectionType"] == "DistanceNN":
-            if self.__options["createRandomGraph"] == True:
-                crsUnitRead = QgsCoordinateReferenceSystem("EPSG:4326")
-            else:
-                crsUnitRead = self.vLayer.crs()
+            searchRadius = neighborSearch.squaredSearchRadius(self.__options["distance"], crs)
 
         for i in range(self.graph.vertexCount()):
             if self.task is not None and self.task.isCanceled():
@@ -619,39 +721,72 @@ class GraphBuilder:
                 else:
                     _newProgress = self.task.progress() + 90/self.graph.vertexCount()
 
-            point = self.graph.vertex(i).point()
+            searchKey = points[i]
 
             if self.__options["connectionType"] == "Nearest neighbor":
                 if self.__options["edgeDirection"] == "Directed":
-                    listOfNeighbors = self.kdTree.search_knn(
-                        [point.x(), point.y(), i], self.__options["neighborNumber"]+1)
+                    listOfNeighbors = self.kdTree.search_knn(searchKey, self.__options["neighborNumber"]+1)
                 else:
                     if len(self.graph.mVertices[i].mIncomingEdges) < self.__options["neighborNumber"]:
-                        listOfNeighbors = self.kdTree.search_knn([point.x(), point.y(), i],
+                        listOfNeighbors = self.kdTree.search_knn(searchKey,
                                                                  self.__options["neighborNumber"]+1 -
                                                                  len(self.graph.mVertices[i].mIncomingEdges))
                     else:
                         listOfNeighbors = []
             elif self.__options["connectionType"] == "DistanceNN":
-                # make distance transformation
-                transDistValue = self.__options["distance"][0] *\
-                    QgsUnitTypes.fromUnitToUnitFactor(self.__options["distance"][1],
-                                                      crsUnitRead.mapUnits())
-                listOfNeighbors = self.kdTree.search_nn_dist([point.x(), point.y(), i], pow(transDistValue, 2))
+                listOfNeighbors = self.kdTree.search_nn_dist(searchKey, searchRadius)
             for neighbor in listOfNeighbors:
                 if self.__options["connectionType"] == "Nearest neighbor":
-                    neighborPoint = neighbor[0].data
+                    neighborID = neighborSearch.keyId(neighbor[0].data)
                 elif self.__options["connectionType"] == "DistanceNN":
-                    neighborPoint = neighbor
-                if i != neighborPoint[2]:
-                    self.graph.addEdge(i, neighborPoint[2])
+                    neighborID = neighborSearch.keyId(neighbor)
+                if i != neighborID:
+                    self.graph.addEdge(i, neighborID)
 
                 if self.__options["distanceStrategy"] == "Advanced":
-                    self.graph.featureMatchings.append(self.graph.mVertices[neighborPoint[2]].mCoordinates)
+                    self.graph.featureMatchings.append(self.graph.mVertices[neighborID].mCoordinates)
 
             if (self.__options["connectionType"] == "Nearest neighbor" or
                     self.__options["connectionType"] == "DistanceNN") and self.__options["nnAllowDoubleEdges"] == False:
-                self.kdTree = self.kdTree.remove([point.x(), point.y(), i])
+                self.kdTree = self.kdTree.remove(searchKey)
+
+    def __createApproximateNearestNeighbor(self):
+        """
+        Approximate variant of the Nearest neighbor connection for large point sets. The neighbors are
+        searched with grid hashing, the recall is estimated on a sample of the points and stored in the graph.
+        """
+        crs = self.__inputCrs()
+        vertexCount = self.graph.vertexCount()
+        coordinates = neighborSearch.keyCoordinates([neighborSearch.searchKey(self.graph.vertex(i).point(), i, crs)
+                                                     for i in range(vertexCount)])
+        neighbors = neighborSearch.approximateNearestNeighbors(coordinates, self.__options["neighborNumber"],
+                                                               self.__options["approximateNNCellRings"],
+                                                               self.__options["approximateNNCellCapacity"])
+
+        recall = neighborSearch.estimateRecall(coordinates, neighbors, self.__options["neighborNumber"])
+        self.graph.setApproximateNNRecall(recall)
+        QgsMessageLog.logMessage("Approximate nearest neighbor recall: {:.3f}".format(recall), level=Qgis.Info)
+
+        for i in range(vertexCount):
+            if self.task is not None and self.task.isCanceled():
+                return
+            if self.task is not None and i % 10000 == 0:
+                if self.__options["distanceStrategy"] == "Advanced":
+                    newProgress = self.task.progress() + 20 * min(10000, vertexCount - i) / vertexCount
+                else:
+                    newProgress = self.task.progress() + 90 * min(10000, vertexCount - i) / vertexCount
+                if newProgress <= 100:
+                    self.task.setProgress(newProgress)
+
+            for neighborID in neighbors[i].tolist():
+                if neighborID < 0:
+                    continue
+                if self.__options["nnAllowDoubleEdges"] == False and self.graph.hasEdge(neighborID, i) != -1:
+                    continue
+                self.graph.addEdge(i, neighborID)
+
+                if self.__options["distanceStrategy"] == "Advanced":
+                    self.graph.featureMatchings.append(self.graph.mVertices[neighborID].mCoordinates)
 
     def __createCluster(self):
         """
@@ -684,15 +819,17 @@ class GraphBuilder:
                 featureCounter += 1
 
             if self.__options["connectionType"] == "ClusterNN":
+                crs = self.__inputCrs()
                 points = []
+                searchKeys = {}
                 for pointInCluster in allPointsInCluster:
                     vertex = self.graph.vertex(pointInCluster)
                     vertex.setClusterID(cluster)
-                    point = vertex.point()
-                    points.append([point.x(), point.y(), pointInCluster])
+                    searchKeys[pointInCluster] = neighborSearch.searchKey(vertex.point(), pointInCluster, crs)
+                    points.append(searchKeys[pointInCluster])
 
                 # build kd tree
-                self.kdTree = kdtree.create(points)
+                self.kdTree = kdtree.create(points, neighborSearch.dimensions(crs))
                 for pointInCluster in allPointsInCluster:
                     if self.task is not None:
                         if self.__options["distanceStrategy"] == "Advanced":
@@ -703,33 +840,29 @@ class GraphBuilder:
                     if self.task is not None and self.task.isCanceled():
                         return
                     if len(allPointsInCluster) > 1:
-                        vertex = self.graph.vertex(pointInCluster).point()
+                        searchKey = searchKeys[pointInCluster]
 
                         if self.__options["edgeDirection"] == "Directed":
-                            nearestPoints = self.kdTree.search_knn([vertex.x(), vertex.y(),
-                                                                    pointInCluster],
-                                                                   self.__options["neighborNumber"]+1)
+                            nearestPoints = self.kdTree.search_knn(searchKey, self.__options["neighborNumber"]+1)
                         else:
                             nearestPoints = []
                             if len(self.graph.vertex(pointInCluster).mIncomingEdges) <\
                                self.__options["neighborNumber"]:
                                 nearestPoints = self.kdTree.search_knn(
-                                    [vertex.x(),
-                                     vertex.y(),
-                                     pointInCluster],
+                                    searchKey,
                                     self.__options["neighborNumber"] + 1 -
                                     (len(self.graph.vertex(pointInCluster).mIncomingEdges)))
 
                         for t in range(1, len(nearestPoints)):
-                            neighborPoint = nearestPoints[t][0].data
+                            neighborID = neighborSearch.keyId(nearestPoints[t][0].data)
 
-                            self.graph.addEdge(pointInCluster, neighborPoint[2])
+                            self.graph.addEdge(pointInCluster, neighborID)
 
                             if self.__options["distanceStrategy"] == "Advanced":
-                                self.graph.featureMatchings.append(self.graph.mVertices[neighborPoint[2]].mCoordinates)
+                                self.graph.featureMatchings.append(self.graph.mVertices[neighborID].mCoordinates)
 
                         if self.__options["nnAllowDoubleEdges"] == False:
-                            self.kdTree = self.kdTree.remove([vertex.x(), vertex.y(), pointInCluster])
+                            self.kdTree = self.kdTree.remove(searchKey)
 
             elif self.__options["connectionType"] == "ClusterComplete":
                 for i in range(len(allPointsInCluster)-1):
@@ -870,20 +1003,35 @@ class GraphBuilder:
                                                               "OUTPUT": "memory:"})
         layerWithDelEdges = result1["OUTPUT"]
 
-        # copy the result of the QGIS tool into a new graph
+        # copy the result of the QGIS tool into a new graph, the remaining edges keep their
+        # vertices and their originating features
         newGraph = ExtGraph()
+        newVertexIds = {}
         for feature in layerWithDelEdges.getFeatures():
             if self.task is not None and self.task.isCanceled():
                 return
-            geom = feature.geometry()
-
-            vertices = geom.asPolyline()
-            for i in range(len(vertices)-1):
-                startVertex = vertices[i]
-                endVertex = vertices[i+1]
-                id1 = newGraph.addVertex(startVertex)
-                id2 = newGraph.addVertex(endVertex)
-                newGraph.addEdge(id1, id2)
+            oldEdge = self.graph.edge(feature["ID"])
+            for oldVertexId in [oldEdge.fromVertex(), oldEdge.toVertex()]:
+                if oldVertexId not in newVertexIds:
+                    newVertexIds[oldVertexId] = newGraph.addVertex(self.graph.vertex(oldVertexId).point())
+            newGraph.addEdge(newVertexIds[oldEdge.fromVertex()], newVertexIds[oldEdge.toVertex()],
+                             feat=oldEdge.feature)
+
+        for featureId, oldVertexId in self.graph.featureToVertexHash.items():
+            if oldVertexId in newVertexIds:
+                newGraph.featureToVertexHash[featureId] = newVertexIds[oldVertexId]
+
+        oldVertexIds = np.array(sorted(newVertexIds, key=newVertexIds.get), dtype=np.int64)
+        for fieldName, values in self.graph.vertexFieldValues.items():
+            # vertices without a feature, e.g. additional points, have no field values
+            known = oldVertexIds < len(values)
+            if isinstance(values, np.ndarray):
+                newValues = np.full(len(oldVertexIds), np.nan)
+                newValues[known] = values[oldVertexIds[known]]
+            else:
+                newValues = [values[oldVertexId] if isKnown else None
+                             for oldVertexId, isKnown in zip(oldVertexIds.tolist(), known.tolist())]
+            newGraph.vertexFieldValues[fieldName] = newValues
 
         newGraph.setDistanceStrategy(self.graph.distanceStrategy)
         self.graph = newGraph
@@ -1055,6 +1203,56 @@ class GraphBuilder:
     def setGraph(self, graph):
         self.graph = graph
 
+    def __buildCacheKey(self):
+        """
+        Creates a fingerprint of all inputs and options which determine the resulting graph.
+        Returns None if the graph can not be reproduced, e.g. random graphs without seed.
+
+        :return String or None
+        """
+        randomUsed = self.__options["createRandomGraph"] or self.__options["connectionType"] == "Random" or\
+            (self.__options["distanceStrategy"] == "Advanced" and
+             any("rnd?" in function for function in self.costFunctions))
+        if randomUsed and self.__randomOptions["seed"] is None:
+            return None
+
+        hashObject = hashlib.sha1()
+        for option, value in sorted(self.__options.items()):
+            if option in ["createGraphAsLayers", "useBuildCache", "costWorkerCount", "rasterCachePath",
+                          "rasterCacheMaxSize"]:
+                continue
+            hashObject.update("{}={};".format(option, value).encode())
+        for option, value in sorted(self.__randomOptions.items()):
+            hashObject.update("{}={};".format(option, value).encode())
+        for function in self.costFunctions:
+            hashObject.update("function={};".format(function).encode())
+        hashObject.update("bands={};".format(self.rasterBands).encode())
+
+        if not self.__options["createRandomGraph"]:
+            fingerprintVectorLayer(self.vLayer, hashObject)
+        if self.__options["connectionType"] == "LineLayerBased":
+            fingerprintVectorLayer(self.connectionLineLayer, hashObject)
+        if self.__options["usePolygonsAsForbidden"]:
+            fingerprintVectorLayer(self.forbiddenAreas, hashObject)
+        if self.__options["useAdditionalPoints"]:
+            fingerprintVectorLayer(self.additionalPointLayer, hashObject)
+        for polygonLayer in self.polygonsForCostFunction:
+            fingerprintVectorLayer(polygonLayer, hashObject)
+        for rasterLayer in self.rLayers:
+            fingerprintRasterLayer(rasterLayer, hashObject)
+
+        return hashObject.hexdigest()
+
+    def __costFunctionSeeds(self):
+        """
+        Seeds of the random terms of the cost functions, derived from the seed of the random options
+        to reproduce the costs.
+
+        :return List of Integer, one seed per cost function
+        """
+        sequence = np.random.SeedSequence(self.__randomOptions["seed"])
+        return [int(child.generate_state(1, np.uint64)[0]) for child in sequence.spawn(len(self.costFunctions))]
+
     def makeGraph(self):
         """
         If this method is called the creation of the graph starts. The set options are read and
@@ -1062,6 +1260,18 @@ class GraphBuilder:
 
         :return ExtGraph
         """
+        cacheKey = None
+        if self.__options["useBuildCache"]:
+            cacheKey = self.__buildCacheKey()
+            cachedResult = GraphBuildCache.get(cacheKey)
+            if cachedResult is not None:
+                QgsMessageLog.logMessage("Graph taken from build cache", level=Qgis.Info)
+                self.graph, self.shortestPathViewLayers = cachedResult
+                if self.__options["createGraphAsLayers"] == True:
+                    self.createVertexLayer(True)
+                    self.createEdgeLayer(True)
+                return self.graph
+
         self.graph = ExtGraph()
         if not self.__options["createRandomGraph"]:
             self.graph.setVectorLayer(self.vLayer)
@@ -1114,18 +1324,38 @@ class GraphBuilder:
         # call AdvancedCostCalculations methods
         if self.__options["distanceStrategy"] == "Advanced" and not (hasattr(self, "advancedImport") and
            not self.advancedImport):
+            rasterCache = None
+            if self.__options["rasterCachePath"] and self.rLayers:
+                rasterCache = RasterCache(self.__options["rasterCachePath"], self.__options["rasterCacheMaxSize"])
+
             # create AdvancedCostCalculator object with the necessary parameters
             costCalculator = AdvancedCostCalculator(self.rLayers, self.vLayer, self.graph, self.polygonsForCostFunction,
                                                     self.__options["usePolygonsAsForbidden"], self.rasterBands,
                                                     self.task, self.__options["nnAllowDoubleEdges"],
-                                                    self.__options["createShortestPathView"])
-
-            # call the setEdgeCosts method of the AdvancedCostCalculator for every defined cost function
-            # the costCalculator returns a ExtGraph where costs are assigned multiple weights,
-            # if more then one cost function is defined
-            for func in self.costFunctions:
-                self.graph = costCalculator.setEdgeCosts(func)
+                                                    self.__options["createShortestPathView"],
+                                                    self.__options["costWorkerCount"], rasterCache,
+                                                    self.__options["rasterMemoryBudget"],
+                                                    self.__options["rasterCorridorMargin"],
+                                                    self.__options["rasterSearchMode"],
+                                                    self.__options["rasterLandmarkCount"],
+                                                    self.__options["rasterHierarchyFactor"])
+
+            # evaluate all defined cost functions in one pass, the costCalculator returns a ExtGraph
+            # where costs are assigned multiple weights, if more then one cost function is defined
+            if self.costFunctions:
+                self.graph = costCalculator.setAllEdgeCosts(self.costFunctions, self.__costFunctionSeeds())
+                self.graph.setCostFunctionSeeds(costCalculator.costFunctionSeeds)
                 self.shortestPathViewLayers = costCalculator.shortestPathViewLayers
+                if self.__options["rasterHierarchyFactor"] > 1:
+                    for (rasterIndex, heuristicIndex), bound in costCalculator.shortestPathDeviationBounds.items():
+                        QgsMessageLog.logMessage("Shortest paths through raster {} with heuristic {} deviate at most "
+                                                 "{} from the optimum".format(rasterIndex, heuristicIndex, bound),
+                                                 level=Qgis.Info)
+                # keep the calculator to update the costs of edges edited in the GraphMapTool
+                self.graph.setCostCalculator(costCalculator)
+
+        if cacheKey is not None and not (self.task is not None and self.task.isCanceled()):
+            GraphBuildCache.put(cacheKey, self.graph, self.shortestPathViewLayers)
 
         # create the layers for QGIS
         if self.__options["createGraphAsLayers"] == True:
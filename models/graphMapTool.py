@@ -63,7 +63,10 @@ class GraphMapTool(QgsMapTool, QObject):
         self.triggeredAction = None
 
     def activate(self):
-        self.advancedCosts = self.mLayer.mGraph.distanceStrategy == "Advanced"
+        # advanced costs which can not be recalculated (e.g. imported from a GraphML file)
+        # prevent edits that change the costs of existing edges
+        self.advancedCosts = self.mLayer.mGraph.distanceStrategy == "Advanced" and\
+            not self.mLayer.mGraph.canUpdateEdgeCosts()
         iface.mapCanvas().grabKeyboard()
 
         # enable actions in edit toolbar and listen to them
@@ -142,7 +145,7 @@ class GraphMapTool(QgsMapTool, QObject):
 
         # move vertex
         else:
-            # prevent moving vertices if costs are advanced since they can't be adapted yet
+            # prevent moving vertices if advanced costs can't be recalculated
             if self.advancedCosts:
                 iface.messageBar().pushMessage("Error", self.tr("Moving vertices is disabled for advanced costs"),
                                                level=Qgis.Critical)
@@ -62,10 +62,45 @@ class ExtVertexUndoCommand(QUndoCommand):
         self.redoString = self.mOperation + " vertex " + str(self.mVertexID)
         self.setText(self.undoString)
 
+        # costs of the edges of a moved vertex, the new costs are calculated on the first redo
+        self.mOldCosts = {}
+        self.mNewCosts = None
+        if self.mOperation == "Move" and self.mLayer.mGraph.canUpdateEdgeCosts():
+            self.mOldCosts = self.__edgeCosts(self.__movedEdges())
+
     def __del__(self):
         del self.redoString
         del self.undoString
 
+    def __movedEdges(self):
+        vertex = self.mLayer.mGraph.vertex(self.mVertexID)
+        return vertex.incomingEdges() + vertex.outgoingEdges()
+
+    def __edgeCosts(self, edgeIds):
+        graph = self.mLayer.mGraph
+        return {edgeId: [graph.costOfEdge(edgeId, functionIdx)
+                         for functionIdx in range(graph.amountOfEdgeCostFunctions())] for edgeId in edgeIds}
+
+    def __setEdgeCosts(self, costs):
+        for edgeId, edgeCosts in costs.items():
+            for functionIdx, cost in enumerate(edgeCosts):
+                self.mLayer.mGraph.setCostOfEdge(edgeId, functionIdx, cost)
+
+    def _moveVertex(self, point, undo=False):
+        self.mLayer.mGraph.vertex(self.mVertexID).setNewPoint(point)
+
+        # only the edges of the moved vertex get new costs
+        if self.mOldCosts and undo:
+            self.__setEdgeCosts(self.mOldCosts)
+        elif self.mOldCosts and self.mNewCosts is not None:
+            self.__setEdgeCosts(self.mNewCosts)
+        elif self.mOldCosts:
+            self.mLayer.mGraph.updateEdgeCosts(list(self.mOldCosts))
+            self.mNewCosts = self.__edgeCosts(self.mOldCosts)
+
+        iface.messageBar().pushMessage("Success", "Moved vertex " + str(self.mVertexID) + "!", level=Qgis.Success,
+                                       duration=1)
+
     def _addVertex(self, fromWithEdges=False):
         self.mVertexID = self.mLayer.mGraph.addVertex(self.mOldPoint, self.mVertexID)
 
@@ -142,9 +177,7 @@ class ExtVertexUndoCommand(QUndoCommand):
 
         # move vertex again
         else:
-            self.mLayer.mGraph.vertex(self.mVertexIdx).setNewPoint(self.mNewPoint)
-            iface.messageBar().pushMessage("Success", "Moved vertex " + str(self.mVertexID) + "!", level=Qgis.Success,
-                                           duration=1)
+            self._moveVertex(self.mNewPoint)
 
         self.mLayer.triggerRepaint()
         iface.mapCanvas().refresh()
@@ -160,8 +193,7 @@ class ExtVertexUndoCommand(QUndoCommand):
 
         # move vertex back
         else:
-            self.mLayer.mGraph.vertex(self.mVertexIdx).setNewPoint(self.mOldPoint)
-            iface.messageBar().pushMessage("Success", "Moved vertex " + str(self.mVertexID) + "!", level=Qgis.Success)
+            self._moveVertex(self.mOldPoint, True)
 
         self.mLayer.triggerRepaint()
         iface.mapCanvas().refresh()
@@ -247,6 +279,11 @@ class ExtEdgeUndoCommand(QUndoCommand):
             for functionIdx in range(len(self.mOldCosts)):
                 self.mLayer.mGraph.setCostOfEdge(self.mEdgeID, functionIdx, self.mOldCosts[functionIdx])
 
+        elif self.mLayer.mGraph.updateEdgeCosts([self.mEdgeID]):
+            # keep the calculated costs to readd the edge with the same costs
+            for functionIdx in range(self.mLayer.mGraph.amountOfEdgeCostFunctions()):
+                self.mOldCosts.append(self.mLayer.mGraph.costOfEdge(self.mEdgeID, functionIdx))
+
         elif self.mLayer.mGraph.distanceStrategy == "Advanced":
             # on Advanced costs new edges will be initiated with 0 costs on every function index
             amountEdgeCostFunctions = self.mLayer.mGraph.amountOfEdgeCostFunctions()
@@ -0,0 +1,412 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Dennis Benz, Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+import math
+
+from qgis.core import QgsPointXY, QgsWkbTypes, QgsCoordinateTransform, QgsProject, QgsMessageLog, Qgis
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+
+from . import neighborSearch
+from ..lib.kdtree import kdtree
+
+
+class IncrementalGraphUpdater(QObject):
+    """
+    Keeps an ExtGraph in sync with the point or line layer it was created from. The updater listens to the
+    edit signals of the layer and only updates the affected vertices and edges. A kd-tree over the search
+    keys of the vertices is used to find the neighbors of changed points, so geographic points are searched
+    on the unit sphere as in the GraphBuilder, see neighborSearch. For nearest neighbor graphs the vertices
+    which get a changed point as one of their nearest neighbors are reconnected as well, so the edges are
+    the same as the ones of a graph built again from the layer.
+
+    Supported connection types for point layers: Complete, Nearest neighbor, DistanceNN, ClusterComplete,
+    ClusterNN. Other connection types only update the vertices. Line layers are supported for all graphs
+    created from lines.
+
+    Does not support graphs with advanced costs.
+    """
+
+    # emitted after the graph changed
+    graphUpdated = pyqtSignal()
+
+    def __init__(self, graph, layer, parent=None):
+        """
+        Constructor
+
+        :type graph: ExtGraph created from the layer, needs featureToVertexHash or featureToEdgesHash
+        :type layer: QgsVectorLayer the graph was created from
+        :type parent: QObject
+        """
+        super().__init__(parent)
+        self.graph = graph
+        self.layer = layer
+        self.isLineLayer = layer.geometryType() == QgsWkbTypes.LineGeometry
+
+        self.crs = None
+        self.transform = None
+        self.kdTree = None
+        # vertex id -> search key of the vertex
+        self.searchKeys = {}
+        # vertex id -> squared distance of the farthest nearest neighbor of the vertex, see __updateNeighborRadius
+        self.neighborRadii = {}
+        self.__updateIndex()
+
+        # cluster id -> set of vertex ids
+        self.clusters = {}
+        if self.graph.connectionType() in ["ClusterComplete", "ClusterNN"]:
+            for vertexId, vertex in self.graph.vertices().items():
+                self.clusters.setdefault(vertex.clusterID(), set()).add(vertexId)
+
+        self.layer.featureAdded.connect(self.featureAdded)
+        self.layer.featureDeleted.connect(self.featureDeleted)
+        self.layer.geometryChanged.connect(self.geometryChanged)
+        self.layer.committedFeaturesAdded.connect(self.committedFeaturesAdded)
+
+    def disconnectLayer(self):
+        """
+        Stops listening to the edit signals of the layer
+        """
+        self.layer.featureAdded.disconnect(self.featureAdded)
+        self.layer.featureDeleted.disconnect(self.featureDeleted)
+        self.layer.geometryChanged.disconnect(self.geometryChanged)
+        self.layer.committedFeaturesAdded.disconnect(self.committedFeaturesAdded)
+
+    def featureAdded(self, featureId):
+        self.__updateIndex()
+        feature = self.layer.getFeature(featureId)
+        if not feature.hasGeometry():
+            return
+
+        if self.isLineLayer:
+            self.__addLineFeature(feature)
+        else:
+            vertexId = self.__addVertex(self.__transformPoint(feature.geometry().asPoint()))
+            self.graph.featureToVertexHash[featureId] = vertexId
+            self.__connectVertex(vertexId)
+
+        self.graphUpdated.emit()
+
+    def featureDeleted(self, featureId):
+        self.__updateIndex()
+        if self.isLineLayer:
+            self.__deleteLineFeature(featureId)
+        else:
+            vertexId = self.graph.featureToVertexHash.pop(featureId, None)
+            if vertexId is None or vertexId not in self.graph.vertices():
+                return
+            self.__deleteVertex(vertexId)
+
+        self.graphUpdated.emit()
+
+    def geometryChanged(self, featureId, geometry):
+        self.__updateIndex()
+        if self.isLineLayer:
+            self.__deleteLineFeature(featureId)
+            feature = self.layer.getFeature(featureId)
+            feature.setGeometry(geometry)
+            self.__addLineFeature(feature)
+        else:
+            vertexId = self.graph.featureToVertexHash.get(featureId, None)
+            if vertexId is None or vertexId not in self.graph.vertices():
+                return
+            self.__deleteVertex(vertexId)
+            # keep the vertex id of moved points
+            self.__addVertex(self.__transformPoint(geometry.asPoint()), vertexId)
+            self.__connectVertex(vertexId)
+
+        self.graphUpdated.emit()
+
+    def committedFeaturesAdded(self, _layerId, features):
+        """
+        Features added in an edit session get new ids after committing. Replace the temporary
+        ids in the feature mappings by the committed ones.
+        """
+        self.__updateIndex()
+        for feature in features:
+            if not feature.hasGeometry():
+                continue
+
+            if self.isLineLayer:
+                committedPart = feature.geometry().asWkb()
+                for featureId in [featureId for featureId in self.graph.featureToEdgesHash if featureId < 0]:
+                    edgeIds = self.graph.featureToEdgesHash[featureId]
+                    edgeIds = [edgeId for edgeId in edgeIds if edgeId in self.graph.edges()]
+                    if edgeIds and self.graph.edge(edgeIds[0]).feature.geometry().asWkb() == committedPart:
+                        for edgeId in edgeIds:
+                            self.graph.edge(edgeId).feature = feature
+                        self.graph.featureToEdgesHash[feature.id()] = self.graph.featureToEdgesHash.pop(featureId)
+                        break
+            else:
+                point = self.__transformPoint(feature.geometry().asPoint())
+                for featureId in [featureId for featureId in self.graph.featureToVertexHash if featureId < 0]:
+                    vertexId = self.graph.featureToVertexHash[featureId]
+                    if vertexId in self.graph.vertices() and self.graph.vertex(vertexId).point() == point:
+                        self.graph.featureToVertexHash[feature.id()] = self.graph.featureToVertexHash.pop(featureId)
+                        break
+
+    def __updateIndex(self):
+        """
+        Creates the kd-tree over the search keys of all vertices.
+        The kd-tree is recreated if the crs of the graph changed since the last call.
+        """
+        if self.kdTree is not None and self.crs == self.graph.crs:
+            return
+
+        self.crs = self.graph.crs
+        self.transform = None
+        if self.crs and self.crs != self.layer.crs():
+            self.transform = QgsCoordinateTransform(self.layer.crs(), self.crs, QgsProject.instance())
+
+        self.searchKeys = {vertexId: neighborSearch.searchKey(vertex.point(), vertexId, self.crs)
+                           for vertexId, vertex in self.graph.vertices().items()}
+        self.kdTree = kdtree.create(list(self.searchKeys.values()), neighborSearch.dimensions(self.crs))
+
+        self.neighborRadii = {}
+        if self.__isNearestNeighborGraph():
+            for vertexId in self.graph.vertices():
+                self.__updateNeighborRadius(vertexId)
+
+    def __isNearestNeighborGraph(self):
+        return self.graph.connectionType() in ["Nearest neighbor", "ClusterNN"]
+
+    def __searchKey(self, vertexId):
+        return self.searchKeys[vertexId]
+
+    def __removeFromIndex(self, vertexId):
+        self.kdTree = self.kdTree.remove(self.searchKeys.pop(vertexId))
+        if self.kdTree is None:
+            self.kdTree = kdtree.create(dimensions=neighborSearch.dimensions(self.crs))
+        self.neighborRadii.pop(vertexId, None)
+
+    def __transformPoint(self, point):
+        if self.transform is not None:
+            return self.transform.transform(point)
+        return QgsPointXY(point)
+
+    def __addVertex(self, point, vertexId=-1):
+        vertexId = self.graph.addVertex(point, vertexId)
+        self.searchKeys[vertexId] = neighborSearch.searchKey(point, vertexId, self.crs)
+        self.kdTree.add(self.searchKeys[vertexId])
+        return vertexId
+
+    def __deleteVertex(self, vertexId):
+        """
+        Deletes the vertex and reconnects the vertices which lost one of their nearest neighbors.
+        """
+        vertex = self.graph.vertex(vertexId)
+        clusterID = vertex.clusterID() if hasattr(vertex, "mClusterID") else None
+        sourceVertices = [self.graph.edge(edgeId).fromVertex() for edgeId in vertex.incomingEdges()]
+
+        self.graph.deleteVertex(vertexId)
+        self.__removeFromIndex(vertexId)
+        if clusterID in self.clusters:
+            self.clusters[clusterID].discard(vertexId)
+
+        if self.graph.connectionType() in ["Nearest neighbor", "ClusterNN"]:
+            for sourceVertexId in sourceVertices:
+                if sourceVertexId == vertexId or sourceVertexId not in self.graph.vertices():
+                    continue
+                neighbors = self.__nearestNeighbors(sourceVertexId, 1, self.__connectedVertices(sourceVertexId))
+                for neighborId in neighbors:
+                    self.graph.addEdge(sourceVertexId, neighborId)
+                self.__updateNeighborRadius(sourceVertexId)
+
+    def __squaredDistance(self, vertexId1, vertexId2):
+        """
+        Squared distance of the search keys of two vertices, see neighborSearch
+        """
+        key1 = self.__searchKey(vertexId1)
+        key2 = self.__searchKey(vertexId2)
+        return sum([(key1[i] - key2[i]) ** 2 for i in range(len(key1) - 1)])
+
+    def __connectedVertices(self, vertexId):
+        vertex = self.graph.vertex(vertexId)
+        return set([self.graph.edge(edgeId).toVertex() for edgeId in vertex.outgoingEdges()])
+
+    def __neighborVertices(self, vertexId):
+        """
+        Vertices the vertex is connected to as its nearest neighbors. Undirected graphs without double
+        edges only have one edge between two vertices, so the incoming edges are neighbors as well.
+        """
+        neighbors = self.__connectedVertices(vertexId)
+        if self.graph.edgeDirection != "Directed" and not self.graph.nnAllowDoubleEdges:
+            vertex = self.graph.vertex(vertexId)
+            neighbors.update([self.graph.edge(edgeId).fromVertex() for edgeId in vertex.incomingEdges()])
+        return neighbors
+
+    def __updateNeighborRadius(self, vertexId):
+        """
+        Stores the squared distance of the farthest neighbor of the vertex. A vertex with at least
+        numberNeighbours neighbors can only get a new nearest neighbor inside of this radius, a vertex
+        with less neighbors gets the radius inf.
+        """
+        neighbors = self.__neighborVertices(vertexId)
+        if len(neighbors) < self.graph.numberNeighbours:
+            self.neighborRadii[vertexId] = math.inf
+        else:
+            self.neighborRadii[vertexId] = max([self.__squaredDistance(vertexId, neighborId)
+                                                for neighborId in neighbors])
+
+    def __nearestNeighbors(self, vertexId, neighborNumber, excludedVertices=None):
+        """
+        Returns the ids of the nearest vertices. For ClusterNN graphs only vertices in the
+        same cluster are returned.
+        """
+        searchKey = self.__searchKey(vertexId)
+        if excludedVertices is None:
+            excludedVertices = set()
+
+        clusterMembers = None
+        if self.graph.connectionType() == "ClusterNN":
+            clusterMembers = self.clusters.get(self.graph.vertex(vertexId).clusterID(), set())
+
+        # enlarge the search until enough suitable neighbors are found
+        searchNumber = neighborNumber + len(excludedVertices) + 1
+        while True:
+            candidates = [neighborSearch.keyId(node.data)
+                          for node, _ in self.kdTree.search_knn(searchKey, searchNumber)]
+            neighbors = [candidateId for candidateId in candidates
+                         if candidateId != vertexId and candidateId not in excludedVertices and
+                         candidateId in self.graph.vertices() and
+                         (clusterMembers is None or candidateId in clusterMembers)]
+            if len(neighbors) >= neighborNumber or len(candidates) < searchNumber or\
+               searchNumber >= self.graph.vertexCount():
+                return neighbors[:neighborNumber]
+            searchNumber *= 2
+
+    def __connectVertex(self, vertexId):
+        """
+        Adds the edges of a new vertex according to the connection type of the graph
+        """
+        connectionType = self.graph.connectionType()
+        searchKey = self.__searchKey(vertexId)
+
+        if connectionType == "Complete":
+            for otherVertexId in self.graph.vertices():
+                if otherVertexId == vertexId:
+                    continue
+                self.graph.addEdge(otherVertexId, vertexId)
+                if self.graph.edgeDirection == "Directed":
+                    self.graph.addEdge(vertexId, otherVertexId)
+
+        elif connectionType == "Nearest neighbor":
+            for neighborId in self.__nearestNeighbors(vertexId, self.graph.numberNeighbours):
+                self.graph.addEdge(vertexId, neighborId)
+            self.__updateNeighborRadius(vertexId)
+            self.__reconnectReverseNeighbors(vertexId)
+
+        elif connectionType == "DistanceNN":
+            searchRadius = neighborSearch.squaredSearchRadius(self.graph.distance, self.crs)
+            for neighborKey in self.kdTree.search_nn_dist(searchKey, searchRadius):
+                neighborId = neighborSearch.keyId(neighborKey)
+                if neighborId == vertexId or neighborId not in self.graph.vertices():
+                    continue
+                self.graph.addEdge(vertexId, neighborId)
+                if self.graph.nnAllowDoubleEdges:
+                    self.graph.addEdge(neighborId, vertexId)
+
+        elif connectionType in ["ClusterComplete", "ClusterNN"]:
+            # the vertex joins the cluster of its nearest neighbor
+            nearest = [neighborSearch.keyId(node.data) for node, _ in self.kdTree.search_knn(searchKey, 2)]
+            nearest = [neighborId for neighborId in nearest
+                       if neighborId != vertexId and neighborId in self.graph.vertices()]
+            if not nearest:
+                return
+            clusterID = self.graph.vertex(nearest[0]).clusterID()
+            self.graph.vertex(vertexId).setClusterID(clusterID)
+            self.clusters.setdefault(clusterID, set()).add(vertexId)
+
+            if connectionType == "ClusterComplete":
+                for memberId in self.clusters[clusterID]:
+                    if memberId == vertexId:
+                        continue
+                    self.graph.addEdge(memberId, vertexId)
+                    if self.graph.edgeDirection == "Directed":
+                        self.graph.addEdge(vertexId, memberId)
+            else:
+                for neighborId in self.__nearestNeighbors(vertexId, self.graph.numberNeighbours):
+                    self.graph.addEdge(vertexId, neighborId)
+                self.__updateNeighborRadius(vertexId)
+                self.__reconnectReverseNeighbors(vertexId)
+
+        else:
+            QgsMessageLog.logMessage("Connection type {} is not updated incrementally".format(connectionType),
+                                     level=Qgis.Info)
+
+    def __reconnectReverseNeighbors(self, vertexId):
+        """
+        Reconnects the vertices which have the new vertex as one of their nearest neighbors now.
+        Their neighbors which are no longer among their nearest neighbors are replaced by the new vertex.
+        """
+        searchKey = self.__searchKey(vertexId)
+        searchRadius = max(self.neighborRadii.values(), default=0)
+        for candidateKey in self.kdTree.search_nn_dist(searchKey, searchRadius):
+            candidateId = neighborSearch.keyId(candidateKey)
+            if candidateId == vertexId or candidateId not in self.neighborRadii or\
+               self.__squaredDistance(candidateId, vertexId) >= self.neighborRadii[candidateId]:
+                continue
+
+            neighbors = set(self.__nearestNeighbors(candidateId, self.graph.numberNeighbours))
+            if vertexId not in neighbors:
+                continue
+            candidate = self.graph.vertex(candidateId)
+            for edgeId in list(candidate.outgoingEdges()):
+                if self.graph.edge(edgeId).toVertex() not in neighbors:
+                    self.graph.deleteEdge(edgeId)
+            if vertexId not in self.__neighborVertices(candidateId):
+                self.graph.addEdge(candidateId, vertexId)
+            self.__updateNeighborRadius(candidateId)
+
+    def __vertexAt(self, point):
+        """
+        Returns the id of the vertex at exactly this point or creates a new vertex.
+        """
+        for node, _ in self.kdTree.search_knn(neighborSearch.searchKey(point, -1, self.crs), 1):
+            vertexId = neighborSearch.keyId(node.data)
+            if vertexId in self.graph.vertices() and self.graph.vertex(vertexId).point() == point:
+                return vertexId
+        return self.__addVertex(point)
+
+    def __addLineFeature(self, feature):
+        geom = feature.geometry()
+        if QgsWkbTypes.isMultiType(geom.wkbType()):
+            parts = geom.asMultiPolyline()
+        else:
+            parts = [geom.asPolyline()]
+
+        for part in parts:
+            lastVertexID = None
+            for linePoint in part:
+                vertexId = self.__vertexAt(self.__transformPoint(linePoint))
+                if lastVertexID is not None:
+                    self.graph.addEdge(lastVertexID, vertexId, feat=feature)
+                lastVertexID = vertexId
+
+    def __deleteLineFeature(self, featureId):
+        for edgeId in self.graph.featureToEdgesHash.pop(featureId, []):
+            if edgeId not in self.graph.edges():
+                continue
+            edge = self.graph.edge(edgeId)
+            endVertices = [edge.fromVertex(), edge.toVertex()]
+            self.graph.deleteEdge(edgeId)
+
+            # remove vertices which are no longer part of any line
+            for vertexId in endVertices:
+                if vertexId in self.graph.vertices() and self.graph.vertex(vertexId).degree() == 0:
+                    self.graph.deleteVertex(vertexId)
+                    self.__removeFromIndex(vertexId)
@@ -0,0 +1,363 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Dennis Benz, Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+"""
+Helper functions for the kd-tree based neighbor searches of the GraphBuilder and ExtGraph.
+
+Points of a geographic crs are placed on the unit sphere (earth centered, earth fixed coordinates),
+so the euclidean chord distance between two keys is monotonic with their great circle distance.
+Points of a projected crs use their planar coordinates. The id of the vertex is always the last entry
+of a key and is ignored by the kd-tree.
+"""
+
+import math
+
+import numpy as np
+
+from qgis.core import QgsUnitTypes
+
+# mean earth radius in meters
+EARTH_RADIUS = 6371008.8
+
+# bytes for the candidates of the approximate neighbor search of all points searched at once
+NEIGHBOR_MEMORY_BUDGET = 256 * 1024 * 1024
+# bytes per candidate of a point: index, distance, cell lookup and temporary coordinate differences
+CANDIDATE_BYTES = 40
+
+
+def useSphere(crs):
+    """
+    :type crs: QgsCoordinateReferenceSystem
+    :return True if neighbor searches have to be done on the unit sphere
+    """
+    return crs is not None and crs.isValid() and crs.isGeographic()
+
+
+def dimensions(crs):
+    """
+    :type crs: QgsCoordinateReferenceSystem
+    :return number of dimensions of the search keys
+    """
+    return 3 if useSphere(crs) else 2
+
+
+def searchKey(point, vertexId, crs):
+    """
+    Creates the kd-tree key of a point.
+
+    :type point: QgsPointXY
+    :type vertexId: Integer
+    :type crs: QgsCoordinateReferenceSystem of the point
+    :return list [x, y, vertexId] or [X, Y, Z, vertexId] on the unit sphere
+    """
+    if useSphere(crs):
+        lon = math.radians(point.x())
+        lat = math.radians(point.y())
+        cosLat = math.cos(lat)
+        return [cosLat * math.cos(lon), cosLat * math.sin(lon), math.sin(lat), vertexId]
+    return [point.x(), point.y(), vertexId]
+
+
+def keyId(key):
+    """
+    :return vertex id stored in a kd-tree key
+    """
+    return key[-1]
+
+
+def squaredSearchRadius(distance, crs):
+    """
+    Converts a distance into the squared search radius of the kd-tree keys.
+
+    :type distance: (float, QgsUnitTypes::DistanceUnit)
+    :type crs: QgsCoordinateReferenceSystem
+    :return float
+    """
+    value, unit = distance
+    if useSphere(crs):
+        if unit == QgsUnitTypes.DistanceDegrees:
+            angle = math.radians(value)
+        else:
+            angle = value * QgsUnitTypes.fromUnitToUnitFactor(unit, QgsUnitTypes.DistanceMeters) / EARTH_RADIUS
+        # points further away than half of the globe are all inside the search radius
+        angle = min(angle, math.pi)
+        chord = 2 * math.sin(angle / 2)
+        return chord * chord
+
+    planarDistance = value * QgsUnitTypes.fromUnitToUnitFactor(unit, crs.mapUnits())
+    return planarDistance * planarDistance
+
+
+def keyCoordinates(keys):
+    """
+    :type keys: list of kd-tree keys created by searchKey
+    :return numpy array with the coordinates of the keys without ids
+    """
+    return np.array([key[:-1] for key in keys], dtype=np.float64)
+
+
+def approximateNearestNeighbors(coordinates, k, cellRings=1, cellCapacity=2, memoryBudget=NEIGHBOR_MEMORY_BUDGET):
+    """
+    Approximate k nearest neighbor search with grid hashing. The points are hashed into grid cells
+    holding about k points each and the neighbors of a point are only searched in the cells at most
+    cellRings cells away, using at most cellCapacity * k points per cell. Larger values increase
+    the recall and the runtime. The points of overfull cells are searched again with a grid adapted
+    to their density and points without k found neighbors are searched again in coarser grids and
+    then exactly inside of the distance of the neighbors found in the coarse grids.
+
+    :type coordinates: numpy array with one row of coordinates per point
+    :type k: Integer number of neighbors
+    :type cellRings: Integer
+    :type cellCapacity: Integer
+    :type memoryBudget: Integer number of bytes for the candidates of the points searched at once
+    :return numpy array with the indices of the k nearest neighbors (ordered by distance) for every point
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    pointCount = len(coordinates)
+    k = min(k, pointCount - 1)
+    if k < 1:
+        return np.full((pointCount, 0), -1, dtype=np.int64)
+
+    capacity = max(1, cellCapacity) * k
+    neighbors, overfull, cellSize = _gridNearestNeighbors(coordinates, k, cellRings, capacity, memoryBudget)
+
+    # dense regions get their own grid, the subset is smaller in every step
+    overfullPoints = np.nonzero(overfull)[0]
+    if k < len(overfullPoints) < pointCount:
+        refined = approximateNearestNeighbors(coordinates[overfullPoints], k, cellRings, cellCapacity, memoryBudget)
+        refined = np.where(refined >= 0, overfullPoints[np.maximum(refined, 0)], -1)
+        neighbors[overfullPoints] = _mergeNeighbors(coordinates, overfullPoints, neighbors[overfullPoints],
+                                                    refined, k)
+
+    # points in sparse regions may not find k neighbors in the cells around them, only they are searched
+    # again in grids with larger cells until the cells cover all points
+    missingPoints = np.nonzero((neighbors < 0).any(axis=1))[0]
+    if len(missingPoints) == 0:
+        return neighbors
+    searchedPoints = missingPoints
+    extent = (coordinates.max(axis=0) - coordinates.min(axis=0)).max()
+    while len(missingPoints) > 0 and cellSize <= extent:
+        cellSize *= 4
+        coarse, _, _ = _gridNearestNeighbors(coordinates, k, cellRings, capacity, memoryBudget, missingPoints,
+                                             cellSize)
+        neighbors[missingPoints] = _mergeNeighbors(coordinates, missingPoints, neighbors[missingPoints],
+                                                   coarse[missingPoints], k)
+        missingPoints = missingPoints[(neighbors[missingPoints] < 0).any(axis=1)]
+
+    # the cells of the coarse grids only hold some of their points, but the k-th found neighbor bounds
+    # the distance of the k nearest neighbors, which are searched exactly inside of this distance
+    found = neighbors[searchedPoints]
+    radii = np.where((found >= 0).all(axis=1),
+                     ((coordinates[found[:, -1]] - coordinates[searchedPoints]) ** 2).sum(axis=1), np.inf)
+    neighbors[searchedPoints] = exactNearestNeighbors(coordinates, searchedPoints, k, radii)
+    return neighbors
+
+
+def _cellKeys(coordinates, minimum, cellSize, cellRings):
+    """
+    :return (numpy array with the key of the cell of every point, numpy array of the strides of the keys,
+             sorted numpy array of the occupied cell keys, numpy array with the position of the cell of
+             every point in the occupied cell keys)
+    """
+    dims = coordinates.shape[1]
+    cells = np.floor((coordinates - minimum) / cellSize).astype(np.int64) + cellRings
+    cellsPerDim = cells.max(axis=0) + 1 + cellRings
+    strides = np.ones(dims, dtype=np.int64)
+    for dim in range(dims - 2, -1, -1):
+        strides[dim] = strides[dim + 1] * cellsPerDim[dim + 1]
+    keys = cells @ strides
+    uniqueKeys, cellIndex = np.unique(keys, return_inverse=True)
+    return keys, strides, uniqueKeys, cellIndex.reshape(-1)
+
+
+def _gridNearestNeighbors(coordinates, k, cellRings, cellCapacity, memoryBudget, queryPoints=None, cellSize=None):
+    """
+    One pass of the grid hashing of approximateNearestNeighbors.
+
+    :type queryPoints: numpy array with the indices of the points to search the neighbors of, None for all points
+    :type cellSize: float size of the grid cells, None to adapt it to the density of the points
+    :return (numpy array of neighbor indices with -1 for missing neighbors and for points which are not searched,
+             boolean numpy array marking the points of cells with more than cellCapacity points, cell size)
+    """
+    pointCount, dims = coordinates.shape
+    minimum = coordinates.min(axis=0)
+
+    if cellSize is None:
+        # the cell size is chosen for the dimensions the points extend in, the points may also lie on
+        # a curve or surface (e.g. unit sphere), so the size is adapted until an occupied cell contains about k points
+        extent = coordinates.max(axis=0) - minimum
+        spanned = extent > 1e-9 * max(extent.max(), 1e-300)
+        spannedDims = int(np.count_nonzero(spanned))
+        if spannedDims == 0:
+            cellSize = 1.0
+        else:
+            cellSize = (np.prod(extent[spanned]) * k / pointCount) ** (1 / spannedDims)
+        occupiedDims = max(spannedDims, 1)
+        previous = None
+        for _ in range(8):
+            keys, strides, uniqueKeys, cellIndex = _cellKeys(coordinates, minimum, cellSize, cellRings)
+            meanCount = pointCount / len(uniqueKeys)
+            if k / 2 <= meanCount <= 2 * k or spannedDims == 0:
+                break
+            # the number of occupied cells grows with cellSize^-d for points on a d dimensional manifold
+            if previous is not None and previous[1] != len(uniqueKeys):
+                estimate = math.log(len(uniqueKeys) / previous[1]) / math.log(previous[0] / cellSize)
+                occupiedDims = min(max(estimate, 1.0), spannedDims)
+            previous = (cellSize, len(uniqueKeys))
+            cellSize *= (k / meanCount) ** (1 / occupiedDims)
+    else:
+        keys, strides, uniqueKeys, cellIndex = _cellKeys(coordinates, minimum, cellSize, cellRings)
+
+    # work on the points sorted by cell, so points of one cell are close in memory
+    order = np.argsort(cellIndex, kind="stable")
+    sortedCells = cellIndex[order]
+    sortedKeys = keys[order]
+    columns = [np.ascontiguousarray(coordinates[order, dim]) for dim in range(dims)]
+
+    # slots of every cell hold the sorted positions of up to cellCapacity points
+    cellStarts = np.searchsorted(sortedCells, np.arange(len(uniqueKeys)))
+    rank = np.arange(pointCount) - cellStarts[sortedCells]
+    slots = np.full((len(uniqueKeys), cellCapacity), -1, dtype=np.int64)
+    keep = rank < cellCapacity
+    slots[sortedCells[keep], rank[keep]] = np.nonzero(keep)[0]
+    overfull = (np.bincount(cellIndex, minlength=len(uniqueKeys)) > cellCapacity)[cellIndex]
+
+    offsets = np.array(np.meshgrid(*[np.arange(-cellRings, cellRings + 1)] * dims, indexing="ij"))
+    offsetKeys = offsets.reshape(dims, -1).T @ strides
+
+    # sorted positions of the searched points
+    if queryPoints is None:
+        queryPositions = np.arange(pointCount)
+    else:
+        sortedPositions = np.empty(pointCount, dtype=np.int64)
+        sortedPositions[order] = np.arange(pointCount)
+        queryPositions = np.sort(sortedPositions[queryPoints])
+    # the candidate matrices of a chunk have one entry per point, cell and slot
+    chunkSize = max(1, memoryBudget // (len(offsetKeys) * cellCapacity * CANDIDATE_BYTES))
+
+    neighbors = np.full((pointCount, k), -1, dtype=np.int64)
+    for start in range(0, len(queryPositions), chunkSize):
+        positions = queryPositions[start:start + chunkSize]
+        neighborKeys = sortedKeys[positions][:, None] + offsetKeys[None, :]
+        lookup = np.minimum(np.searchsorted(uniqueKeys, neighborKeys), len(uniqueKeys) - 1)
+        lookup[uniqueKeys[lookup] != neighborKeys] = -1
+        candidates = slots[lookup].reshape(len(positions), -1)
+        invalid = (np.repeat(lookup, cellCapacity, axis=1) < 0) | (candidates < 0) |\
+            (candidates == positions[:, None])
+
+        distances = np.zeros(candidates.shape)
+        for column in columns:
+            distances += (column[candidates] - column[positions][:, None]) ** 2
+        distances[invalid] = np.inf
+
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearestDistances = np.take_along_axis(distances, nearest, axis=1)
+        ordering = np.argsort(nearestDistances, axis=1)
+        result = order[np.take_along_axis(candidates, np.take_along_axis(nearest, ordering, axis=1), axis=1)]
+        result[np.take_along_axis(nearestDistances, ordering, axis=1) == np.inf] = -1
+        neighbors[order[positions]] = result
+
+    return neighbors, overfull, cellSize
+
+
+def _mergeNeighbors(coordinates, points, neighbors, otherNeighbors, k):
+    """
+    :type points: numpy array of point indices
+    :type neighbors: numpy array with neighbor indices of the points, -1 for missing neighbors
+    :type otherNeighbors: numpy array with neighbor indices of the points, -1 for missing neighbors
+    :return numpy array with the k nearest of both neighbors (ordered by distance) for every point
+    """
+    candidates = np.sort(np.concatenate([neighbors, otherNeighbors], axis=1), axis=1)
+    invalid = candidates < 0
+    invalid[:, 1:] |= candidates[:, 1:] == candidates[:, :-1]
+    distances = ((coordinates[candidates] - coordinates[points][:, None, :]) ** 2).sum(axis=2)
+    distances[invalid] = np.inf
+
+    ordering = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    result = np.take_along_axis(candidates, ordering, axis=1)
+    result[np.take_along_axis(distances, ordering, axis=1) == np.inf] = -1
+    return result
+
+
+def exactNearestNeighbors(coordinates, points, k, squaredRadii=None):
+    """
+    Exact k nearest neighbor search, which compares every point with the points inside of a box around it.
+    The points are found in the coordinates sorted along the first axis, so the search is only fast for
+    few points or small radii.
+
+    :type coordinates: numpy array with one row of coordinates per point
+    :type points: numpy array with the indices of the points to search the neighbors of
+    :type k: Integer number of neighbors, smaller than the number of coordinates
+    :type squaredRadii: numpy array with an upper bound of the squared distance of the k-th neighbor of
+                        every point or None to compare the points with all coordinates
+    :return numpy array with the indices of the k nearest neighbors (ordered by distance) for the points
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    points = np.asarray(points, dtype=np.int64)
+    if squaredRadii is None:
+        squaredRadii = np.full(len(points), np.inf)
+    radii = np.sqrt(squaredRadii)
+    sortedIndices = np.argsort(coordinates[:, 0], kind="stable")
+    sortedFirst = coordinates[sortedIndices, 0]
+
+    neighbors = np.full((len(points), k), -1, dtype=np.int64)
+    for row, pointIdx in enumerate(points.tolist()):
+        point = coordinates[pointIdx]
+        start = np.searchsorted(sortedFirst, point[0] - radii[row], side="left")
+        end = np.searchsorted(sortedFirst, point[0] + radii[row], side="right")
+        candidates = sortedIndices[start:end]
+        candidates = candidates[(np.abs(coordinates[candidates] - point) <= radii[row]).all(axis=1)]
+
+        distances = ((coordinates[candidates] - point) ** 2).sum(axis=1)
+        # duplicates of a point are neighbors, the point itself is not
+        distances[candidates == pointIdx] = np.inf
+        count = min(k, len(candidates))
+        nearest = np.argpartition(distances, count - 1)[:count] if count > 0 else candidates[:0]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        nearest = nearest[distances[nearest] < np.inf]
+        neighbors[row, :len(nearest)] = candidates[nearest]
+    return neighbors
+
+
+def estimateRecall(coordinates, neighbors, k, sampleSize=100, seed=0):
+    """
+    Estimates the recall of approximate neighbors by comparing a sample of points
+    with an exact brute force search.
+
+    :type coordinates: numpy array with one row of coordinates per point
+    :type neighbors: result of approximateNearestNeighbors
+    :type k: Integer number of neighbors
+    :return float share of the exact neighbors which were found
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    pointCount = len(coordinates)
+    k = min(k, pointCount - 1)
+    if k < 1:
+        return 1.0
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(pointCount, size=min(sampleSize, pointCount), replace=False)
+    found = 0
+    for pointIdx in sample:
+        distances = ((coordinates - coordinates[pointIdx]) ** 2).sum(axis=1)
+        distances[pointIdx] = np.inf
+        exactDistance = np.partition(distances, k - 1)[k - 1]
+        # neighbors with the same distance as the k-th exact neighbor count as correct
+        pointNeighbors = neighbors[pointIdx][neighbors[pointIdx] >= 0]
+        found += min(k, int(np.count_nonzero(distances[pointNeighbors] <= exactDistance)))
+    return found / (len(sample) * k)
@@ -0,0 +1,86 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+import numpy as np
+
+from qgis.core import QgsFeatureRequest, QgsGeometry, QgsPointXY, QgsProject, QgsSpatialIndex
+
+
+class PolygonPredicates:
+    """
+    Answers the insidePolygon and crossesPolygon checks of the cost functions for all edges.
+    The polygons are stored in a spatial index and only the candidates whose bounding box
+    intersects an edge are tested with a prepared geometry engine.
+    """
+
+    def __init__(self, polygonLayer, crs):
+        """
+        Constructor
+
+        :type polygonLayer: QgsVectorLayer
+        :type crs: QgsCoordinateReferenceSystem of the edges
+        """
+        self.index = QgsSpatialIndex()
+        self.geometries = {}
+        self.__engines = {}
+
+        request = QgsFeatureRequest().setNoAttributes()
+        request.setDestinationCrs(crs, QgsProject.instance().transformContext())
+        for feature in polygonLayer.getFeatures(request):
+            if not feature.hasGeometry():
+                continue
+            self.geometries[feature.id()] = feature.geometry()
+            self.index.addFeature(feature)
+
+    def __engine(self, featureId):
+        if featureId not in self.__engines:
+            engine = QgsGeometry.createGeometryEngine(self.geometries[featureId].constGet())
+            engine.prepareGeometry()
+            self.__engines[featureId] = engine
+        return self.__engines[featureId]
+
+    def evaluate(self, fromX, fromY, toX, toY, task=None):
+        """
+        Checks for every edge if it is inside of a polygon and if it crosses a polygon.
+
+        :type fromX: numpy array with the x coordinate of the start of every edge
+        :type fromY: numpy array
+        :type toX: numpy array
+        :type toY: numpy array
+        :type task: QgsTask, checked for cancellation
+        :return dict {"insidePolygon": numpy boolean array, "crossesPolygon": numpy boolean array}
+        """
+        edgeCount = len(fromX)
+        inside = np.zeros(edgeCount, dtype=bool)
+        crosses = np.zeros(edgeCount, dtype=bool)
+
+        for i in range(edgeCount):
+            if task is not None and task.isCanceled():
+                break
+            edgeGeometry = QgsGeometry.fromPolylineXY([QgsPointXY(fromX[i], fromY[i]), QgsPointXY(toX[i], toY[i])])
+            edge = edgeGeometry.constGet()
+            for featureId in self.index.intersects(edgeGeometry.boundingBox()):
+                engine = self.__engine(featureId)
+                if not inside[i] and engine.contains(edge):
+                    inside[i] = True
+                if not crosses[i] and engine.crosses(edge):
+                    crosses[i] = True
+                if inside[i] and crosses[i]:
+                    break
+
+        return {"insidePolygon": inside, "crossesPolygon": crosses}
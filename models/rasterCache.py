@@ -0,0 +1,159 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+
+from .graphBuildCache import fingerprintRasterLayer
+
+
+def rasterCacheKey(rLayer, band, heuristicIndex, crs, memoryBudget=None, corridorMargin=200, searchMode="Heuristic",
+                   landmarkCount=8, hierarchyFactor=0):
+    """
+    Fingerprint of everything a shortest path through the raster depends on besides its endpoints.
+    The search options decide whether the raster is searched exactly, in corridors or on blocks,
+    see createRasterSearch.
+
+    :type rLayer: QgsRasterLayer
+    :type band: Integer [1..numberOfBands]
+    :type heuristicIndex: Integer
+    :type crs: QgsCoordinateReferenceSystem of the edge endpoints
+    :type memoryBudget: Integer number of bytes or None
+    :type corridorMargin: Integer
+    :type searchMode: String one of Heuristic, Bidirectional, Landmarks
+    :type landmarkCount: Integer
+    :type hierarchyFactor: Integer
+    :return String
+    """
+    hashObject = hashlib.sha1()
+    fingerprintRasterLayer(rLayer, hashObject)
+    hashObject.update("band={};heuristic={};".format(band, heuristicIndex).encode())
+    hashObject.update("memoryBudget={};corridorMargin={};searchMode={};landmarkCount={};hierarchyFactor={};".format(
+        memoryBudget, corridorMargin, searchMode, landmarkCount, hierarchyFactor).encode())
+    hashObject.update(crs.toWkt().encode())
+    return hashObject.hexdigest()
+
+
+class RasterCache:
+    """
+    On disk cache of the shortest paths through raster data, shared by all projects. Every path is
+    stored with the pixel values along the path, its number of diagonal steps and the deviation
+    bound of its search (see deviationBound) under the raster key and the endpoints of its edge.
+    The least recently used paths are removed if the stored pixel values exceed maxSize bytes.
+    """
+
+    def __init__(self, path, maxSize=512 * 1024 * 1024):
+        """
+        Constructor
+
+        :type path: String path of the sqlite database, created if it does not exist
+        :type maxSize: Integer maximum number of bytes of the stored pixel values
+        """
+        self.path = path
+        self.maxSize = maxSize
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self.__connect()) as connection, connection:
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(paths)")]
+            if columns and "deviationBound" not in columns:
+                # cache of an older version without the deviation bounds and search options
+                connection.execute("DROP TABLE paths")
+            # deviationBound is NULL for paths without a bound
+            connection.execute("CREATE TABLE IF NOT EXISTS paths (rasterKey TEXT, fromX REAL, fromY REAL, "
+                               "toX REAL, toY REAL, pixelValues BLOB, diagonals INTEGER, deviationBound REAL, "
+                               "size INTEGER, lastUsed REAL, PRIMARY KEY (rasterKey, fromX, fromY, toX, toY))")
+            connection.execute("CREATE INDEX IF NOT EXISTS pathsLastUsed ON paths (lastUsed)")
+
+    def __connect(self):
+        # a new connection for every access, the cache is used by tasks and by the main thread
+        return sqlite3.connect(self.path, timeout=30)
+
+    def getPaths(self, rasterKey, endpoints):
+        """
+        :type rasterKey: String created by rasterCacheKey
+        :type endpoints: List of (fromX, fromY, toX, toY)
+        :return List with (numpy array of pixel values, number of diagonals, deviation bound) or None
+                for every edge
+        """
+        paths = [None] * len(endpoints)
+        hits = []
+        with closing(self.__connect()) as connection, connection:
+            for i, (fromX, fromY, toX, toY) in enumerate(endpoints):
+                row = connection.execute("SELECT rowid, pixelValues, diagonals, deviationBound FROM paths WHERE "
+                                         "rasterKey=? AND fromX=? AND fromY=? AND toX=? AND toY=?",
+                                         (rasterKey, fromX, fromY, toX, toY)).fetchone()
+                if row is not None:
+                    paths[i] = (np.frombuffer(row[1], dtype=np.float64), row[2], row[3])
+                    hits.append(row[0])
+
+            # remember the usage for the eviction of the least recently used paths
+            now = time.time()
+            connection.executemany("UPDATE paths SET lastUsed=? WHERE rowid=?", [(now, rowId) for rowId in hits])
+        return paths
+
+    def putPaths(self, rasterKey, endpoints, paths, deviationBound=0):
+        """
+        :type rasterKey: String created by rasterCacheKey
+        :type endpoints: List of (fromX, fromY, toX, toY)
+        :type paths: List of (pixel values, number of diagonals), one for every edge
+        :type deviationBound: upper bound of the deviation of all paths from the shortest paths, None if
+                              there is no bound, see deviationBound
+        """
+        now = time.time()
+        rows = []
+        for (fromX, fromY, toX, toY), (pixelValues, diagonals) in zip(endpoints, paths):
+            blob = np.asarray(pixelValues, dtype=np.float64).tobytes()
+            rows.append((rasterKey, fromX, fromY, toX, toY, blob, int(diagonals), deviationBound, len(blob), now))
+
+        with closing(self.__connect()) as connection, connection:
+            connection.executemany("INSERT OR REPLACE INTO paths VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.__evict(connection)
+
+    def __evict(self, connection):
+        size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM paths").fetchone()[0]
+        if size <= self.maxSize:
+            return
+
+        # remove paths until the cache is filled to 90% to not evict on every put
+        toRemove = size - int(self.maxSize * 0.9)
+        removedIds = []
+        for rowId, pathSize in connection.execute("SELECT rowid, size FROM paths ORDER BY lastUsed, rowid"):
+            if toRemove <= 0:
+                break
+            removedIds.append((rowId,))
+            toRemove -= pathSize
+        connection.executemany("DELETE FROM paths WHERE rowid=?", removedIds)
+
+    def size(self):
+        """
+        :return Integer number of bytes of the stored pixel values
+        """
+        with closing(self.__connect()) as connection:
+            return connection.execute("SELECT COALESCE(SUM(size), 0) FROM paths").fetchone()[0]
+
+    def clear(self):
+        with closing(self.__connect()) as connection, connection:
+            connection.execute("DELETE FROM paths")
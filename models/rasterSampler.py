@@ -0,0 +1,133 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+import numpy as np
+
+from qgis.core import QgsCoordinateTransform, QgsProject, QgsPointXY
+from osgeo import gdal
+
+
+def pixelsAlongSegments(fromCols, fromRows, toCols, toRows):
+    """
+    Rasterizes line segments between pixels, every segment gets the pixels of a line
+    from its start pixel to its end pixel with one pixel per step along the major axis.
+
+    :type fromCols: numpy integer array with the column of the start pixel of every segment
+    :type fromRows: numpy integer array
+    :type toCols: numpy integer array
+    :type toRows: numpy integer array
+    :return (numpy array of columns, numpy array of rows, numpy array of offsets of the segments)
+    """
+    deltaCols = toCols - fromCols
+    deltaRows = toRows - fromRows
+    steps = np.maximum(np.abs(deltaCols), np.abs(deltaRows))
+    counts = steps + 1
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+
+    # position of every pixel on its segment between 0 and 1
+    stepIndex = np.arange(offsets[-1]) - np.repeat(offsets[:-1], counts)
+    fraction = stepIndex / np.repeat(np.maximum(steps, 1), counts)
+
+    cols = np.repeat(fromCols, counts) + np.floor(fraction * np.repeat(deltaCols, counts) + 0.5).astype(np.int64)
+    rows = np.repeat(fromRows, counts) + np.floor(fraction * np.repeat(deltaRows, counts) + 0.5).astype(np.int64)
+    return cols, rows, offsets
+
+
+def transformCoordinates(sourceCrs, destCrs, xs, ys):
+    """
+    :type sourceCrs: QgsCoordinateReferenceSystem
+    :type destCrs: QgsCoordinateReferenceSystem
+    :type xs: numpy array of x coordinates
+    :type ys: numpy array of y coordinates
+    :return (numpy array, numpy array) of the transformed coordinates
+    """
+    xs, ys = np.array(xs, dtype=float), np.array(ys, dtype=float)
+    if sourceCrs == destCrs:
+        return xs, ys
+
+    tr = QgsCoordinateTransform(sourceCrs, destCrs, QgsProject.instance())
+    for i in range(len(xs)):
+        point = tr.transform(QgsPointXY(xs[i], ys[i]))
+        xs[i], ys[i] = point.x(), point.y()
+    return xs, ys
+
+
+def pixelPositions(geoTransform, xs, ys):
+    """
+    :type geoTransform: GDAL geo transform of a north up raster
+    :type xs: numpy array of x coordinates in the crs of the raster
+    :type ys: numpy array of y coordinates in the crs of the raster
+    :return (numpy array of columns, numpy array of rows) of the pixels containing the coordinates
+    """
+    xOrigin = geoTransform[0]
+    yOrigin = geoTransform[3]
+    pixelWidth = geoTransform[1]
+    pixelHeight = -geoTransform[5]
+    return (np.floor((np.asarray(xs) - xOrigin) / pixelWidth).astype(np.int64),
+            np.floor((yOrigin - np.asarray(ys)) / pixelHeight).astype(np.int64))
+
+
+def sampleAlongEdges(rLayer, band, sourceCrs, fromX, fromY, toX, toY):
+    """
+    Reads the values of the pixels along the edges directly from the raster band.
+    Pixels outside of the raster and nodata pixels have the value 0.
+
+    :type rLayer: QgsRasterLayer
+    :type band: Integer [1..numberOfBands]
+    :type sourceCrs: QgsCoordinateReferenceSystem of the edge coordinates
+    :type fromX: numpy array with the x coordinate of the start of every edge
+    :type fromY: numpy array
+    :type toX: numpy array
+    :type toY: numpy array
+    :return (numpy array of pixel values, numpy array of offsets of the edges)
+    """
+    edgeCount = len(fromX)
+    if edgeCount == 0:
+        return np.zeros(0), np.zeros(1, dtype=np.int64)
+
+    # transform the edges into the crs of the raster
+    fromX, fromY = transformCoordinates(sourceCrs, rLayer.crs(), fromX, fromY)
+    toX, toY = transformCoordinates(sourceCrs, rLayer.crs(), toX, toY)
+
+    ds = gdal.Open(rLayer.source())
+    fromCols, fromRows = pixelPositions(ds.GetGeoTransform(), fromX, fromY)
+    toCols, toRows = pixelPositions(ds.GetGeoTransform(), toX, toY)
+    cols, rows, offsets = pixelsAlongSegments(fromCols, fromRows, toCols, toRows)
+
+    values = np.zeros(len(cols))
+    inside = (cols >= 0) & (cols < ds.RasterXSize) & (rows >= 0) & (rows < ds.RasterYSize)
+    if not inside.any():
+        return values, offsets
+
+    # only read the window of the raster which is covered by the edges
+    colOffset, rowOffset = int(cols[inside].min()), int(rows[inside].min())
+    colSize = int(cols[inside].max()) - colOffset + 1
+    rowSize = int(rows[inside].max()) - rowOffset + 1
+    rasterBand = ds.GetRasterBand(band)
+    window = rasterBand.ReadAsArray(colOffset, rowOffset, colSize, rowSize).astype(float)
+
+    noDataValue = rasterBand.GetNoDataValue()
+    noData = np.isnan(window)
+    if noDataValue is not None:
+        noData |= window == noDataValue
+    window[noData] = 0
+
+    values[inside] = window[rows[inside] - rowOffset, cols[inside] - colOffset]
+    return values, offsets
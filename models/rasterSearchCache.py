@@ -0,0 +1,192 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from osgeo import gdal
+
+from .graphBuildCache import fingerprintRasterLayer
+from .rasterTiles import createRasterSearch
+
+# largest number of rows and columns read to approximate the mean of a band
+MEAN_SAMPLE_SIZE = 1024
+
+
+def bandMinimum(rasterPath, band):
+    """
+    Exact minimum of the band without nodata pixels. The heuristics use it as a lower bound of the
+    pixel values, so stored statistics are not used, they may come from overviews or a sample of the
+    pixels without being marked as approximate. The minimum is cached by the RasterSearchCache.
+
+    :type rasterPath: String
+    :type band: Integer [1..numberOfBands]
+    :return float
+    """
+    readBand = gdal.Open(rasterPath).GetRasterBand(band)
+    return readBand.ComputeRasterMinMax(False)[0]
+
+
+def bandMean(rasterPath, band):
+    """
+    Mean of the band without nodata pixels, taken from the stored statistics or approximated from
+    at most MEAN_SAMPLE_SIZE x MEAN_SAMPLE_SIZE pixels, which GDAL reads from an overview if there is one.
+
+    :type rasterPath: String
+    :type band: Integer [1..numberOfBands]
+    :return float
+    """
+    ds = gdal.Open(rasterPath)
+    readBand = ds.GetRasterBand(band)
+    if readBand.GetMetadataItem("STATISTICS_MEAN") is not None:
+        return float(readBand.GetMetadataItem("STATISTICS_MEAN"))
+
+    sample = readBand.ReadAsArray(buf_xsize=min(ds.RasterXSize, MEAN_SAMPLE_SIZE),
+                                  buf_ysize=min(ds.RasterYSize, MEAN_SAMPLE_SIZE)).astype(np.float64)
+    noDataValue = readBand.GetNoDataValue()
+    if noDataValue is not None:
+        sample = sample[sample != noDataValue]
+    return float(sample.mean()) if sample.size > 0 else 0.0
+
+
+def rasterFingerprint(rLayer):
+    """
+    :type rLayer: QgsRasterLayer
+    :return String fingerprint of the source and file state of the layer, see fingerprintRasterLayer
+    """
+    hashObject = hashlib.sha1()
+    fingerprintRasterLayer(rLayer, hashObject)
+    return hashObject.hexdigest()
+
+
+class RasterSearchCache:
+    """
+    In memory cache of the searches through raster bands for the session, so repeated cost
+    calculations on the same raster do not read the band and compute its statistics again.
+    The key is a fingerprint of the raster layer with the band, the heuristic and the search
+    options. A search is only used by one thread at a time, see RasterSearch.lock. The least
+    recently used search is dropped if more than maxEntries searches are cached.
+    """
+
+    maxEntries = 4
+
+    # key -> RasterSearch
+    __entries = OrderedDict()
+    # (fingerprint, band, minimum or mean) -> value, see bandMinimum and bandMean
+    __statistics = {}
+    __lock = threading.Lock()
+
+    @classmethod
+    def search(cls, rLayer, band, heuristicIndex, createShortestPathMatrix=False, memoryBudget=None,
+               corridorMargin=200, searchMode="Heuristic", landmarkCount=8, hierarchyFactor=0):
+        """
+        Returns the cached search through the band or creates it, see createRasterSearch for the arguments.
+        Searches with a shortest path view are not cached, every calculation gets a new view.
+
+        :type rLayer: QgsRasterLayer
+        :return RasterSearch
+        """
+        fingerprint = rasterFingerprint(rLayer)
+        key = (fingerprint, band, heuristicIndex, memoryBudget, corridorMargin, searchMode, landmarkCount,
+               hierarchyFactor)
+        with cls.__lock:
+            if not createShortestPathMatrix and key in cls.__entries:
+                cls.__entries.move_to_end(key)
+                return cls.__entries[key]
+
+            minValue, meanValue = cls.__searchStatistics(fingerprint, rLayer.source(), band, heuristicIndex, searchMode,
+                                                         hierarchyFactor)
+            search, matrix = createRasterSearch(rLayer.source(), band, heuristicIndex, minValue, meanValue,
+                                                createShortestPathMatrix, memoryBudget, corridorMargin, searchMode,
+                                                landmarkCount, hierarchyFactor)
+            rasterSearch = RasterSearch(search, matrix, minValue, meanValue)
+            if createShortestPathMatrix:
+                return rasterSearch
+
+            cls.__entries[key] = rasterSearch
+            while len(cls.__entries) > cls.maxEntries:
+                cls.__entries.popitem(last=False)
+            return rasterSearch
+
+    @classmethod
+    def searchStatistics(cls, rLayer, band, heuristicIndex, searchMode="Heuristic", hierarchyFactor=0):
+        """
+        Statistics of the band for a search with the arguments of createRasterSearch, only the statistics
+        the search uses are calculated, the others are 0.
+
+        :type rLayer: QgsRasterLayer
+        :type band: Integer [1..numberOfBands]
+        :return (Integer minimum, Integer mean)
+        """
+        with cls.__lock:
+            return cls.__searchStatistics(rasterFingerprint(rLayer), rLayer.source(), band, heuristicIndex,
+                                          searchMode, hierarchyFactor)
+
+    @classmethod
+    def __searchStatistics(cls, fingerprint, rasterPath, band, heuristicIndex, searchMode, hierarchyFactor):
+        minValue = 0
+        meanValue = 0
+        if heuristicIndex == 0 or searchMode == "Landmarks" or hierarchyFactor > 1:
+            minValue = int(cls.__statistic(fingerprint, rasterPath, band, "minimum"))
+        if heuristicIndex != 0:
+            meanValue = int(cls.__statistic(fingerprint, rasterPath, band, "mean"))
+        return minValue, meanValue
+
+    @classmethod
+    def __statistic(cls, fingerprint, rasterPath, band, statistic):
+        key = (fingerprint, band, statistic)
+        if key not in cls.__statistics:
+            cls.__statistics[key] = bandMinimum(rasterPath, band) if statistic == "minimum" else\
+                bandMean(rasterPath, band)
+        return cls.__statistics[key]
+
+    @classmethod
+    def clear(cls):
+        with cls.__lock:
+            cls.__entries.clear()
+            cls.__statistics.clear()
+
+    @classmethod
+    def size(cls):
+        return len(cls.__entries)
+
+
+class RasterSearch:
+    """
+    Search through a raster band with the statistics it was created with. The lock has to be held
+    while searching and reading the results of the search.
+    """
+
+    def __init__(self, search, matrix, minValue, meanValue):
+        """
+        Constructor
+
+        :type search: AStar, CorridorSearch or HierarchicalSearch
+        :type matrix: numpy array of the band or None if it is tiled
+        :type minValue: Integer
+        :type meanValue: Integer
+        """
+        self.search = search
+        self.matrix = matrix
+        self.minValue = minValue
+        self.meanValue = meanValue
+        self.lock = threading.Lock()
+
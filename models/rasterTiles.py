@@ -0,0 +1,506 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+"""
+Access to raster bands which are too large to be searched as a whole. The band is read in
+tiles, and every shortest path is searched in a corridor around its endpoints or refined from
+a path on a coarse version of the raster.
+Also configures the search of AStar objects, which is shared by all users of AStar.
+"""
+
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+from osgeo import gdal
+
+try:
+    from ..lib.AStarC import AStar
+    # AStarC searches without the GIL, so several threads can search at once
+    NATIVE_SEARCH = True
+except ImportError:
+    # use non-performant pure Python implementation
+    from .aStarPython import AStar
+    NATIVE_SEARCH = False
+
+# bytes per pixel of a search besides the pixel value: distance, predecessor and stamp
+SEARCH_BYTES_PER_PIXEL = 16
+
+
+def configureSearch(aStar, searchMode, landmarkCount):
+    """
+    :type aStar: AStar
+    :type searchMode: String one of Heuristic, Bidirectional, Landmarks
+    :type landmarkCount: Integer number of landmarks of the Landmarks search
+    """
+    if searchMode == "Bidirectional":
+        aStar.setBidirectional(True)
+    elif searchMode == "Landmarks":
+        aStar.setLandmarks(landmarkCount)
+
+
+def createRasterSearch(rasterPath, band, heuristicIndex, minValue, meanValue, createShortestPathMatrix=False,
+                       memoryBudget=None, corridorMargin=200, searchMode="Heuristic", landmarkCount=8,
+                       hierarchyFactor=0, sharedBandPath=None):
+    """
+    Creates the search for the shortest paths through a raster band. The whole band is read if a
+    search of the full raster fits into memoryBudget, larger bands are read in tiles. With a
+    hierarchyFactor the paths are refined from paths on blocks of pixels, otherwise a tiled band
+    is searched in corridors. The shortest path view needs an AStar on the whole band.
+
+    :type rasterPath: String
+    :type band: Integer [1..numberOfBands]
+    :type heuristicIndex: Integer
+    :type minValue: Integer
+    :type meanValue: Integer
+    :type createShortestPathMatrix: Boolean
+    :type memoryBudget: Integer number of bytes or None to always read the whole band
+    :type corridorMargin: Integer minimum number of pixels around the endpoints in a corridor search
+    :type searchMode: String one of Heuristic, Bidirectional, Landmarks
+    :type landmarkCount: Integer number of landmarks of the Landmarks search
+    :type hierarchyFactor: Integer number of rows and columns of a block, 0 or 1 to search at full resolution
+    :type sharedBandPath: String path of the band written by shareBand, which is mapped into memory instead
+                          of reading the band, or None
+    :return (search, matrix) with the AStar, CorridorSearch or HierarchicalSearch object as search and the
+            numpy array of the band as matrix, None if the band is tiled
+    """
+    ds = gdal.Open(rasterPath)
+    matrix = None
+    tileCache = None
+    if memoryBudget is not None and not createShortestPathMatrix and fullSearchBytes(rasterPath, band) > memoryBudget:
+        # half of the budget for the tiles, the rest for the window of the current search
+        tileCache = RasterTileCache(rasterPath, band, memoryBudget // 2)
+        readWindow = tileCache.readWindow
+    elif sharedBandPath is not None:
+        matrix = np.load(sharedBandPath, mmap_mode="r")
+        readWindow = arrayWindowReader(matrix)
+    else:
+        matrix = np.array(ds.GetRasterBand(band).ReadAsArray())
+        readWindow = arrayWindowReader(matrix)
+
+    if hierarchyFactor > 1 and not createShortestPathMatrix:
+        return HierarchicalSearch(readWindow, ds.RasterYSize, ds.RasterXSize, hierarchyFactor, heuristicIndex,
+                                  minValue, meanValue, searchMode), matrix
+    if tileCache is not None:
+        return CorridorSearch(tileCache, heuristicIndex, minValue, meanValue, corridorMargin, searchMode), matrix
+
+    # the AStar object keeps its search buffers for all paths through this raster
+    aStar = AStar(matrix, heuristicIndex, minValue, meanValue, createShortestPathMatrix)
+    configureSearch(aStar, searchMode, landmarkCount)
+    return aStar, matrix
+
+
+def shareBand(rasterPath, band, path, stripRows=512):
+    """
+    Writes the band as a numpy file, which several processes can map into memory instead of every
+    process reading the band on its own. The values are stored as int64 or float64, so the pure
+    Python AStar uses the mapped values without a copy. The band is copied in strips of stripRows rows.
+
+    :type rasterPath: String
+    :type band: Integer [1..numberOfBands]
+    :type path: String path of the .npy file
+    :type stripRows: Integer
+    :return String path
+    """
+    ds = gdal.Open(rasterPath)
+    readBand = ds.GetRasterBand(band)
+    strip = readBand.ReadAsArray(0, 0, ds.RasterXSize, min(stripRows, ds.RasterYSize))
+    dtype = np.int64 if np.issubdtype(strip.dtype, np.integer) else np.float64
+    mapped = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(ds.RasterYSize, ds.RasterXSize))
+    for rowStart in range(0, ds.RasterYSize, stripRows):
+        if rowStart > 0:
+            strip = readBand.ReadAsArray(0, rowStart, ds.RasterXSize, min(stripRows, ds.RasterYSize - rowStart))
+        mapped[rowStart:rowStart + len(strip)] = strip
+    mapped.flush()
+    del mapped
+    return path
+
+
+def searchesWholeBand(rasterPath, band, memoryBudget=None, hierarchyFactor=0):
+    """
+    :type rasterPath: String
+    :type band: Integer [1..numberOfBands]
+    :type memoryBudget: Integer number of bytes or None, see createRasterSearch
+    :type hierarchyFactor: Integer, see createRasterSearch
+    :return Boolean whether createRasterSearch searches with an AStar object on the whole band
+    """
+    return hierarchyFactor <= 1 and (memoryBudget is None or fullSearchBytes(rasterPath, band) <= memoryBudget)
+
+
+def searchThreadCount(rasterPath, band, threadCount, memoryBudget=None, hierarchyFactor=0):
+    """
+    Number of threads which can search the whole band at once. The threads share the pixel values
+    of the band, but every thread has its own search buffers besides the ones of the search they
+    are copied from, see createSearchThreadPool.
+
+    :type rasterPath: String
+    :type band: Integer [1..numberOfBands]
+    :type threadCount: Integer largest number of threads
+    :type memoryBudget: Integer number of bytes or None, see createRasterSearch
+    :type hierarchyFactor: Integer, see createRasterSearch
+    :return Integer [0..threadCount], 0 if the searches do not fit into memoryBudget
+    """
+    if not searchesWholeBand(rasterPath, band, memoryBudget, hierarchyFactor):
+        return 0
+    if memoryBudget is None:
+        return threadCount
+    ds = gdal.Open(rasterPath)
+    bufferBytes = max(1, ds.RasterXSize * ds.RasterYSize * SEARCH_BYTES_PER_PIXEL)
+    return min(threadCount, (memoryBudget - fullSearchBytes(rasterPath, band)) // bufferBytes)
+
+
+def deviationBound(aStar):
+    """
+    :type aStar: AStar, CorridorSearch or HierarchicalSearch
+    :return upper bound of the difference between the cost of the last path found by aStar and the
+            cost of the shortest path, None if there is no bound
+    """
+    if isinstance(aStar, HierarchicalSearch):
+        return aStar.deviationBound
+    return 0 if aStar.isExact() else None
+
+
+def maxDeviationBound(bounds):
+    """
+    :type bounds: List of deviation bounds, see deviationBound
+    :return largest bound, None if one of the bounds is None
+    """
+    return None if None in bounds else max(bounds, default=0)
+
+
+def arrayWindowReader(matrix):
+    """
+    :type matrix: numpy array of a raster band in memory
+    :return function with the interface of RasterTileCache.readWindow
+    """
+    def readWindow(rowStart, colStart, rows, cols):
+        return matrix[rowStart:rowStart + rows, colStart:colStart + cols]
+    return readWindow
+
+
+def blockAggregates(readWindow, rowCount, colCount, factor):
+    """
+    Aggregates the pixels in blocks of factor x factor pixels, the band is read in strips of
+    factor rows. Both arrays have an additional first row and column, which the searches do not
+    enter, so the first blocks can be entered like every other block.
+
+    :type readWindow: function with the interface of RasterTileCache.readWindow
+    :type rowCount: Integer number of rows of the raster
+    :type colCount: Integer number of columns of the raster
+    :type factor: Integer
+    :return (numpy integer array of the rounded block means, numpy integer array of the block minimums)
+    """
+    blockRows = -(-rowCount // factor)
+    blockCols = -(-colCount // factor)
+    means = np.zeros((blockRows + 1, blockCols + 1), dtype=np.int64)
+    minimums = np.zeros((blockRows + 1, blockCols + 1), dtype=np.int64)
+    for blockRow in range(blockRows):
+        rowStart = blockRow * factor
+        strip = np.full((factor, blockCols * factor), np.nan)
+        strip[:min(factor, rowCount - rowStart), :colCount] =\
+            readWindow(rowStart, 0, min(factor, rowCount - rowStart), colCount)
+        blocks = strip.reshape(factor, blockCols, factor)
+        means[blockRow + 1, 1:] = np.rint(np.nanmean(blocks, axis=(0, 2)))
+        minimums[blockRow + 1, 1:] = np.floor(np.nanmin(blocks, axis=(0, 2)))
+    return means, minimums
+
+
+def fullSearchBytes(rasterPath, band):
+    """
+    :type rasterPath: String
+    :type band: Integer [1..numberOfBands]
+    :return Integer estimated number of bytes to search the whole band at once
+    """
+    ds = gdal.Open(rasterPath)
+    readBand = ds.GetRasterBand(band)
+    pixelBytes = gdal.GetDataTypeSize(readBand.DataType) // 8
+    return ds.RasterXSize * ds.RasterYSize * (pixelBytes + SEARCH_BYTES_PER_PIXEL)
+
+
+def corridorWindow(startPixel, endPixels, margin, rowCount, colCount):
+    """
+    Window around the bounding box of the pixels, enlarged by margin pixels and by half of the
+    extent of the bounding box, so long paths have room for detours.
+
+    :type startPixel: (row, col)
+    :type endPixels: List of (row, col)
+    :type margin: Integer
+    :type rowCount: Integer number of rows of the raster
+    :type colCount: Integer number of columns of the raster
+    :return (rowStart, colStart, rows, cols) of the window clipped to the raster
+    """
+    rows = [startPixel[0]] + [pixel[0] for pixel in endPixels]
+    cols = [startPixel[1]] + [pixel[1] for pixel in endPixels]
+    padding = margin + max(max(rows) - min(rows), max(cols) - min(cols)) // 2
+    rowStart = max(0, min(rows) - padding)
+    colStart = max(0, min(cols) - padding)
+    rowEnd = min(rowCount, max(rows) + padding + 1)
+    colEnd = min(colCount, max(cols) + padding + 1)
+    return rowStart, colStart, rowEnd - rowStart, colEnd - colStart
+
+
+class RasterTileCache:
+    """
+    Reads a raster band in square tiles with windowed GDAL reads. The least recently used tiles
+    are dropped if the tiles exceed maxBytes.
+    """
+
+    def __init__(self, rasterPath, band, maxBytes, tileSize=512):
+        """
+        Constructor
+
+        :type rasterPath: String
+        :type band: Integer [1..numberOfBands]
+        :type maxBytes: Integer maximum number of bytes of the kept tiles
+        :type tileSize: Integer number of rows and columns of a tile
+        """
+        self.ds = gdal.Open(rasterPath)
+        self.band = self.ds.GetRasterBand(band)
+        self.rows = self.ds.RasterYSize
+        self.cols = self.ds.RasterXSize
+        self.maxBytes = maxBytes
+        self.tileSize = tileSize
+        self.usedBytes = 0
+        # (tileRow, tileCol) -> numpy array, in order of their last use
+        self.__tiles = OrderedDict()
+
+    def __tile(self, tileRow, tileCol):
+        key = (tileRow, tileCol)
+        if key in self.__tiles:
+            self.__tiles.move_to_end(key)
+            return self.__tiles[key]
+
+        rowStart, colStart = tileRow * self.tileSize, tileCol * self.tileSize
+        tile = self.band.ReadAsArray(colStart, rowStart, min(self.tileSize, self.cols - colStart),
+                                     min(self.tileSize, self.rows - rowStart))
+        self.__tiles[key] = tile
+        self.usedBytes += tile.nbytes
+
+        # the tile just read is kept even if it exceeds maxBytes on its own
+        while self.usedBytes > self.maxBytes and len(self.__tiles) > 1:
+            _, removedTile = self.__tiles.popitem(last=False)
+            self.usedBytes -= removedTile.nbytes
+        return tile
+
+    def readWindow(self, rowStart, colStart, rows, cols):
+        """
+        :type rowStart: Integer
+        :type colStart: Integer
+        :type rows: Integer
+        :type cols: Integer
+        :return numpy array with the pixel values of the window
+        """
+        window = None
+        for tileRow in range(rowStart // self.tileSize, (rowStart + rows - 1) // self.tileSize + 1):
+            for tileCol in range(colStart // self.tileSize, (colStart + cols - 1) // self.tileSize + 1):
+                tile = self.__tile(tileRow, tileCol)
+                if window is None:
+                    window = np.empty((rows, cols), dtype=tile.dtype)
+
+                # overlap of the tile and the window in raster coordinates
+                top = max(rowStart, tileRow * self.tileSize)
+                left = max(colStart, tileCol * self.tileSize)
+                bottom = min(rowStart + rows, tileRow * self.tileSize + tile.shape[0])
+                right = min(colStart + cols, tileCol * self.tileSize + tile.shape[1])
+                window[top - rowStart:bottom - rowStart, left - colStart:right - colStart] =\
+                    tile[top - tileRow * self.tileSize:bottom - tileRow * self.tileSize,
+                         left - tileCol * self.tileSize:right - tileCol * self.tileSize]
+        return window
+
+
+class CorridorSearch:
+    """
+    Shortest paths through a raster read by a RasterTileCache. Every search only reads and
+    searches the corridor window around its endpoints, so a path leaving the corridor is not
+    found and the result can be worse than the shortest path through the whole raster.
+    Has the interface of AStar without the shortest path view. The Landmarks search is not
+    available, its landmarks would have to be computed for every corridor.
+    """
+
+    def __init__(self, tileCache, heuristicIndex, minValue, meanValue, corridorMargin, searchMode="Heuristic"):
+        """
+        Constructor
+
+        :type tileCache: RasterTileCache
+        :type heuristicIndex: Integer
+        :type minValue: Integer
+        :type meanValue: Integer
+        :type corridorMargin: Integer minimum number of pixels around the endpoints
+        :type searchMode: String one of Heuristic, Bidirectional, Landmarks
+        """
+        self.tileCache = tileCache
+        self.heuristicIndex = heuristicIndex
+        self.minValue = minValue
+        self.meanValue = meanValue
+        self.corridorMargin = corridorMargin
+        self.searchMode = searchMode
+        self.diagonals = 0
+        # AStar object of the last window, reused while the searches stay in the same window
+        self.__window = None
+        self.__aStar = None
+
+    def __aStarForWindow(self, window):
+        if window != self.__window:
+            self.__aStar = AStar(self.tileCache.readWindow(*window), self.heuristicIndex, self.minValue,
+                                 self.meanValue, False)
+            if self.searchMode == "Bidirectional":
+                self.__aStar.setBidirectional(True)
+            self.__window = window
+        return self.__aStar
+
+    def shortestPath(self, x1, y1, x2, y2):
+        window = corridorWindow((x1, y1), [(x2, y2)], self.corridorMargin, self.tileCache.rows,
+                                self.tileCache.cols)
+        aStar = self.__aStarForWindow(window)
+        pixelValues = aStar.shortestPath(x1 - window[0], y1 - window[1], x2 - window[0], y2 - window[1])
+        self.diagonals = aStar.getNumberOfDiagonals()
+        return pixelValues
+
+    def shortestPathsFromSource(self, x1, y1, targets):
+        window = corridorWindow((x1, y1), targets, self.corridorMargin, self.tileCache.rows, self.tileCache.cols)
+        return self.__aStarForWindow(window).shortestPathsFromSource(
+            x1 - window[0], y1 - window[1], [(x - window[0], y - window[1]) for x, y in targets])
+
+    def getNumberOfDiagonals(self):
+        return self.diagonals
+
+    def isExact(self):
+        # the shortest path can leave the corridor
+        return False
+
+
+class HierarchicalSearch:
+    """
+    Coarse to fine shortest paths. The path is planned on the block means of the raster, then the
+    path is refined at full resolution by searches between waypoints in the coarse path, every
+    search is limited to a window around its two waypoints. Has the interface of AStar without the
+    shortest path view.
+
+    The cost of a path through the block minimums is a lower bound of the shortest path, every
+    step from a block into another block leaves a pixel of at least the block minimum. The
+    difference to this bound, which is at least the deviation from the shortest path, is kept in
+    deviationBound. The bound assumes non negative pixel values.
+    """
+
+    # coarse steps between two waypoints
+    SEGMENT_BLOCKS = 4
+
+    def __init__(self, readWindow, rowCount, colCount, factor, heuristicIndex, minValue, meanValue,
+                 searchMode="Heuristic"):
+        """
+        Constructor
+
+        :type readWindow: function with the interface of RasterTileCache.readWindow
+        :type rowCount: Integer number of rows of the raster
+        :type colCount: Integer number of columns of the raster
+        :type factor: Integer number of rows and columns of the pixels of a block
+        :type heuristicIndex: Integer heuristic of the full resolution searches
+        :type minValue: Integer
+        :type meanValue: Integer
+        :type searchMode: String one of Heuristic, Bidirectional, Landmarks, landmarks are not used
+        """
+        self.readWindow = readWindow
+        self.rowCount = rowCount
+        self.colCount = colCount
+        self.factor = factor
+        self.heuristicIndex = heuristicIndex
+        self.minValue = minValue
+        self.meanValue = meanValue
+        self.searchMode = searchMode
+        self.diagonals = 0
+        self.deviationBound = None
+
+        means, minimums = blockAggregates(readWindow, rowCount, colCount, factor)
+        # both coarse searches are exact on the coarse raster
+        self.coarsePlanner = AStar(means, 0, int(means[1:, 1:].min()), int(means[1:, 1:].mean()), False)
+        self.coarseBound = AStar(minimums, 0, int(minimums[1:, 1:].min()), int(minimums[1:, 1:].mean()), False)
+
+    def __block(self, point):
+        return point[0] // self.factor + 1, point[1] // self.factor + 1
+
+    def __blockCenter(self, block):
+        # the searches do not step into the first row and column
+        return (max(1, min(self.rowCount - 1, (block[0] - 1) * self.factor + self.factor // 2)),
+                max(1, min(self.colCount - 1, (block[1] - 1) * self.factor + self.factor // 2)))
+
+    def __refine(self, startPoint, endPoint):
+        """
+        :return (pixel values from the endPoint to the startPoint, number of diagonal steps) of the
+                shortest path in the window around the points, None if there is no path
+        """
+        window = corridorWindow(startPoint, [endPoint], self.factor, self.rowCount, self.colCount)
+        aStar = AStar(self.readWindow(*window), self.heuristicIndex, self.minValue, self.meanValue, False)
+        if self.searchMode == "Bidirectional":
+            aStar.setBidirectional(True)
+        pixelValues = list(aStar.shortestPath(startPoint[0] - window[0], startPoint[1] - window[1],
+                                              endPoint[0] - window[0], endPoint[1] - window[1]))
+        if len(pixelValues) < 2 and startPoint != endPoint:
+            return None
+        return pixelValues, aStar.getNumberOfDiagonals()
+
+    def shortestPath(self, x1, y1, x2, y2):
+        self.diagonals = 0
+        self.deviationBound = None
+        startPoint = (x1, y1)
+        endPoint = (x2, y2)
+        startBlock = self.__block(startPoint)
+        endBlock = self.__block(endPoint)
+
+        waypoints = [endPoint]
+        if max(abs(endBlock[0] - startBlock[0]), abs(endBlock[1] - startBlock[1])) > self.SEGMENT_BLOCKS:
+            if len(self.coarsePlanner.shortestPath(startBlock[0], startBlock[1], endBlock[0], endBlock[1])) < 2:
+                return [sys.maxsize]
+            blocks = list(reversed(self.coarsePlanner.getPathPoints()))
+            waypoints = [self.__blockCenter(blocks[i])
+                         for i in range(self.SEGMENT_BLOCKS, len(blocks) - 1, self.SEGMENT_BLOCKS)] + waypoints
+
+        # the pieces go from a waypoint back to the previous waypoint, the path from the end to the start
+        pixelValues = []
+        current = startPoint
+        for waypoint in waypoints:
+            piece = self.__refine(current, waypoint)
+            if piece is None:
+                self.diagonals = 0
+                return [sys.maxsize]
+            pixelValues = piece[0] + pixelValues[1:]
+            self.diagonals += piece[1]
+            current = waypoint
+
+        lowerBound = max(abs(x2 - x1), abs(y2 - y1)) * self.minValue
+        if startBlock != endBlock:
+            coarseValues = list(self.coarseBound.shortestPath(startBlock[0], startBlock[1], endBlock[0], endBlock[1]))
+            lowerBound = max(lowerBound, sum(coarseValues[1:]))
+        self.deviationBound = max(0, sum(pixelValues[1:]) - lowerBound)
+        return pixelValues
+
+    def shortestPathsFromSource(self, x1, y1, targets):
+        paths = []
+        deviationBounds = []
+        for x2, y2 in targets:
+            pixelValues = self.shortestPath(x1, y1, x2, y2)
+            paths.append((pixelValues, self.diagonals))
+            deviationBounds.append(self.deviationBound)
+        self.deviationBound = maxDeviationBound(deviationBounds)
+        return paths
+
+    def getNumberOfDiagonals(self):
+        return self.diagonals
+
+    def isExact(self):
+        return False
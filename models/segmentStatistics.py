@@ -0,0 +1,174 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+import numpy as np
+
+
+def segmentCounts(mask, offsets):
+    """
+    :type mask: numpy boolean array of samples
+    :type offsets: numpy array with the start of every segment and the total length at the end
+    :return numpy array with the number of True entries of every segment
+    """
+    cumulated = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    return cumulated[offsets[1:]] - cumulated[offsets[:-1]]
+
+
+def segmentReduce(ufunc, values, offsets, empty=0):
+    """
+    Reduces every segment of the values with the ufunc, e.g. np.add or np.minimum.
+
+    :type values: numpy array
+    :type offsets: numpy array with the start of every segment and the total length at the end
+    :type empty: value of empty segments
+    :return numpy array with one value per segment
+    """
+    counts = np.diff(offsets)
+    result = np.full(len(counts), empty, dtype=float)
+    nonEmpty = counts > 0
+    if nonEmpty.any():
+        # empty segments do not contain values, so every non empty segment ends at the next start
+        result[nonEmpty] = ufunc.reduceat(values, offsets[:-1][nonEmpty])
+    return result
+
+
+class SegmentStatistics:
+    """
+    Statistics of the raster values of all edges, the values of edge i are values[offsets[i]:offsets[i+1]].
+    Every statistic is computed for all edges at once. Intermediate results which are used by several
+    statistics (sums, sorted values, consecutive differences and gradients) are computed only once.
+    Edges without values and statistics that are not defined for the number of values get the value 0.
+    """
+
+    def __init__(self, values, offsets):
+        """
+        Constructor
+
+        :type values: numpy array
+        :type offsets: numpy array
+        """
+        self.values = np.asarray(values, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.counts = np.diff(self.offsets)
+        self.__cache = {}
+
+    def __cached(self, name, function):
+        if name not in self.__cache:
+            self.__cache[name] = function()
+        return self.__cache[name]
+
+    def __segmentIds(self):
+        return self.__cached("segmentIds", lambda: np.repeat(np.arange(len(self.counts)), self.counts))
+
+    def __sums(self):
+        return self.__cached("sums", lambda: segmentReduce(np.add, self.values, self.offsets))
+
+    def __means(self):
+        return self.__cached("means", lambda: np.divide(self.__sums(), self.counts, out=np.zeros(len(self.counts)),
+                                                        where=self.counts > 0))
+
+    def __sortedValues(self):
+        return self.__cached("sorted", lambda: self.values[np.lexsort((self.values, self.__segmentIds()))])
+
+    def __differences(self):
+        """
+        :return (numpy array of the differences of consecutive values inside the segments, offsets)
+        """
+        def differences():
+            differenceOffsets = np.zeros(len(self.offsets), dtype=np.int64)
+            differenceOffsets[1:] = np.cumsum(np.maximum(self.counts - 1, 0))
+            segmentIds = self.__segmentIds()
+            sameSegment = segmentIds[1:] == segmentIds[:-1]
+            return np.diff(self.values)[sameSegment], differenceOffsets
+        return self.__cached("differences", differences)
+
+    def __gradient(self):
+        """
+        :return numpy array with the gradient (as calculated by np.gradient) of the segments with
+                at least two values, 0 for all other values
+        """
+        def gradient():
+            differences, differenceOffsets = self.__differences()
+            segmentIds = self.__segmentIds()
+            counts = self.counts[segmentIds]
+            localIndex = np.arange(len(self.values)) - self.offsets[:-1][segmentIds]
+            differenceStart = differenceOffsets[:-1][segmentIds]
+
+            result = np.zeros(len(self.values))
+            valid = counts > 1
+            left = valid & (localIndex > 0)
+            right = valid & (localIndex < counts - 1)
+            both = left & right
+            result[left & ~right] = differences[differenceStart[left & ~right] + localIndex[left & ~right] - 1]
+            result[right & ~left] = differences[differenceStart[right & ~left] + localIndex[right & ~left]]
+            result[both] = (differences[differenceStart[both] + localIndex[both] - 1] +
+                            differences[differenceStart[both] + localIndex[both]]) / 2
+            return result
+        return self.__cached("gradient", gradient)
+
+    def __variance(self):
+        def variance():
+            deviations = self.values - self.__means()[self.__segmentIds()]
+            squaredSums = segmentReduce(np.add, deviations * deviations, self.offsets)
+            return np.divide(squaredSums, self.counts - 1, out=np.zeros(len(self.counts)), where=self.counts > 1)
+        return self.__cached("variance", variance)
+
+    def statistic(self, analysis):
+        """
+        :type analysis: String, one of sum, mean, median, min, max, variance, standDev, gradientSum,
+                        gradientMin, gradientMax, ascent, descent, totalClimb
+        :return numpy array with the statistic of every segment
+        """
+        if analysis == "sum":
+            return self.__sums()
+        if analysis == "mean":
+            return self.__means()
+        if analysis == "median":
+            sortedValues = self.__sortedValues()
+            result = np.zeros(len(self.counts))
+            nonEmpty = self.counts > 0
+            lower = self.offsets[:-1][nonEmpty] + (self.counts[nonEmpty] - 1) // 2
+            upper = self.offsets[:-1][nonEmpty] + self.counts[nonEmpty] // 2
+            result[nonEmpty] = (sortedValues[lower] + sortedValues[upper]) / 2
+            return result
+        if analysis == "min":
+            return self.__cached("min", lambda: segmentReduce(np.minimum, self.values, self.offsets))
+        if analysis == "max":
+            return self.__cached("max", lambda: segmentReduce(np.maximum, self.values, self.offsets))
+        if analysis == "variance":
+            return self.__variance()
+        if analysis == "standDev":
+            return np.sqrt(self.__variance())
+
+        if analysis in ["gradientSum", "gradientMin", "gradientMax"]:
+            ufunc = {"gradientSum": np.add, "gradientMin": np.minimum, "gradientMax": np.maximum}[analysis]
+            result = segmentReduce(ufunc, self.__gradient(), self.offsets)
+            result[self.counts < 2] = 0
+            return result
+
+        if analysis in ["ascent", "descent", "totalClimb"]:
+            differences, differenceOffsets = self.__differences()
+            if analysis == "ascent":
+                differences = np.maximum(differences, 0)
+            elif analysis == "descent":
+                differences = np.maximum(-differences, 0)
+            else:
+                differences = np.abs(differences)
+            return segmentReduce(np.add, differences, differenceOffsets)
+
+        raise ValueError("Unknown raster analysis: " + analysis)
@@ -0,0 +1,67 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+"""
+Startup script of the spawned worker processes, see createProcessPool. The script is run by its path
+and only uses the standard library, so starting a worker does not import the plugin package.
+Importing the plugin package would run its __init__, which imports the user interface of the plugin
+and QGIS. The plugin package is registered without running its __init__ instead, so the worker
+functions can be imported from their modules.
+"""
+
+import importlib
+import sys
+import types
+
+# __name__ of the script if it is run by createProcessPool
+RUN_NAME = "__spanners_worker__"
+
+
+def registerPackage(packageName, packagePaths):
+    """
+    Registers the package so its submodules can be imported, without running its __init__.
+
+    :type packageName: String
+    :type packagePaths: List of String directories of the package
+    """
+    if packageName in sys.modules:
+        return
+    package = types.ModuleType(packageName)
+    package.__path__ = list(packagePaths)
+    package.__package__ = packageName
+    sys.modules[packageName] = package
+
+
+def startWorker(packageName, packagePaths, initializerModule, initializerName, initargs):
+    """
+    Registers the plugin package and calls the initializer of the worker.
+
+    :type packageName: String name of the plugin package
+    :type packagePaths: List of String directories of the plugin package
+    :type initializerModule: String module of the initializer
+    :type initializerName: String name of the initializer in its module
+    :type initargs: tuple of arguments of the initializer
+    """
+    registerPackage(packageName, packagePaths)
+    initializer = getattr(importlib.import_module(initializerModule), initializerName)
+    initializer(*initargs)
+
+
+if __name__ == RUN_NAME:
+    # workerStart is passed as a global of the script by createProcessPool
+    startWorker(**globals()["workerStart"])
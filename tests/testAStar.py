@@ -0,0 +1,172 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+from qgis.testing import unittest, start_app, TestCase
+
+from ..models import aStarPython
+from ..models.rasterTiles import AStar, NATIVE_SEARCH
+
+import heapq
+import math
+import sys
+
+import numpy as np
+
+start_app()
+
+
+class TestAStar(TestCase):
+    """ Provides test cases for the shortest path searches through a raster """
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.default_rng(11)
+        # large random values, so the shortest paths are unique
+        self.matrix = rng.integers(1, 10 ** 6, (12, 15))
+        self.pixelPairs = [(1, 1, 10, 13), (5, 7, 5, 7), (0, 0, 11, 14), (11, 14, 1, 2), (3, 12, 9, 1),
+                           (1, 1, 10, 13), (6, 2, 2, 11)]
+
+    def implementations(self):
+        """
+        :return List of the AStar classes, the pure Python version and AStarC if it is available
+        """
+        return [aStarPython.AStar] + ([AStar] if NATIVE_SEARCH else [])
+
+    def createAStar(self, implementation, createShortestPathMatrix=False):
+        return implementation(self.matrix, 0, int(self.matrix.min()), int(self.matrix.mean()),
+                              createShortestPathMatrix)
+
+    def shortestDistances(self, matrix, startRow, startCol):
+        """
+        Dijkstra search on (row, column) pixels as a reference. A step costs the value of the pixel it starts
+        from and only enters pixels inside of the raster bounds without the first row and column.
+        """
+        rows, cols = matrix.shape
+        distances = np.full(matrix.shape, math.inf)
+        distances[startRow, startCol] = 0
+        pq = [(0, startRow, startCol)]
+        while pq:
+            distance, row, col = heapq.heappop(pq)
+            if distance > distances[row, col]:
+                continue
+            for rowOffset, colOffset in aStarPython.NEIGHBOR_DIRECTIONS:
+                neighborRow, neighborCol = row + rowOffset, col + colOffset
+                if 0 < neighborRow < rows and 0 < neighborCol < cols and\
+                        distance + matrix[row, col] < distances[neighborRow, neighborCol]:
+                    distances[neighborRow, neighborCol] = distance + matrix[row, col]
+                    heapq.heappush(pq, (distances[neighborRow, neighborCol], neighborRow, neighborCol))
+        return distances
+
+    def test_reused_buffers(self):
+        for implementation in self.implementations():
+            expected = []
+            for startRow, startCol, endRow, endCol in self.pixelPairs:
+                aStar = self.createAStar(implementation)
+                expected.append((list(aStar.shortestPath(startRow, startCol, endRow, endCol)),
+                                 aStar.getNumberOfDiagonals()))
+
+            # all queries, and the queries again in reverse order, search with the buffers of one AStar object
+            aStar = self.createAStar(implementation)
+            for i in list(range(len(self.pixelPairs))) + list(reversed(range(len(self.pixelPairs)))):
+                self.assertEqual(expected[i][0], list(aStar.shortestPath(*self.pixelPairs[i])))
+                self.assertEqual(expected[i][1], aStar.getNumberOfDiagonals())
+
+    def test_search_generation_overflow(self):
+        # the buffers are cleared once the generation stamps of the pure Python AStar overflow
+        aStar = self.createAStar(aStarPython.AStar)
+        expected = list(aStar.shortestPath(*self.pixelPairs[0]))
+        aStar.generation = np.iinfo(np.uint32).max - 1
+        for _ in range(3):
+            self.assertEqual(expected, list(aStar.shortestPath(*self.pixelPairs[0])))
+        self.assertEqual(2, aStar.generation)
+
+    def test_shortest_paths_from_source(self):
+        targets = [(10, 13), (1, 1), (5, 7), (11, 14), (1, 14), (10, 13)]
+        for implementation in self.implementations():
+            aStar = self.createAStar(implementation)
+            paths = aStar.shortestPathsFromSource(1, 1, targets)
+            self.assertEqual(len(targets), len(paths))
+            for (endRow, endCol), (pathValues, numberOfDiagonals) in zip(targets, paths):
+                self.assertEqual(list(aStar.shortestPath(1, 1, endRow, endCol)), list(pathValues))
+                self.assertEqual(aStar.getNumberOfDiagonals(), numberOfDiagonals)
+
+    def test_shortest_paths(self):
+        # pairs with the same start pixel share one search, the last pair is outside of the raster
+        pixelPairs = self.pixelPairs + [(1, 1, 3, 4), (6, 2, 11, 1), (-1, 0, 3, 3)]
+        for implementation in self.implementations():
+            aStar = self.createAStar(implementation)
+            values, offsets, diagonals = aStar.shortestPaths(np.array(pixelPairs))
+            self.assertEqual(len(pixelPairs) + 1, len(offsets))
+            for i, pixelPair in enumerate(pixelPairs[:-1]):
+                self.assertEqual(list(aStar.shortestPath(*pixelPair)), values[offsets[i]:offsets[i + 1]].tolist())
+                self.assertEqual(aStar.getNumberOfDiagonals(), diagonals[i])
+            # AStarC marks missing paths with its largest integer
+            self.assertEqual(1, offsets[-1] - offsets[-2])
+            self.assertGreaterEqual(values[-1], 2 ** 31 - 1)
+
+    def test_python_search_matches_reference(self):
+        rng = np.random.default_rng(13)
+        for matrix in [rng.integers(1, 10, (9, 13)), rng.uniform(0.5, 3, (9, 13))]:
+            aStar = aStarPython.AStar(matrix, 0, matrix.min(), matrix.mean(), False)
+            for startRow, startCol in [(0, 0), (4, 6), (8, 12)]:
+                distances = self.shortestDistances(matrix, startRow, startCol)
+                for endRow, endCol in [(1, 1), (8, 12), (5, 2), (1, 12)]:
+                    pathValues = aStar.shortestPath(startRow, startCol, endRow, endCol)
+                    pathPoints = aStar.getPathPoints()
+                    # the path is stored from its end to its start, the end pixel is not part of the cost
+                    self.assertEqual((endRow, endCol), tuple(pathPoints[0]))
+                    self.assertEqual((startRow, startCol), tuple(pathPoints[-1]))
+                    self.assertAlmostEqual(distances[endRow, endCol], sum(pathValues[1:]))
+                    self.assertEqual([matrix[row, col] for row, col in pathPoints], pathValues)
+                    self.assertTrue(all(type(value) == (int if matrix.dtype.kind == "i" else float)
+                                        for value in pathValues))
+
+                    steps = np.abs(np.diff(np.array(pathPoints), axis=0))
+                    self.assertTrue((steps.max(axis=1) == 1).all())
+                    self.assertEqual(int((steps.min(axis=1) == 1).sum()), aStar.getNumberOfDiagonals())
+
+    def test_python_search_unreachable(self):
+        # pixels of the first row and column can only be the start of a path
+        aStar = aStarPython.AStar(self.matrix, 0, int(self.matrix.min()), int(self.matrix.mean()), False)
+        self.assertEqual([sys.maxsize], aStar.shortestPath(3, 3, 0, 5))
+        self.assertEqual([sys.maxsize], aStar.shortestPath(3, 3, 4, 0))
+        self.assertEqual([sys.maxsize], aStar.shortestPathsFromSource(3, 3, [(0, 0)])[0][0])
+
+    def test_shortest_path_view(self):
+        for implementation in self.implementations():
+            self.assertEqual((0, 0, 3), self.createAStar(implementation).getShortestPathView().shape)
+
+            aStar = self.createAStar(implementation, True)
+            view = aStar.getShortestPathView()
+            self.assertEqual(np.uint8, view.dtype)
+            self.assertEqual(self.matrix.shape + (3,), view.shape)
+            self.assertFalse(view.any())
+
+            aStar.shortestPath(1, 1, 10, 13)
+            pathPoints = [tuple(point) for point in aStar.getPathPoints()]
+            view = aStar.getShortestPathView()
+            # the pixels of the path are colored, the end pixel is only colored and can get any color
+            for row, col in pathPoints[1:]:
+                self.assertTrue(view[row, col].any())
+            # the search only visits pixels inside of the raster bounds without the first row and column
+            self.assertFalse(view[0].any())
+            self.assertFalse(view[:, 0].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+from qgis.testing import unittest, start_app, TestCase
+
+from ..models.costFormula import CostFormula, Term
+
+import numpy as np
+
+start_app()
+
+
+class TestCostFormula(TestCase):
+    """ Provides test cases for the evaluation of several cost functions with shared subexpressions """
+
+    def setUp(self):
+        """Runs before each test."""
+        self.edgeCount = 6
+        self.columns = {
+            "euclidean": np.array([1.0, 4.0, 9.0, 16.0, 25.0, 36.0]),
+            "manhattan": np.array([2.0, 5.0, 10.0, 20.0, 30.0, 40.0]),
+            "field:speed_2": np.array([10.0, 0.0, 5.0, 2.5, 1.0, 8.0]),
+        }
+        self.formulas = ["math.sqrt%euclidean$*2+field:speed_2",
+                         "if{math.sqrt%euclidean$*2>5;manhattan/field:speed_2;math.sqrt%euclidean$*2}",
+                         "math.sqrt%euclidean$*2+field:speed_2",
+                         "manhattan-euclidean"]
+
+    def test_shared_cache_matches_separate_evaluation(self):
+        cache = {}
+        for formula in self.formulas:
+            costFormula = CostFormula(formula, ["speed_2"])
+            expected = costFormula.evaluate(self.columns, self.edgeCount)
+            np.testing.assert_array_equal(expected, costFormula.evaluate(self.columns, self.edgeCount, cache))
+
+        result = CostFormula(self.formulas[0], ["speed_2"]).evaluate(self.columns, self.edgeCount, cache)
+        np.testing.assert_array_equal(np.sqrt(self.columns["euclidean"]) * 2 + self.columns["field:speed_2"], result)
+
+    def test_shared_subexpressions_are_computed_once(self):
+        cache = {}
+        CostFormula("math.sqrt%euclidean$*2").evaluate(self.columns, self.edgeCount, cache)
+        # the square root and the product, variables and constants are not cached
+        self.assertEqual(2, len(cache))
+        sharedKeys = list(cache)
+
+        # the formulas use the cached values of the subexpression instead of computing it again
+        marker = np.full(self.edgeCount, 100.0)
+        for key in sharedKeys:
+            cache[key] = marker
+        for formula in self.formulas[:3]:
+            costFormula = CostFormula(formula, ["speed_2"])
+            result = costFormula.evaluate(self.columns, self.edgeCount, cache)
+            for key in sharedKeys:
+                self.assertIs(marker, cache[key])
+            self.assertFalse(np.array_equal(costFormula.evaluate(self.columns, self.edgeCount), result))
+
+        result = CostFormula(self.formulas[0], ["speed_2"]).evaluate(self.columns, self.edgeCount, cache)
+        np.testing.assert_array_equal(marker + self.columns["field:speed_2"], result)
+
+    def test_random_values_are_not_shared(self):
+        cache = {}
+        rng = np.random.default_rng(7)
+        costFormula = CostFormula("rnd?0§1000000&+euclidean")
+        first = costFormula.evaluate(self.columns, self.edgeCount, cache, rng)
+        second = costFormula.evaluate(self.columns, self.edgeCount, cache, rng)
+        self.assertFalse(np.array_equal(first, second))
+        self.assertTrue(np.all(first >= self.columns["euclidean"]))
+
+    def test_sum_of_booleans(self):
+        # booleans are summed like Python's True + True == 2
+        columns = dict(self.columns, **{"polygon[0]:insidePolygon": np.array([True, True, False, False, True, False]),
+                                        "polygon[0]:crossesPolygon": np.array([True, False, True, False, True, True])})
+        result = CostFormula("(euclidean>1)+(euclidean>9)").evaluate(columns, self.edgeCount)
+        self.assertEqual([0, 1, 1, 2, 2, 2], result.tolist())
+        result = CostFormula("polygon[0]:insidePolygon+polygon[0]:crossesPolygon+True").evaluate(columns,
+                                                                                                  self.edgeCount)
+        self.assertEqual([3, 2, 2, 1, 3, 2], result.tolist())
+
+    def test_and_or_values(self):
+        # and/or return the value of one of their operands like in Python
+        speeds = self.columns["field:speed_2"]
+        manhattan = self.columns["manhattan"]
+        result = CostFormula("field:speed_2 or 5", ["speed_2"]).evaluate(self.columns, self.edgeCount)
+        self.assertEqual([speed or 5 for speed in speeds], result.tolist())
+        result = CostFormula("field:speed_2 and manhattan", ["speed_2"]).evaluate(self.columns, self.edgeCount)
+        self.assertEqual([speed and distance for speed, distance in zip(speeds, manhattan)], result.tolist())
+        result = CostFormula("euclidean>10 and field:speed_2>2 or manhattan", ["speed_2"]).evaluate(self.columns,
+                                                                                                     self.edgeCount)
+        expected = [(euclidean > 10 and speed > 2) or distance
+                    for euclidean, speed, distance in zip(self.columns["euclidean"], speeds, manhattan)]
+        self.assertEqual(expected, result.tolist())
+
+    def test_terms(self):
+        costFormula = CostFormula(self.formulas[1], ["speed_2"])
+        self.assertEqual([Term("metric", "euclidean"), Term("metric", "manhattan"), Term("field", "speed_2")],
+                         costFormula.terms())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+from qgis.testing import unittest, start_app, TestCase
+from qgis.core import QgsFeature, QgsGeometry, QgsPointXY, QgsRasterLayer, QgsVectorLayer
+
+from ..models.costWorkers import (createProcessPool, createSearchThreadPool, initializeShortestPathWorker,
+                                  searchBatch, shortestPathBatch, threadSearchBatch)
+from ..models.rasterTiles import (NATIVE_SEARCH, SEARCH_BYTES_PER_PIXEL, AStar, createRasterSearch,
+                                  fullSearchBytes, searchThreadCount, shareBand)
+from ..models import aStarPython
+from ..models.graphBuilder import GraphBuilder
+
+import os
+import shutil
+import tempfile
+from functools import partial
+
+import numpy as np
+from osgeo import gdal, osr
+
+start_app()
+
+
+class TestCostWorkers(TestCase):
+    """ Provides test cases for the parallel shortest path calculations of the AdvancedCostCalculator """
+
+    @classmethod
+    def setUpClass(cls):
+        """Runs before each test class instantiation."""
+        cls.tempDir = tempfile.mkdtemp()
+        cls.matrix = np.random.default_rng(5).integers(1, 20, size=(40, 50))
+        cls.rasterPath = os.path.join(cls.tempDir, "raster.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(cls.rasterPath, 50, 40, 1, gdal.GDT_Int32)
+        # pixel (row, col) covers x in [col, col + 1] and y in [40 - row - 1, 40 - row]
+        ds.SetGeoTransform((0, 1, 0, 40, 0, -1))
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(3857)
+        ds.SetProjection(srs.ExportToWkt())
+        ds.GetRasterBand(1).WriteArray(cls.matrix)
+        ds = None
+        # pairs with shared start pixels and one pair outside of the raster
+        cls.pixelPairs = [(1, 1, 38, 48), (1, 1, 20, 3), (5, 30, 2, 2), (39, 49, 1, 1), (10, 10, 10, 10),
+                          (0, 60, 3, 3)]
+
+    @classmethod
+    def tearDownClass(cls):
+        """Runs after each test class instantiation."""
+        shutil.rmtree(cls.tempDir, True)
+
+    def serialPaths(self, aStar):
+        results = []
+        for startRow, startCol, endRow, endCol in self.pixelPairs[:-1]:
+            pixelValues = list(aStar.shortestPath(startRow, startCol, endRow, endCol))
+            results.append((pixelValues, aStar.getNumberOfDiagonals()))
+        return results
+
+    def test_search_batch(self):
+        for heuristicIndex in range(2):
+            aStar = AStar(self.matrix, heuristicIndex, 1, 10, False)
+            serialResults = self.serialPaths(aStar)
+            batchResults, _ = searchBatch(aStar, self.pixelPairs)
+            self.assertEqual(serialResults, batchResults[:-1])
+            # AStarC marks pairs outside of the raster with the largest int, the Python AStar with sys.maxsize
+            self.assertEqual(1, len(batchResults[-1][0]))
+            self.assertGreaterEqual(batchResults[-1][0][0], 2 ** 31 - 1)
+
+    def test_thread_search_batch(self):
+        if not NATIVE_SEARCH:
+            self.skipTest("only AStarC searches in threads")
+        aStar = AStar(self.matrix, 0, 1, 10, False)
+        serialResults = self.serialPaths(aStar)
+        executor, searches = createSearchThreadPool(aStar, 3)
+        batchFunction = partial(threadSearchBatch, searches)
+        futures = [executor.submit(batchFunction, self.pixelPairs[start:start + 2])
+                   for start in range(0, len(self.pixelPairs), 2)]
+        batchResults = [result for future in futures for result in future.result()[0]]
+        executor.shutdown()
+        self.assertEqual(3, searches.qsize())
+        self.assertEqual(serialResults, batchResults[:-1])
+
+    def test_spawned_process_pool(self):
+        aStar = AStar(self.matrix, 0, 1, 10, False)
+        serialResults = self.serialPaths(aStar)
+        sharedBandPath = shareBand(self.rasterPath, 1, os.path.join(self.tempDir, "band.npy"))
+        executor = createProcessPool(2, initializeShortestPathWorker,
+                                     (self.rasterPath, 1, 0, 1, 10, None, 200, "Heuristic", 8, 0, sharedBandPath))
+        try:
+            batchResults, deviationBound = executor.submit(shortestPathBatch, self.pixelPairs[:-1]).result()
+            # the workers import the models without the __init__ of the plugin and its user interface
+            mainPlugin = __name__.split(".")[0] + ".mainPlugin"
+            imported = executor.submit(eval, "{!r} in __import__('sys').modules".format(mainPlugin)).result()
+        finally:
+            executor.shutdown()
+        self.assertEqual(serialResults, batchResults)
+        self.assertEqual(0, deviationBound)
+        self.assertFalse(imported)
+
+    def test_share_band(self):
+        # strips which do not divide the rows of the band
+        sharedBandPath = shareBand(self.rasterPath, 1, os.path.join(self.tempDir, "sharedBand.npy"), stripRows=7)
+        sharedBand = np.load(sharedBandPath)
+        self.assertEqual(np.int64, sharedBand.dtype)
+        np.testing.assert_array_equal(self.matrix, sharedBand)
+
+        floatRasterPath = os.path.join(self.tempDir, "floatRaster.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(floatRasterPath, 50, 40, 1, gdal.GDT_Float32)
+        ds.GetRasterBand(1).WriteArray(self.matrix / 4)
+        ds = None
+        sharedBand = np.load(shareBand(floatRasterPath, 1, os.path.join(self.tempDir, "sharedFloatBand.npy")))
+        self.assertEqual(np.float64, sharedBand.dtype)
+        np.testing.assert_array_equal(self.matrix / 4, sharedBand)
+
+    def test_search_on_shared_band(self):
+        sharedBandPath = shareBand(self.rasterPath, 1, os.path.join(self.tempDir, "searchBand.npy"))
+        aStar, matrix = createRasterSearch(self.rasterPath, 1, 0, 1, 10, sharedBandPath=sharedBandPath)
+        # the band is mapped into memory instead of being read
+        self.assertIsInstance(matrix, np.memmap)
+        self.assertEqual(self.serialPaths(AStar(self.matrix, 0, 1, 10, False)), self.serialPaths(aStar))
+        if isinstance(aStar, aStarPython.AStar):
+            # the pure Python AStar searches on the mapped values without a copy
+            self.assertTrue(np.shares_memory(matrix, np.asarray(aStar.values)))
+
+    def test_costs_at_raster_origin(self):
+        # points up to one pixel west and north of the raster origin are outside of the raster for serial
+        # and parallel calculations
+        pointLayer = QgsVectorLayer("Point?crs=EPSG:3857", "points", "memory")
+        features = []
+        for x, y in [(-0.5, 20.5), (10.5, 40.5), (0.5, 39.5), (20.5, 0.5), (30.5, 25.5)]:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            features.append(feature)
+        pointLayer.dataProvider().addFeatures(features)
+
+        costs = []
+        for workerCount in [1, 2]:
+            graphBuilder = GraphBuilder()
+            graphBuilder.setVectorLayer(pointLayer)
+            graphBuilder.setRasterLayer(QgsRasterLayer(self.rasterPath, "raster"))
+            graphBuilder.setOption("connectionType", "Complete")
+            graphBuilder.setOption("distanceStrategy", "Advanced")
+            graphBuilder.setOption("createGraphAsLayers", False)
+            graphBuilder.setOption("costWorkerCount", workerCount)
+            graphBuilder.addCostFunction("raster[0]:spSum(0)")
+            graph = graphBuilder.makeGraph()
+            costs.append({(graph.vertex(graph.edge(edgeIndex).fromVertex()).point().asWkt(),
+                           graph.vertex(graph.edge(edgeIndex).toVertex()).point().asWkt()): graph.costOfEdge(edgeIndex)
+                          for edgeIndex in range(graph.edgeCount())})
+
+        self.assertEqual(costs[0], costs[1])
+        outside = [cost for (fromPoint, toPoint), cost in costs[0].items()
+                   if "-0.5" in fromPoint + toPoint or "40.5" in fromPoint + toPoint]
+        self.assertTrue(outside)
+        self.assertTrue(all(cost >= 2 ** 31 - 1 for cost in outside))
+
+    def test_search_thread_count(self):
+        fullBytes = fullSearchBytes(self.rasterPath, 1)
+        bufferBytes = 40 * 50 * SEARCH_BYTES_PER_PIXEL
+        self.assertEqual(4, searchThreadCount(self.rasterPath, 1, 4))
+        # every thread needs its own search buffers besides the search of the whole band
+        self.assertEqual(2, searchThreadCount(self.rasterPath, 1, 4, fullBytes + 2 * bufferBytes))
+        self.assertEqual(4, searchThreadCount(self.rasterPath, 1, 4, fullBytes + 10 * bufferBytes))
+        self.assertEqual(0, searchThreadCount(self.rasterPath, 1, 4, fullBytes))
+        self.assertEqual(0, searchThreadCount(self.rasterPath, 1, 4, fullBytes - 1))
+        self.assertEqual(0, searchThreadCount(self.rasterPath, 1, 4, None, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,7 +17,7 @@
 #  https://www.gnu.org/licenses/gpl-2.0.html.
 
 from qgis.testing import unittest, start_app, TestCase
-from qgis.core import QgsPointXY, QgsCoordinateReferenceSystem
+from qgis.core import QgsPointXY, QgsCoordinateReferenceSystem, QgsVectorLayer
 
 from ..models.extGraph import ExtGraph
 from ..models.graphBuilder import GraphBuilder
@@ -312,6 +312,27 @@ class TestExtGraph(TestCase):
         self.assertEqual(11, graph.vertexCount())
         self.assertNotEqual(-1, graph.findVertex(QgsPointXY(-1.0, 1.0)))
 
+    def test_copy_updates_own_edge_costs(self):
+        graphBuilder = GraphBuilder()
+        graphBuilder.setOption("distanceStrategy", "Advanced")
+        graphBuilder.setVectorLayer(QgsVectorLayer(os.path.join(getPluginPath(), "tests/testdata/simple_graph_edges_layer/simple_graph_edges_layer.shp")))
+        graphBuilder.addCostFunction("euclidean")
+        graph = graphBuilder.makeGraph()
+        graphCopy = graph.copy()
+        self.assertIsNot(graph.costCalculator, graphCopy.costCalculator)
+
+        fromVertex = graphCopy.findVertex(QgsPointXY(1.0, 0.0))
+        edgeId = graphCopy.hasEdge(fromVertex, graphCopy.findVertex(QgsPointXY(0.0, 0.0)))
+        cost = graph.costOfEdge(edgeId)
+        graphCopy.vertex(fromVertex).setNewPoint(QgsPointXY(3.0, 0.0))
+        self.assertTrue(graphCopy.updateEdgeCosts([edgeId]))
+
+        # the original graph and its calculator are not changed by the copy
+        self.assertEqual(3.0, graphCopy.costOfEdge(edgeId))
+        self.assertEqual(cost, graph.costOfEdge(edgeId))
+        self.assertIs(graph, graph.costCalculator.graph)
+        self.assertIs(graphCopy, graphCopy.costCalculator.graph)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -17,15 +17,25 @@
 #  https://www.gnu.org/licenses/gpl-2.0.html.
 
 from qgis.testing import unittest, start_app, TestCase
-from qgis.core import QgsApplication, QgsRectangle, QgsCoordinateReferenceSystem, QgsProviderRegistry, QgsPointXY, QgsProviderMetadata, QgsUnitTypes, QgsVectorLayer, QgsRasterLayer
+from qgis.core import QgsApplication, QgsRectangle, QgsCoordinateReferenceSystem, QgsProviderRegistry, QgsPointXY, QgsProviderMetadata, QgsUnitTypes, QgsVectorLayer, QgsRasterLayer, QgsFeature, QgsGeometry
 
 from ..models.graphLayer import GraphLayer, GraphLayerType, GraphDataProvider
 from ..models.graphBuilder import GraphBuilder
+from ..models.graphBuildCache import GraphBuildCache
+from ..models.graphUpdater import IncrementalGraphUpdater
+from ..models.rasterCache import RasterCache
+from ..models.rasterSearchCache import RasterSearchCache
+from ..models.aStarPython import AStar
+from ..models.rasterTiles import HierarchicalSearch, RasterTileCache, arrayWindowReader, corridorWindow
 from ..helperFunctions import getPluginPath
 
 import os
 import sys
 import math
+import tempfile
+
+import numpy as np
+from osgeo import gdal
 
 
 start_app()
@@ -296,6 +306,223 @@ class TestGraphBuilder(TestCase):
 
         self.assertEqual(edgeId, graph.costOfEdge(edgeId, 0))
 
+    def test_field_names_with_digits(self):
+        pointLayer = QgsVectorLayer("Point?crs=EPSG:4326&field=elev_2:double", "points", "memory")
+        features = []
+        for i in range(4):
+            feature = QgsFeature(pointLayer.fields())
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(i, 0)))
+            feature["elev_2"] = 10.0 * i
+            features.append(feature)
+        pointLayer.dataProvider().addFeatures(features)
+
+        self.graphBuilder.setVectorLayer(pointLayer)
+        self.graphBuilder.setOption("distanceStrategy", "Advanced")
+        self.graphBuilder.setOption("connectionType", "Nearest neighbor")
+        self.graphBuilder.setOption("neighborNumber", 1)
+        self.graphBuilder.setOption("createGraphAsLayers", False)
+        self.graphBuilder.addCostFunction("field:elev_2")
+        graph = self.graphBuilder.makeGraph()
+        for edgeId in graph.edges():
+            toPoint = graph.vertex(graph.edge(edgeId).toVertex()).point()
+            self.assertEqual(10.0 * toPoint.x(), graph.costOfEdge(edgeId))
+
+        # vertices added to the graph have no field values
+        addedEdges = graph.addVertexWithEdges([3.6, 0])
+        self.assertEqual(1, len(addedEdges))
+        self.assertEqual(30.0, graph.costOfEdge(addedEdges[0][0]))
+
+    def test_non_numeric_point_fields(self):
+        pointLayer = QgsVectorLayer("Point?crs=EPSG:4326&field=speed:string", "points", "memory")
+        features = []
+        for i, speed in enumerate(["5", "fast", None, "2.5"]):
+            feature = QgsFeature(pointLayer.fields())
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(i, 0)))
+            feature["speed"] = speed
+            features.append(feature)
+        pointLayer.dataProvider().addFeatures(features)
+
+        self.graphBuilder.setVectorLayer(pointLayer)
+        self.graphBuilder.setOption("distanceStrategy", "Advanced")
+        self.graphBuilder.setOption("connectionType", "Nearest neighbor")
+        self.graphBuilder.setOption("neighborNumber", 1)
+        self.graphBuilder.setOption("createGraphAsLayers", False)
+        self.graphBuilder.addCostFunction("field:speed")
+        graph = self.graphBuilder.makeGraph()
+        # values which are not numbers do not fail the cost function, their edges cost nan
+        expected = {0: 5.0, 1: math.nan, 2: math.nan, 3: 2.5}
+        for edgeId in graph.edges():
+            toPoint = graph.vertex(graph.edge(edgeId).toVertex()).point()
+            cost = graph.costOfEdge(edgeId)
+            if math.isnan(expected[int(toPoint.x())]):
+                self.assertTrue(math.isnan(cost))
+            else:
+                self.assertEqual(expected[int(toPoint.x())], cost)
+
+    def test_advanced_cost_function_constructs(self):
+        self.graphBuilder.setOption("distanceStrategy", "Advanced")
+        self.graphBuilder.setVectorLayer(QgsVectorLayer(os.path.join(getPluginPath(), "tests/testdata/simple_graph_edges_layer/simple_graph_edges_layer.shp")))
+        self.graphBuilder.setRasterLayer(QgsRasterLayer(os.path.join(getPluginPath(), "tests/testdata/simple_raster.tif")))
+
+        self.graphBuilder.addCostFunction("if(euclidean > 0.5 and field:edgeId < 1000; math.sqrt(64) + 1; 0)")
+        self.graphBuilder.addCostFunction("if(raster[0]:pixelValue == 5; raster[0]:max - raster[0]:min; 1)")
+        self.graphBuilder.addCostFunction("random(2, 2) * euclidean")
+
+        graph = self.graphBuilder.makeGraph()
+        fromVertex = graph.findVertex(QgsPointXY(1.0, 0.0))
+        toVertex = graph.findVertex(QgsPointXY(0.0, 0.0))
+        edgeId = graph.hasEdge(fromVertex, toVertex)
+
+        self.assertEqual(9.0, graph.costOfEdge(edgeId, 0))
+        self.assertEqual(3.0, graph.costOfEdge(edgeId, 1))
+        self.assertEqual(2.0, graph.costOfEdge(edgeId, 2))
+
+    def test_update_edge_costs_after_move(self):
+        self.graphBuilder.setOption("distanceStrategy", "Advanced")
+        self.graphBuilder.setVectorLayer(QgsVectorLayer(os.path.join(getPluginPath(), "tests/testdata/simple_graph_edges_layer/simple_graph_edges_layer.shp")))
+        self.graphBuilder.addCostFunction("euclidean")
+
+        graph = self.graphBuilder.makeGraph()
+        fromVertex = graph.findVertex(QgsPointXY(1.0, 0.0))
+        toVertex = graph.findVertex(QgsPointXY(0.0, 0.0))
+        edgeId = graph.hasEdge(fromVertex, toVertex)
+        otherEdgeCosts = {otherId: graph.costOfEdge(otherId) for otherId in graph.edges()
+                          if otherId not in graph.vertex(fromVertex).incomingEdges() + graph.vertex(fromVertex).outgoingEdges()}
+
+        graph.vertex(fromVertex).setNewPoint(QgsPointXY(3.0, 0.0))
+        self.assertTrue(graph.updateEdgeCosts([edgeId]))
+
+        self.assertEqual(3.0, graph.costOfEdge(edgeId))
+        for otherId, cost in otherEdgeCosts.items():
+            self.assertEqual(cost, graph.costOfEdge(otherId))
+
+    def test_raster_cache_evicts_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # room for three paths with 100 pixel values, a fourth path evicts one path
+            cache = RasterCache(os.path.join(directory, "rasterCache.sqlite"), 3 * 100 * 8 + 400)
+            cache.putPaths("raster", [(0, 0, 1, 1), (1, 1, 2, 2), (2, 2, 3, 3)],
+                           [([1.0] * 100, 3), ([2.0] * 100, 0), ([3.0] * 100, 1)])
+
+            path = cache.getPaths("raster", [(0, 0, 1, 1)])[0]
+            self.assertEqual(100, len(path[0]))
+            self.assertEqual(3, path[1])
+            self.assertEqual(0, path[2])
+            self.assertEqual([None], cache.getPaths("other raster", [(0, 0, 1, 1)]))
+
+            # paths of searches without a deviation bound keep None as bound
+            cache.putPaths("heuristic raster", [(0, 0, 1, 1)], [([1.0], 0)], None)
+            self.assertIsNone(cache.getPaths("heuristic raster", [(0, 0, 1, 1)])[0][2])
+
+            cache.putPaths("raster", [(3, 3, 4, 4)], [([4.0] * 100, 0)])
+            found = [path is not None for path in cache.getPaths("raster", [(0, 0, 1, 1), (1, 1, 2, 2),
+                                                                            (2, 2, 3, 3), (3, 3, 4, 4)])]
+            self.assertEqual([True, False, True, True], found)
+
+    def test_raster_tile_cache_window(self):
+        with tempfile.TemporaryDirectory() as directory:
+            values = np.arange(7 * 5, dtype=np.int32).reshape(7, 5)
+            path = os.path.join(directory, "raster.tif")
+            ds = gdal.GetDriverByName("GTiff").Create(path, 5, 7, 1, gdal.GDT_Int32)
+            ds.GetRasterBand(1).WriteArray(values)
+            ds = None
+
+            # room for two tiles of 2x2 pixels
+            tileCache = RasterTileCache(path, 1, 2 * 2 * 2 * 4, tileSize=2)
+            self.assertTrue((values[1:6, 1:4] == tileCache.readWindow(1, 1, 5, 3)).all())
+            self.assertTrue((values == tileCache.readWindow(0, 0, 7, 5)).all())
+            self.assertLessEqual(tileCache.usedBytes, 2 * 2 * 2 * 4)
+
+        self.assertEqual((1, 1, 4, 4), corridorWindow((2, 3), [(3, 2)], 1, 7, 5))
+
+    def test_raster_search_cache(self):
+        RasterSearchCache.clear()
+        with tempfile.TemporaryDirectory() as directory:
+            values = np.arange(3, 3 + 6 * 8, dtype=np.int32).reshape(6, 8)
+            path = os.path.join(directory, "raster.tif")
+            ds = gdal.GetDriverByName("GTiff").Create(path, 8, 6, 1, gdal.GDT_Int32)
+            ds.GetRasterBand(1).WriteArray(values)
+            # stored statistics which are not marked as approximate are not trusted for the minimum
+            ds.GetRasterBand(1).SetMetadataItem("STATISTICS_MINIMUM", "10")
+            ds = None
+
+            rLayer = QgsRasterLayer(path, "raster")
+            search = RasterSearchCache.search(rLayer, 1, 2)
+            self.assertIs(search, RasterSearchCache.search(QgsRasterLayer(path, "raster"), 1, 2))
+            self.assertIsNot(search, RasterSearchCache.search(rLayer, 1, 0))
+            # only the statistics used by the heuristic are calculated
+            self.assertEqual((0, int(values.mean())), (search.minValue, search.meanValue))
+            self.assertEqual((3, 0), RasterSearchCache.searchStatistics(rLayer, 1, 0))
+            # views are never shared
+            self.assertIsNot(RasterSearchCache.search(rLayer, 1, 2, True), RasterSearchCache.search(rLayer, 1, 2, True))
+            self.assertEqual(2, RasterSearchCache.size())
+        RasterSearchCache.clear()
+
+    def test_exact_raster_searches(self):
+        matrix = np.random.default_rng(0).integers(1, 30, (40, 50))
+        dijkstra = AStar(matrix, 0, 1, 15, False)
+        bidirectional = AStar(matrix, 5, 1, 15, False)
+        bidirectional.setBidirectional(True)
+        landmarks = AStar(matrix, 5, 1, 15, False)
+        landmarks.setLandmarks(4)
+
+        self.assertFalse(AStar(matrix, 5, 1, 15, False).isExact())
+        self.assertTrue(bidirectional.isExact())
+        self.assertTrue(landmarks.isExact())
+        for x1, y1, x2, y2 in [(2, 3, 35, 45), (30, 4, 6, 40), (10, 10, 10, 10)]:
+            expected = sum(dijkstra.shortestPath(x1, y1, x2, y2)[1:])
+            self.assertEqual(expected, sum(bidirectional.shortestPath(x1, y1, x2, y2)[1:]))
+            self.assertEqual(expected, sum(landmarks.shortestPath(x1, y1, x2, y2)[1:]))
+
+    def test_hierarchical_raster_search(self):
+        matrix = np.random.default_rng(1).integers(1, 20, (120, 150))
+        search = HierarchicalSearch(arrayWindowReader(matrix), 120, 150, 8, 0, 1, 10)
+        dijkstra = AStar(matrix, 0, 1, 10, False)
+
+        pixelValues = search.shortestPath(5, 5, 110, 140)
+        self.assertEqual(matrix[110, 140], pixelValues[0])
+        self.assertEqual(matrix[5, 5], pixelValues[-1])
+        deviation = sum(pixelValues[1:]) - sum(dijkstra.shortestPath(5, 5, 110, 140)[1:])
+        self.assertGreaterEqual(deviation, 0)
+        self.assertLessEqual(deviation, search.deviationBound)
+        self.assertFalse(search.isExact())
+
+    def test_seeded_random_costs(self):
+        costs = []
+        for _ in range(2):
+            graphBuilder = GraphBuilder()
+            graphBuilder.setOption("distanceStrategy", "Advanced")
+            graphBuilder.setRandomOption("seed", 42)
+            graphBuilder.setVectorLayer(QgsVectorLayer(os.path.join(getPluginPath(), "tests/testdata/simple_graph_edges_layer/simple_graph_edges_layer.shp")))
+            graphBuilder.addCostFunction("random(0, 100) * euclidean")
+            graph = graphBuilder.makeGraph()
+            self.assertEqual(1, len(graph.costFunctionSeeds))
+            costs.append([graph.costOfEdge(edgeId) for edgeId in graph.edges()])
+
+        self.assertEqual(costs[0], costs[1])
+
+    def test_paged_point_ingestion(self):
+        pointLayer = QgsVectorLayer("Point?crs=EPSG:4326&field=weight:double&field=name:string", "points", "memory")
+        features = []
+        for x in range(5):
+            feature = QgsFeature(pointLayer.fields())
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, 0)))
+            feature.setAttributes([x * 1.5, "point" + str(x)])
+            features.append(feature)
+        pointLayer.dataProvider().addFeatures(features)
+
+        self.graphBuilder.setVectorLayer(pointLayer)
+        self.graphBuilder.setOption("ingestionPageSize", 2)
+        self.graphBuilder.setOption("connectionType", "Complete")
+        self.graphBuilder.setOption("createGraphAsLayers", False)
+        self.graphBuilder.addCostFunction("field:weight")
+
+        graph = self.graphBuilder.makeGraph()
+        self.assertEqual(5, graph.vertexCount())
+        self.assertEqual(["weight"], list(graph.vertexFieldValues.keys()))
+        for edgeId in graph.edges():
+            toVertex = graph.edge(edgeId).toVertex()
+            self.assertEqual(graph.vertex(toVertex).point().x() * 1.5, graph.costOfEdge(edgeId, 0))
+
     def test_polygons_in_advanced_distance_strategy(self):
         self.graphBuilder.setVectorLayer(QgsVectorLayer(os.path.join(getPluginPath(), "tests/testdata/simple_graph_edges_layer/simple_graph_edges_layer.shp")))
         self.graphBuilder.setPolygonsForCostFunction(QgsVectorLayer(os.path.join(getPluginPath(), "tests/testdata/simple_polygons/simple_polygons.shp")))
@@ -370,6 +597,116 @@ class TestGraphBuilder(TestCase):
             vertex = graph.vertices()[id]
             self.assertTrue(rectangle.contains(vertex.point()))
 
+    def test_build_cache(self):
+        GraphBuildCache.clear()
+        self.graphBuilder.setRandomOption("numberOfVertices", 10)
+        self.graphBuilder.setRandomOption("seed", 4)
+        self.graphBuilder.setOption("connectionType", "Nearest neighbor")
+        self.graphBuilder.setOption("createGraphAsLayers", False)
+        self.graphBuilder.setOption("useBuildCache", True)
+
+        firstGraph = self.graphBuilder.makeGraph()
+        self.assertEqual(1, GraphBuildCache.size())
+
+        secondGraph = self.graphBuilder.makeGraph()
+        self.assertIsNot(firstGraph, secondGraph)
+        self.assertEqual(1, GraphBuildCache.size())
+        self.assertEqual(firstGraph.edgeCount(), secondGraph.edgeCount())
+        for edgeId in firstGraph.edges():
+            self.assertEqual(firstGraph.edge(edgeId).fromVertex(), secondGraph.edge(edgeId).fromVertex())
+            self.assertEqual(firstGraph.edge(edgeId).toVertex(), secondGraph.edge(edgeId).toVertex())
+
+        # changing the cached copy does not change further cache hits
+        secondGraph.deleteEdge(0)
+        thirdGraph = self.graphBuilder.makeGraph()
+        self.assertEqual(firstGraph.edgeCount(), thirdGraph.edgeCount())
+
+        # changed options lead to a new entry
+        self.graphBuilder.setOption("neighborNumber", 3)
+        self.graphBuilder.makeGraph()
+        self.assertEqual(2, GraphBuildCache.size())
+        GraphBuildCache.clear()
+
+    def test_geographic_nearest_neighbor(self):
+        pointLayer = QgsVectorLayer("Point?crs=EPSG:4326", "points", "memory")
+        features = []
+        for x, y in [(179.9, 0), (-179.9, 0), (170, 0), (0, 89.9), (180, 89.9)]:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            features.append(feature)
+        pointLayer.dataProvider().addFeatures(features)
+
+        self.graphBuilder.setVectorLayer(pointLayer)
+        self.graphBuilder.setOption("connectionType", "Nearest neighbor")
+        self.graphBuilder.setOption("neighborNumber", 1)
+        self.graphBuilder.setOption("nnAllowDoubleEdges", True)
+        self.graphBuilder.setOption("createGraphAsLayers", False)
+        graph = self.graphBuilder.makeGraph()
+
+        # neighbors across the antimeridian and the pole
+        self.assertNotEqual(-1, graph.hasEdge(graph.findVertex(QgsPointXY(179.9, 0)),
+                                              graph.findVertex(QgsPointXY(-179.9, 0))))
+        self.assertNotEqual(-1, graph.hasEdge(graph.findVertex(QgsPointXY(0, 89.9)),
+                                              graph.findVertex(QgsPointXY(180, 89.9))))
+
+    def test_approximate_nearest_neighbor(self):
+        self.graphBuilder.setRandomOption("numberOfVertices", 200)
+        self.graphBuilder.setRandomOption("seed", 7)
+        self.graphBuilder.setOption("connectionType", "Nearest neighbor")
+        self.graphBuilder.setOption("neighborNumber", 3)
+        self.graphBuilder.setOption("nnAllowDoubleEdges", True)
+        self.graphBuilder.setOption("createGraphAsLayers", False)
+        exactGraph = self.graphBuilder.makeGraph()
+        self.assertIsNone(exactGraph.approximateNNRecall)
+
+        # searching enough cells gives the exact result
+        self.graphBuilder.setOption("approximateNN", True)
+        self.graphBuilder.setOption("approximateNNCellRings", 3)
+        self.graphBuilder.setOption("approximateNNCellCapacity", 10)
+        approximateGraph = self.graphBuilder.makeGraph()
+        self.assertEqual(1.0, approximateGraph.approximateNNRecall)
+        self.assertEqual(exactGraph.edgeCount(), approximateGraph.edgeCount())
+        for edgeId in exactGraph.edges():
+            edge = exactGraph.edge(edgeId)
+            self.assertNotEqual(-1, approximateGraph.hasEdge(edge.fromVertex(), edge.toVertex()))
+
+    def test_incremental_update(self):
+        pointLayer = QgsVectorLayer("Point?crs=EPSG:4326", "points", "memory")
+        features = []
+        for x in range(5):
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, 0)))
+            features.append(feature)
+        pointLayer.dataProvider().addFeatures(features)
+
+        self.graphBuilder.setVectorLayer(pointLayer)
+        self.graphBuilder.setOption("connectionType", "Nearest neighbor")
+        self.graphBuilder.setOption("neighborNumber", 1)
+        self.graphBuilder.setOption("nnAllowDoubleEdges", True)
+        self.graphBuilder.setOption("createGraphAsLayers", False)
+        graph = self.graphBuilder.makeGraph()
+        updater = IncrementalGraphUpdater(graph, pointLayer)
+
+        pointLayer.startEditing()
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(10, 0)))
+        pointLayer.addFeature(feature)
+        self.assertEqual(6, graph.vertexCount())
+        addedVertexId = graph.featureToVertexHash[feature.id()]
+        outgoingEdges = graph.vertex(addedVertexId).outgoingEdges()
+        self.assertEqual(1, len(outgoingEdges))
+        self.assertEqual(QgsPointXY(4, 0), graph.vertex(graph.edge(outgoingEdges[0]).toVertex()).point())
+
+        # moved point gets new neighbors
+        pointLayer.changeGeometry(feature.id(), QgsGeometry.fromPointXY(QgsPointXY(-10, 0)))
+        outgoingEdges = graph.vertex(addedVertexId).outgoingEdges()
+        self.assertEqual(QgsPointXY(0, 0), graph.vertex(graph.edge(outgoingEdges[0]).toVertex()).point())
+
+        pointLayer.deleteFeature(feature.id())
+        self.assertEqual(5, graph.vertexCount())
+        pointLayer.rollBack()
+        updater.disconnectLayer()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,119 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+from qgis.testing import unittest, start_app, TestCase
+from qgis.core import QgsPointXY, QgsVectorLayer, QgsFeature, QgsGeometry
+
+from ..models.graphBuilder import GraphBuilder
+from ..models.graphUpdater import IncrementalGraphUpdater
+
+start_app()
+
+
+class TestGraphUpdater(TestCase):
+    """ Provides test cases for the incremental graph updates """
+
+    def setUp(self):
+        """Runs before each test."""
+        self.graphBuilder = GraphBuilder()
+
+    def tearDown(self):
+        """Runs after each test."""
+        del self.graphBuilder
+
+    def createPointLayer(self, points):
+        pointLayer = QgsVectorLayer("Point?crs=EPSG:4326", "points", "memory")
+        features = []
+        for point in points:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromPointXY(point))
+            features.append(feature)
+        pointLayer.dataProvider().addFeatures(features)
+        return pointLayer
+
+    def makeNearestNeighborGraph(self, pointLayer, neighborNumber):
+        self.graphBuilder.setVectorLayer(pointLayer)
+        self.graphBuilder.setOption("connectionType", "Nearest neighbor")
+        self.graphBuilder.setOption("neighborNumber", neighborNumber)
+        self.graphBuilder.setOption("edgeDirection", "Directed")
+        self.graphBuilder.setOption("nnAllowDoubleEdges", True)
+        self.graphBuilder.setOption("createGraphAsLayers", False)
+        return self.graphBuilder.makeGraph()
+
+    def neighborPoints(self, graph, vertexId):
+        return [graph.vertex(graph.edge(edgeId).toVertex()).point()
+                for edgeId in graph.vertex(vertexId).outgoingEdges()]
+
+    def test_neighbors_across_antimeridian(self):
+        pointLayer = self.createPointLayer([QgsPointXY(-179.9, 0), QgsPointXY(179, 0), QgsPointXY(0, 0)])
+        graph = self.makeNearestNeighborGraph(pointLayer, 1)
+        updater = IncrementalGraphUpdater(graph, pointLayer)
+
+        pointLayer.startEditing()
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(179.95, 0)))
+        pointLayer.addFeature(feature)
+        addedVertexId = graph.featureToVertexHash[feature.id()]
+        self.assertEqual([QgsPointXY(-179.9, 0)], self.neighborPoints(graph, addedVertexId))
+
+        # points close to the pole are close to each other whatever their longitude is
+        pointLayer.changeGeometry(feature.id(), QgsGeometry.fromPointXY(QgsPointXY(90, 89.9)))
+        poleFeature = QgsFeature()
+        poleFeature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(-90, 89.9)))
+        pointLayer.addFeature(poleFeature)
+        poleVertexId = graph.featureToVertexHash[poleFeature.id()]
+        self.assertEqual([QgsPointXY(90, 89.9)], self.neighborPoints(graph, poleVertexId))
+
+        pointLayer.rollBack()
+        updater.disconnectLayer()
+
+    def edgePoints(self, graph):
+        edgePoints = []
+        for edgeId in graph.edges():
+            edge = graph.edge(edgeId)
+            fromPoint = graph.vertex(edge.fromVertex()).point()
+            toPoint = graph.vertex(edge.toVertex()).point()
+            edgePoints.append((fromPoint.x(), fromPoint.y(), toPoint.x(), toPoint.y()))
+        return sorted(edgePoints)
+
+    def test_nearest_neighbors_match_rebuild(self):
+        points = [QgsPointXY((i * 37) % 23, (i * 11) % 17 + 0.1 * i) for i in range(40)]
+        pointLayer = self.createPointLayer(points)
+        graph = self.makeNearestNeighborGraph(pointLayer, 3)
+        updater = IncrementalGraphUpdater(graph, pointLayer)
+
+        # the added point becomes a nearest neighbor of the points around it
+        pointLayer.startEditing()
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(11.3, 8.2)))
+        pointLayer.addFeature(feature)
+        points.append(QgsPointXY(11.3, 8.2))
+        rebuiltGraph = self.makeNearestNeighborGraph(self.createPointLayer(points), 3)
+        self.assertEqual(self.edgePoints(rebuiltGraph), self.edgePoints(graph))
+
+        pointLayer.changeGeometry(feature.id(), QgsGeometry.fromPointXY(QgsPointXY(2.6, 15.4)))
+        points[-1] = QgsPointXY(2.6, 15.4)
+        rebuiltGraph = self.makeNearestNeighborGraph(self.createPointLayer(points), 3)
+        self.assertEqual(self.edgePoints(rebuiltGraph), self.edgePoints(graph))
+
+        pointLayer.rollBack()
+        updater.disconnectLayer()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+from qgis.testing import unittest, start_app, TestCase
+
+from ..models import neighborSearch
+
+import numpy as np
+
+start_app()
+
+
+class TestNeighborSearch(TestCase):
+    """ Provides test cases for the approximate neighbor search """
+
+    def assertNeighbors(self, coordinates, k, minimumRecall):
+        neighbors = neighborSearch.approximateNearestNeighbors(coordinates, k)
+        self.assertEqual((len(coordinates), k), neighbors.shape)
+        # every point finds k neighbors, sparse points are searched again in coarser grids
+        self.assertTrue((neighbors >= 0).all())
+        self.assertFalse((neighbors == np.arange(len(coordinates))[:, None]).any())
+        recall = neighborSearch.estimateRecall(coordinates, neighbors, k, sampleSize=len(coordinates))
+        self.assertGreaterEqual(recall, minimumRecall)
+
+    def test_collinear_points(self):
+        rng = np.random.default_rng(1)
+        x = rng.random(2000)
+        self.assertNeighbors(np.c_[x, np.zeros(2000)], 5, 0.95)
+        self.assertNeighbors(np.c_[x, 2 * x], 5, 0.95)
+        # great circle through the unit sphere
+        self.assertNeighbors(np.c_[np.cos(x), np.sin(x), np.zeros(2000)], 5, 0.95)
+
+    def test_clustered_points(self):
+        rng = np.random.default_rng(2)
+        coordinates = np.concatenate([rng.normal(0, 1e-4, (1500, 2)), rng.random((300, 2)) * 100,
+                                      rng.normal(50, 1e-3, (200, 2))])
+        self.assertNeighbors(coordinates, 5, 0.9)
+
+    def test_duplicate_points(self):
+        self.assertNeighbors(np.zeros((50, 2)), 5, 1.0)
+
+    def test_sparse_points(self):
+        rng = np.random.default_rng(4)
+        # few points far away from a dense cluster do not have neighbors in the cells around them
+        outliers = np.array([[1e3, 0], [0, 1e5], [-1e4, -1e4], [1e3, 1e3], [1e5, 1e5], [2e5, 1e5]])
+        coordinates = np.concatenate([rng.random((3000, 2)), outliers])
+        self.assertNeighbors(coordinates, 5, 0.95)
+        neighbors = neighborSearch.approximateNearestNeighbors(coordinates, 5)
+        exact = neighborSearch.exactNearestNeighbors(coordinates, np.arange(3000, 3006), 5)
+        # the neighbors of the outliers are exact
+        self.assertEqual(exact.tolist(), neighbors[3000:].tolist())
+
+    def test_memory_budget(self):
+        rng = np.random.default_rng(5)
+        coordinates = rng.random((1000, 3))
+        neighbors = neighborSearch.approximateNearestNeighbors(coordinates, 4)
+        # a small budget searches the points in many chunks with the same result
+        self.assertEqual(neighbors.tolist(),
+                         neighborSearch.approximateNearestNeighbors(coordinates, 4, memoryBudget=1).tolist())
+
+    def test_exact_nearest_neighbors(self):
+        rng = np.random.default_rng(3)
+        coordinates = rng.random((300, 2))
+        points = np.arange(0, 300, 7)
+        neighbors = neighborSearch.exactNearestNeighbors(coordinates, points, 4)
+        for row, pointIdx in enumerate(points):
+            distances = ((coordinates - coordinates[pointIdx]) ** 2).sum(axis=1)
+            distances[pointIdx] = np.inf
+            self.assertEqual(np.argsort(distances)[:4].tolist(), neighbors[row].tolist())
+
+        # the radii bound the distance of the fourth neighbor
+        radii = np.sort(((coordinates[points][:, None, :] - coordinates[None, :, :]) ** 2).sum(axis=2), axis=1)[:, 4]
+        boundedNeighbors = neighborSearch.exactNearestNeighbors(coordinates, points, 4, radii)
+        self.assertEqual(neighbors.tolist(), boundedNeighbors.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+from qgis.testing import unittest, start_app, TestCase
+from qgis.core import QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY
+
+from ..models.polygonPredicates import PolygonPredicates
+from ..helperFunctions import getPluginPath
+
+import os
+
+import numpy as np
+
+start_app()
+
+
+class TestPolygonPredicates(TestCase):
+    """ Provides test cases for the insidePolygon and crossesPolygon checks of all edges """
+
+    def createPolygonLayer(self, wkts):
+        polygonLayer = QgsVectorLayer("Polygon?crs=EPSG:3857", "polygons", "memory")
+        features = []
+        for wkt in wkts:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromWkt(wkt))
+            features.append(feature)
+        polygonLayer.dataProvider().addFeatures(features)
+        return polygonLayer
+
+    def edgePredicates(self, polygonLayer, fromX, fromY, toX, toY):
+        """
+        Checks every edge against every polygon, as a reference
+        """
+        inside, crosses = [], []
+        polygons = [feature.geometry() for feature in polygonLayer.getFeatures() if feature.hasGeometry()]
+        for i in range(len(fromX)):
+            edge = QgsGeometry.fromPolylineXY([QgsPointXY(fromX[i], fromY[i]), QgsPointXY(toX[i], toY[i])])
+            inside.append(any(edge.within(polygon) for polygon in polygons))
+            crosses.append(any(edge.crosses(polygon) for polygon in polygons))
+        return inside, crosses
+
+    def test_predicates(self):
+        polygonLayer = self.createPolygonLayer(["POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))",
+                                                "POLYGON((20 0, 30 0, 30 10, 20 10, 20 0))"])
+        predicates = PolygonPredicates(polygonLayer, polygonLayer.crs())
+        # inside, crossing one polygon, crossing both polygons, outside and inside of the second polygon
+        fromX, fromY = np.array([1, 5, 5, 12, 21]), np.array([1, 5, 5, 12, 1])
+        toX, toY = np.array([9, 15, 25, 18, 29]), np.array([9, 5, 5, 18, 9])
+
+        result = predicates.evaluate(fromX, fromY, toX, toY)
+        self.assertEqual([True, False, False, False, True], result["insidePolygon"].tolist())
+        self.assertEqual([False, True, True, False, False], result["crossesPolygon"].tolist())
+
+    def test_predicates_match_edge_predicates(self):
+        polygonPath = os.path.join(getPluginPath(), "tests/testdata/simple_polygons/simple_polygons.shp")
+        polygonLayer = QgsVectorLayer(polygonPath)
+        predicates = PolygonPredicates(polygonLayer, polygonLayer.crs())
+
+        extent = polygonLayer.extent()
+        rng = np.random.default_rng(5)
+        xs = rng.uniform(extent.xMinimum(), extent.xMaximum(), (2, 200))
+        ys = rng.uniform(extent.yMinimum(), extent.yMaximum(), (2, 200))
+        # short edges are often inside of a polygon
+        xs[1, :100] = xs[0, :100] + (xs[1, :100] - xs[0, :100]) / 50
+        ys[1, :100] = ys[0, :100] + (ys[1, :100] - ys[0, :100]) / 50
+
+        result = predicates.evaluate(xs[0], ys[0], xs[1], ys[1])
+        inside, crosses = self.edgePredicates(polygonLayer, xs[0], ys[0], xs[1], ys[1])
+        self.assertEqual(inside, result["insidePolygon"].tolist())
+        self.assertEqual(crosses, result["crossesPolygon"].tolist())
+
+    def test_no_polygons(self):
+        predicates = PolygonPredicates(self.createPolygonLayer([]), QgsVectorLayer("Polygon?crs=EPSG:3857").crs())
+        result = predicates.evaluate(np.array([0.0]), np.array([0.0]), np.array([1.0]), np.array([1.0]))
+        self.assertEqual([False], result["insidePolygon"].tolist())
+        self.assertEqual([False], result["crossesPolygon"].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
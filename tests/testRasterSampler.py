@@ -0,0 +1,95 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+from qgis.testing import unittest, start_app, TestCase
+from qgis.core import QgsRasterLayer
+
+from ..models.rasterSampler import pixelsAlongSegments, sampleAlongEdges
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from osgeo import gdal, osr
+
+start_app()
+
+
+class TestRasterSampler(TestCase):
+    """ Provides test cases for sampling raster values along edges """
+
+    @classmethod
+    def setUpClass(cls):
+        """Runs before each test class instantiation."""
+        cls.tempDir = tempfile.mkdtemp()
+        cls.values = np.arange(1, 1 + 10 * 12, dtype=np.float32).reshape(10, 12)
+        cls.values[4, 5] = -1
+        cls.rasterPath = os.path.join(cls.tempDir, "raster.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(cls.rasterPath, 12, 10, 1, gdal.GDT_Float32)
+        # pixel (row, col) covers x in [col, col + 1] and y in [10 - row - 1, 10 - row]
+        ds.SetGeoTransform((0, 1, 0, 10, 0, -1))
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(3857)
+        ds.SetProjection(srs.ExportToWkt())
+        ds.GetRasterBand(1).SetNoDataValue(-1)
+        ds.GetRasterBand(1).WriteArray(cls.values)
+        ds = None
+
+    @classmethod
+    def tearDownClass(cls):
+        """Runs after each test class instantiation."""
+        shutil.rmtree(cls.tempDir, True)
+
+    def segmentPixels(self, fromCol, fromRow, toCol, toRow):
+        """
+        Pixels of one segment, one pixel per step along the major axis
+        """
+        steps = max(abs(toCol - fromCol), abs(toRow - fromRow))
+        pixels = []
+        for step in range(steps + 1):
+            fraction = step / max(steps, 1)
+            pixels.append((fromCol + int(np.floor(fraction * (toCol - fromCol) + 0.5)),
+                           fromRow + int(np.floor(fraction * (toRow - fromRow) + 0.5))))
+        return pixels
+
+    def test_pixels_along_segments(self):
+        segments = [(0, 0, 3, 0), (2, 5, 2, 1), (0, 0, 4, 2), (7, 3, 1, 6), (5, 5, 5, 5)]
+        cols, rows, offsets = pixelsAlongSegments(*(np.array(coordinates) for coordinates in zip(*segments)))
+        self.assertEqual([(0, 0), (1, 0), (2, 0), (3, 0)], list(zip(cols[:4].tolist(), rows[:4].tolist())))
+        for i, segment in enumerate(segments):
+            pixels = list(zip(cols[offsets[i]:offsets[i + 1]].tolist(), rows[offsets[i]:offsets[i + 1]].tolist()))
+            self.assertEqual(self.segmentPixels(*segment), pixels)
+
+    def test_sample_along_edges(self):
+        rLayer = QgsRasterLayer(self.rasterPath, "raster")
+        # edges between pixel centers, the second one crosses the nodata pixel, the last one leaves the raster
+        fromX, fromY = np.array([0.5, 2.5, 10.5]), np.array([9.5, 5.5, 0.5])
+        toX, toY = np.array([3.5, 8.5, 14.5]), np.array([9.5, 5.5, 0.5])
+        values, offsets = sampleAlongEdges(rLayer, 1, rLayer.crs(), fromX, fromY, toX, toY)
+
+        self.assertEqual([0, 4, 11, 16], offsets.tolist())
+        self.assertEqual(self.values[0, 0:4].tolist(), values[0:4].tolist())
+        expected = self.values[4, 2:9].copy()
+        expected[3] = 0
+        self.assertEqual(expected.tolist(), values[4:11].tolist())
+        self.assertEqual([self.values[9, 10], self.values[9, 11], 0, 0, 0], values[11:16].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
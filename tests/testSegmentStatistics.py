@@ -0,0 +1,119 @@
+#  This file is part of the S.P.A.N.N.E.R.S. plugin.
+#
+#  Copyright (C) 2022  Tim Hartmann
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public
+#  License along with this program; if not, see
+#  https://www.gnu.org/licenses/gpl-2.0.html.
+
+from qgis.testing import unittest, start_app, TestCase
+
+from ..models.segmentStatistics import SegmentStatistics, segmentCounts, segmentReduce
+
+import statistics
+
+import numpy as np
+
+start_app()
+
+ANALYSES = ["sum", "mean", "median", "min", "max", "variance", "standDev", "gradientSum", "gradientMin",
+            "gradientMax", "ascent", "descent", "totalClimb"]
+
+
+def edgeStatistic(values, analysis):
+    """
+    Statistic of the values of one edge, calculated value by value as a reference
+    """
+    values = list(values)
+    if len(values) == 0:
+        return 0
+
+    if analysis == "sum":
+        return sum(values)
+    elif analysis == "mean":
+        return statistics.mean(values)
+    elif analysis == "median":
+        return statistics.median(values)
+    elif analysis == "min":
+        return min(values)
+    elif analysis == "max":
+        return max(values)
+    elif analysis == "variance":
+        return statistics.variance(values) if len(values) > 1 else 0
+    elif analysis == "standDev":
+        return statistics.stdev(values) if len(values) > 1 else 0
+    elif analysis in ["gradientSum", "gradientMin", "gradientMax"]:
+        if len(values) < 2:
+            return 0
+        gradient = np.gradient(np.array(values, dtype=float))
+        return {"gradientSum": np.sum, "gradientMin": np.min, "gradientMax": np.max}[analysis](gradient)
+
+    climb = 0
+    for i in range(len(values) - 1):
+        if analysis == "ascent" and values[i] < values[i + 1]:
+            climb += values[i + 1] - values[i]
+        elif analysis == "descent" and values[i] > values[i + 1]:
+            climb += values[i] - values[i + 1]
+        elif analysis == "totalClimb":
+            climb += abs(values[i] - values[i + 1])
+    return climb
+
+
+class TestSegmentStatistics(TestCase):
+    """ Provides test cases for the statistics of the raster values of all edges """
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.default_rng(3)
+        # empty edges and edges with one or two values at the start, the end and between longer edges
+        counts = [0, 1, 2, 5, 0, 0, 7, 1, 3, 2, 12, 4, 0, 1]
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.values = rng.integers(-5, 20, self.offsets[-1]).astype(float)
+        self.values[20:24] = 7
+
+    def test_statistics_match_edge_statistics(self):
+        segmentStatistics = SegmentStatistics(self.values, self.offsets)
+        for analysis in ANALYSES:
+            expected = [edgeStatistic(self.values[self.offsets[i]:self.offsets[i + 1]], analysis)
+                        for i in range(len(self.offsets) - 1)]
+            np.testing.assert_allclose(segmentStatistics.statistic(analysis), expected, atol=1e-9, err_msg=analysis)
+
+    def test_repeated_statistics(self):
+        # statistics are computed from cached intermediate results on repeated and related requests
+        segmentStatistics = SegmentStatistics(self.values, self.offsets)
+        for analysis in ANALYSES + ANALYSES[::-1]:
+            expected = SegmentStatistics(self.values, self.offsets).statistic(analysis)
+            np.testing.assert_array_equal(segmentStatistics.statistic(analysis), expected, err_msg=analysis)
+
+    def test_no_edges(self):
+        segmentStatistics = SegmentStatistics(np.zeros(0), np.zeros(1, dtype=np.int64))
+        for analysis in ANALYSES:
+            self.assertEqual(0, len(segmentStatistics.statistic(analysis)))
+
+    def test_unknown_analysis(self):
+        with self.assertRaises(ValueError):
+            SegmentStatistics(self.values, self.offsets).statistic("mode")
+
+    def test_segment_reductions(self):
+        counts = np.diff(self.offsets)
+        np.testing.assert_array_equal(counts, segmentCounts(np.ones(len(self.values), dtype=bool), self.offsets))
+        positive = segmentCounts(self.values > 0, self.offsets)
+        maxima = segmentReduce(np.maximum, self.values, self.offsets, empty=-1)
+        for i in range(len(counts)):
+            edgeValues = self.values[self.offsets[i]:self.offsets[i + 1]]
+            self.assertEqual((edgeValues > 0).sum(), positive[i])
+            self.assertEqual(edgeValues.max() if len(edgeValues) > 0 else -1, maxima[i])
+
+
+if __name__ == '__main__':
+    unittest.main()